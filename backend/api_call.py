@@ -1,24 +1,19 @@
-import google.generativeai as genai
-import PIL.Image
-import io
+import argparse
+import asyncio
+import functools
+import hashlib
 import json
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Configure the Gemini API key
-# It's recommended to use environment variables for security
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment variables or .env file.")
-
-genai.configure(api_key=api_key)
+import sys
+import time
+from typing import Awaitable, Callable, Iterable, Iterator, List, Optional, Set
+from app.config.settings import settings
+from app.models.food import food_analysis_schema
+from app.utils.json_extractor import JSONExtractionError, extract_json
 
 # --- Configuration ---
-# Use the gemini-2.0-flash-lite model which supports multimodal input
-MODEL_NAME = "gemini-2.0-flash-lite"
+# Model used unless --model is given; set GEMINI_MODEL_NAME to change it
+MODEL_NAME = settings.GEMINI_MODEL_NAME
 # Path to your image file
 IMAGE_PATH = "../img/breaded-chicken-mashed-potatos-broccoli.jpeg"  # <-- CHANGE THIS TO YOUR IMAGE FILE
 
@@ -33,6 +28,27 @@ Only output the JSON object, do not include any additional text or markdown form
 If the food is not recognizable or nutritional info cannot be determined, return an empty JSON object {}.
 """
 
+# With a response schema the format is enforced by the API, so the prompt only describes the task
+STRUCTURED_PROMPT = """
+Analyze the food item(s) in this image.
+Provide the approximate macronutrient breakdown per typical serving size, or per 100g if serving size is ambiguous.
+If the food is not recognizable or nutritional info cannot be determined, leave every field empty.
+"""
+
+# Extensions picked up when walking a directory in bulk mode
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+@functools.lru_cache(maxsize=None)
+def get_model(model_name: str):
+    """Return a GenerativeModel shared by all calls for this model name"""
+    import google.generativeai as genai
+
+    # Configure the Gemini API key from the environment (.env is loaded by the settings)
+    if not settings.GEMINI_API_KEY:
+        raise ValueError("GEMINI_API_KEY not found in environment variables or .env file.")
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    return genai.GenerativeModel(model_name)
+
 # --- Function to load and analyze image ---
 def analyze_food_image(image_path: str, prompt: str, model_name: str = MODEL_NAME):
     """
@@ -49,6 +65,8 @@ def analyze_food_image(image_path: str, prompt: str, model_name: str = MODEL_NAM
         or an error message string.
     """
     try:
+        import PIL.Image
+
         # Load the image using Pillow
         img = PIL.Image.open(image_path)
 
@@ -56,15 +74,22 @@ def analyze_food_image(image_path: str, prompt: str, model_name: str = MODEL_NAM
         # The order matters - placing the image first is often good practice
         content = [img, prompt]
 
-        # Initialize the generative model
-        model = genai.GenerativeModel(model_name)
+        # Reuse the generative model across calls
+        model = get_model(model_name)
 
         print(f"Sending image '{image_path}' to model '{model_name}' for analysis...")
         print("Prompt:", prompt)
 
         # Generate content from the model
         # Use stream=True for potentially faster initial response, but False is simpler here
-        response = model.generate_content(content)
+        generation_config = None
+        if settings.STRUCTURED_OUTPUT_ENABLED:
+            generation_config = {
+                "response_mime_type": "application/json",
+                "response_schema": food_analysis_schema(),
+                "max_output_tokens": settings.MODEL_MAX_OUTPUT_TOKENS,
+            }
+        response = model.generate_content(content, generation_config=generation_config)
 
         # Check if the response contains text content
         if not response or not response.candidates or not response.candidates[0].content or not response.candidates[0].content.parts:
@@ -74,35 +99,20 @@ def analyze_food_image(image_path: str, prompt: str, model_name: str = MODEL_NAM
         response_text = response.text.strip()
         print("\nRaw API Response Text:")
         print(response_text)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            print(f"\nTokens: {usage.prompt_token_count} input, {usage.candidates_token_count} output")
 
         # Attempt to parse the response text as JSON
-        # The model might wrap JSON in markdown code blocks (```json ... ```)
-        # We'll try to find and extract just the JSON part
+        # The model might wrap JSON in markdown code blocks or prose,
+        # so extract the first balanced JSON object in a single pass
         try:
-            # Simple check: does it start with { or [ and end with } or ]?
-            if response_text.startswith('{') and response_text.endswith('}'):
-                 # Directly parse if it looks like pure JSON
-                 parsed_json = json.loads(response_text)
-            elif '```json' in response_text and '```' in response_text:
-                 # Extract content within ```json ... ```
-                 json_start = response_text.find('```json') + len('```json')
-                 json_end = response_text.find('```', json_start)
-                 json_string = response_text[json_start:json_end].strip()
-                 parsed_json = json.loads(json_string)
-            else:
-                 # If it doesn't look like JSON, maybe it's conversational or an empty object
-                 # Try parsing directly just in case, otherwise return text
-                 try:
-                     parsed_json = json.loads(response_text)
-                 except json.JSONDecodeError:
-                     return f"API response did not appear to be valid JSON. Response: {response_text}"
-
-
+            parsed_json = extract_json(response_text, "{")
             print("\nParsed JSON Output:")
             return parsed_json
 
-        except json.JSONDecodeError as e:
-            return f"Failed to decode JSON from response: {e}\nResponse text was:\n{response_text}"
+        except JSONExtractionError:
+            return f"API response did not appear to be valid JSON. Response: {response_text}"
         except Exception as e:
             return f"An unexpected error occurred during JSON parsing: {e}\nResponse text was:\n{response_text}"
 
@@ -112,18 +122,267 @@ def analyze_food_image(image_path: str, prompt: str, model_name: str = MODEL_NAM
     except Exception as e:
         return f"An error occurred during the API call or image processing: {e}"
 
+# --- Bulk mode ---
+def iter_image_paths(source: str) -> Iterator[str]:
+    """
+    List the images to analyze
+
+    Args:
+        source: A directory (walked recursively for image files), or a
+            manifest file with one path per line, or JSON lines with a
+            "path" key. Relative manifest paths resolve against the
+            manifest's directory.
+
+    Yields:
+        Image paths, in a stable order
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield os.path.join(root, name)
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if line.startswith("{") else line
+            yield path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+def load_processed_hashes(output_path: str) -> Set[str]:
+    """
+    Read the image hashes already analyzed successfully into an output file
+
+    Lines cut short by a crash are ignored, so those images are retried.
+
+    Args:
+        output_path: JSONL results file from a previous run
+
+    Returns:
+        SHA-256 hex digests of the images to skip
+    """
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as results:
+        for line in results:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok" and record.get("sha256"):
+                done.add(record["sha256"])
+    return done
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as existing:
+        existing.seek(-1, os.SEEK_END)
+        return existing.read(1) == b"\n"
+
+def _read_and_hash(path: str):
+    with open(path, "rb") as image_file:
+        image_bytes = image_file.read()
+    return image_bytes, hashlib.sha256(image_bytes).hexdigest()
+
+class BulkProgress:
+    """Running throughput and ETA for a bulk run"""
+
+    def __init__(self, total: int, interval: float = 5.0, stream=sys.stderr):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self._started = time.monotonic()
+        self._last_report = self._started
+
+    @property
+    def analyzed(self) -> int:
+        return self.ok + self.failed
+
+    def rate(self) -> float:
+        """Images analyzed per second since the start"""
+        elapsed = time.monotonic() - self._started
+        return self.analyzed / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self) -> Optional[float]:
+        rate = self.rate()
+        remaining = self.total - self.analyzed - self.skipped
+        return remaining / rate if rate > 0 else None
+
+    def report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        eta = self.eta_seconds()
+        eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta is not None else "--:--:--"
+        self.stream.write(
+            f"{self.analyzed + self.skipped}/{self.total} "
+            f"(ok {self.ok}, failed {self.failed}, skipped {self.skipped}) "
+            f"{self.rate():.2f} img/s, ETA {eta_text}\n"
+        )
+        self.stream.flush()
+
+async def _analyze_with_backoff(analyze: Callable[[bytes], Awaitable], image_bytes: bytes, attempts: int = 5):
+    """Run one analysis, waiting out an unavailable model API instead of failing the image"""
+    for attempt in range(attempts):
+        try:
+            return await analyze(image_bytes)
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is None or attempt == attempts - 1:
+                return f"An error occurred during analysis: {e}"
+            await asyncio.sleep(max(1.0, retry_after))
+
+async def bulk_analyze(
+    paths: Iterable[str],
+    output_path: str,
+    analyze: Callable[[bytes], Awaitable],
+    concurrency: int = 8,
+    progress: Optional[BulkProgress] = None,
+) -> BulkProgress:
+    """
+    Analyze many images concurrently, appending one JSON line per image
+
+    Images whose content hash already has a successful record in the
+    output file are skipped, as are repeats within the run, so an
+    interrupted run picks up where it stopped. Each record is flushed
+    as soon as its analysis completes.
+
+    Args:
+        paths: Image paths
+        output_path: JSONL file to append results to
+        analyze: Coroutine function taking image bytes and returning a
+            FoodAnalysis-like object (with model_dump) or an error string
+        concurrency: Maximum analyses in flight
+        progress: Progress tracker (optional)
+
+    Returns:
+        The progress tracker with final counts
+    """
+    paths = list(paths)
+    progress = progress or BulkProgress(len(paths))
+    seen = load_processed_hashes(output_path)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        # Start on a fresh line if a crash left the last record unterminated
+        if output.tell() and not _ends_with_newline(output_path):
+            output.write("\n")
+
+        def write(record: dict) -> None:
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+
+        async def worker() -> None:
+            while True:
+                path = await queue.get()
+                if path is None:
+                    return
+                try:
+                    image_bytes, digest = await asyncio.to_thread(_read_and_hash, path)
+                except OSError as e:
+                    progress.failed += 1
+                    write({"path": path, "sha256": None, "status": "error", "error": str(e)})
+                    continue
+                if digest in seen:
+                    progress.skipped += 1
+                    continue
+                seen.add(digest)
+
+                start = time.monotonic()
+                result = await _analyze_with_backoff(analyze, image_bytes)
+                record = {"path": path, "sha256": digest, "latency_ms": round((time.monotonic() - start) * 1000)}
+                if isinstance(result, str):
+                    progress.failed += 1
+                    record.update(status="error", error=result)
+                else:
+                    progress.ok += 1
+                    record.update(status="ok", analysis=result.model_dump())
+                write(record)
+                progress.report()
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+        for path in paths:
+            await queue.put(path)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    progress.report(force=True)
+    return progress
+
+def build_bulk_service(rpm: float, near_duplicates: bool = False):
+    """
+    Build the analysis service used by bulk runs
+
+    Bulk runs go through the app's service, so they get preprocessing,
+    retries and rate limiting. A backfill wants one analysis per distinct
+    image, so near-duplicate matching is off unless asked for; exact
+    repeats are still skipped by content hash.
+
+    Args:
+        rpm: Model calls per minute (0 for no limit)
+        near_duplicates: Answer visually similar images from earlier results
+
+    Returns:
+        FoodAnalysisService
+    """
+    from app.services.food_analysis_service import FoodAnalysisService
+    from app.services.perceptual_index import PerceptualIndex
+    from app.services.upstream_client import TokenBucket, UpstreamClient
+
+    service = FoodAnalysisService(upstream=UpstreamClient(limiter=TokenBucket(rpm / 60, settings.UPSTREAM_BURST)))
+    service.perceptual_index = PerceptualIndex() if near_duplicates else None
+    return service
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Analyze food images with Gemini")
+    parser.add_argument("image", nargs="?", default=IMAGE_PATH, help="Image to analyze (single mode)")
+    parser.add_argument("--bulk", metavar="SOURCE", help="Directory or manifest of images to analyze")
+    parser.add_argument("--output", default="analyses.jsonl", help="JSONL results file, appended to and used to resume")
+    parser.add_argument("--concurrency", type=int, default=8, help="Analyses in flight")
+    parser.add_argument("--rpm", type=float, default=settings.UPSTREAM_REQUESTS_PER_MINUTE, help="Model calls per minute")
+    parser.add_argument("--model", default=None, help=f"Model to use (default: {MODEL_NAME})")
+    parser.add_argument(
+        "--near-duplicates",
+        action="store_true",
+        help="Reuse results for visually similar images in bulk mode (off: every distinct file is analyzed)",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.bulk:
+        prompt = STRUCTURED_PROMPT if settings.STRUCTURED_OUTPUT_ENABLED else PROMPT
+        result = analyze_food_image(args.image, prompt, args.model or MODEL_NAME)
+        if isinstance(result, dict):
+            print("\nAnalysis Result (JSON):")
+            print(json.dumps(result, indent=4))
+        else:
+            print("\nAnalysis failed or returned non-JSON:")
+            print(result)
+        return
+
+    settings.validate()
+    service = build_bulk_service(args.rpm, args.near_duplicates)
+    service.warmup()
+
+    async def analyze(image_bytes: bytes):
+        return await service.analyze_image_bytes_async(image_bytes, model_name=args.model)
+
+    paths = list(iter_image_paths(args.bulk))
+    print(f"Analyzing {len(paths)} images from {args.bulk} into {args.output}", file=sys.stderr)
+    progress = asyncio.run(bulk_analyze(paths, args.output, analyze, args.concurrency))
+    for model_name, usage in service.usage_report().items():
+        print(f"{model_name}: {json.dumps(usage)}", file=sys.stderr)
+    if progress.failed:
+        sys.exit(1)
+
 # --- Main execution ---
 if __name__ == "__main__":
-    # Replace with the actual path to your image file
-    # You can test with different food images.
-    # Example: Download a picture of pizza, a salad, or a piece of fruit.
-    image_file = "../img/breaded-chicken-mashed-potatos-broccoli.jpeg"  # Ensure this path is correct!
-
-    result = analyze_food_image(image_file, PROMPT, MODEL_NAME)
-
-    if isinstance(result, dict):
-        print("\nAnalysis Result (JSON):")
-        print(json.dumps(result, indent=4))
-    else:
-        print("\nAnalysis failed or returned non-JSON:")
-        print(result)
\ No newline at end of file
+    main()
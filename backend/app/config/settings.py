@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -13,12 +14,101 @@ class Settings:
     VERSION: str = "1.0.0"
     
     # Gemini AI Configuration
+    MODEL_BACKEND: str = os.getenv("MODEL_BACKEND", "gemini")  # "gemini" or "fake"
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     GEMINI_MODEL_NAME: str = os.getenv("GEMINI_MODEL_NAME", "gemini-2.0-flash-lite")
+    GEMINI_ALLOWED_MODELS: list = [
+        name.strip() for name in os.getenv("GEMINI_ALLOWED_MODELS", "").split(",") if name.strip()
+    ]
+    
+    # Structured Output and Cost Accounting
+    STRUCTURED_OUTPUT_ENABLED: bool = os.getenv("STRUCTURED_OUTPUT_ENABLED", "true").lower() == "true"
+    MODEL_MAX_OUTPUT_TOKENS: int = int(os.getenv("MODEL_MAX_OUTPUT_TOKENS", "256"))  # per image
+    # USD per million input/output tokens, as JSON: {"model": [input, output]}
+    MODEL_PRICES: dict = json.loads(os.getenv("MODEL_PRICES", "{}")) or {
+        "gemini-2.0-flash-lite": [0.075, 0.30],
+        "gemini-2.0-flash": [0.10, 0.40],
+        "gemini-1.5-flash": [0.075, 0.30],
+        "gemini-1.5-pro": [1.25, 5.00],
+    }
+    
+    # Analysis Mode: "direct" (the model estimates the macros) or "nutrient_db"
+    # (the model lists items and grams; macros come from the nutrient table)
+    ANALYSIS_MODE: str = os.getenv("ANALYSIS_MODE", "direct")
+    NUTRIENT_DB_PATH: str = os.getenv("NUTRIENT_DB_PATH", "")  # defaults to app/data/nutrients.csv
+    NUTRIENT_MATCH_THRESHOLD: float = float(os.getenv("NUTRIENT_MATCH_THRESHOLD", "0.5"))
+    
+    # Fake Model Backend Configuration (MODEL_BACKEND=fake)
+    FAKE_MODEL_LATENCY_MS: float = float(os.getenv("FAKE_MODEL_LATENCY_MS", "800"))
+    FAKE_MODEL_JITTER_MS: float = float(os.getenv("FAKE_MODEL_JITTER_MS", "200"))
+    FAKE_MODEL_ERROR_RATE: float = float(os.getenv("FAKE_MODEL_ERROR_RATE", "0"))
     
     # File Upload Configuration
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
-    ALLOWED_IMAGE_TYPES: list = ["image/jpeg", "image/png", "image/jpg"]
+    ALLOWED_IMAGE_TYPES: list = ["image/jpeg", "image/png", "image/jpg", "image/webp"]
+    IMAGE_MAX_PIXELS: int = int(os.getenv("IMAGE_MAX_PIXELS", "50000000"))  # decompression bomb guard
+    IMAGE_MIN_EDGE: int = int(os.getenv("IMAGE_MIN_EDGE", "32"))
+    IMAGE_BLANK_STDDEV: float = float(os.getenv("IMAGE_BLANK_STDDEV", "6"))
+    IMAGE_BLUR_THRESHOLD: float = float(os.getenv("IMAGE_BLUR_THRESHOLD", "5"))  # 0 disables
+    # Smooth food (soup, purée) on a plain plate has as little edge response as a blurred photo,
+    # so a low score only logs a warning unless rejection is asked for
+    IMAGE_BLUR_REJECT: bool = os.getenv("IMAGE_BLUR_REJECT", "false").lower() == "true"
+    
+    # Image Preprocessing Configuration
+    IMAGE_PREPROCESS_ENABLED: bool = os.getenv("IMAGE_PREPROCESS_ENABLED", "true").lower() == "true"
+    IMAGE_MAX_EDGE: int = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+    IMAGE_JPEG_QUALITY: int = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+    
+    # Analysis Concurrency Configuration
+    ANALYSIS_MAX_CONCURRENCY: int = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", "32"))
+    ANALYSIS_EXECUTOR_WORKERS: int = int(os.getenv("ANALYSIS_EXECUTOR_WORKERS", "8"))
+    ANALYSIS_BATCH_GROUP_SIZE: int = int(os.getenv("ANALYSIS_BATCH_GROUP_SIZE", "4"))
+    ANALYSIS_BATCH_MAX_IMAGES: int = int(os.getenv("ANALYSIS_BATCH_MAX_IMAGES", "100"))
+    
+    # Background Job Configuration
+    JOB_QUEUE_URL: str = os.getenv("JOB_QUEUE_URL", "memory://")  # or redis://host:6379/0
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "8"))
+    JOB_RESULT_TTL_SECONDS: int = int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+    JOB_CALLBACK_TIMEOUT_SECONDS: float = float(os.getenv("JOB_CALLBACK_TIMEOUT_SECONDS", "10"))
+    JOB_CALLBACK_ATTEMPTS: int = int(os.getenv("JOB_CALLBACK_ATTEMPTS", "3"))
+    JOB_CALLBACK_ALLOW_HTTP: bool = os.getenv("JOB_CALLBACK_ALLOW_HTTP", "false").lower() == "true"
+    JOB_CALLBACK_ALLOWED_HOSTS: list = [  # empty allows any public host
+        host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+    ]
+    JOB_QUEUE_MAX_DEPTH: int = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "1000"))
+    JOB_VISIBILITY_TIMEOUT_SECONDS: float = float(os.getenv("JOB_VISIBILITY_TIMEOUT_SECONDS", "300"))
+    
+    # Server and Shared State Configuration
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))  # worker processes
+    SHARED_STATE_URL: str = os.getenv("SHARED_STATE_URL", "")  # e.g. redis://redis:6379/1
+    SHARED_STATE_TIMEOUT_SECONDS: float = float(os.getenv("SHARED_STATE_TIMEOUT_SECONDS", "0.5"))
+    SHARED_LEASE_TTL_SECONDS: float = float(os.getenv("SHARED_LEASE_TTL_SECONDS", "60"))
+    
+    # Metrics Configuration
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    
+    # Upstream Model API Protection
+    # 0 disables the limiter; the fake backend has no quota, so it is unlimited by default
+    UPSTREAM_REQUESTS_PER_MINUTE: float = float(
+        os.getenv("UPSTREAM_REQUESTS_PER_MINUTE", "0" if MODEL_BACKEND == "fake" else "600")
+    )
+    UPSTREAM_BURST: int = int(os.getenv("UPSTREAM_BURST", "20"))
+    UPSTREAM_MAX_RETRIES: int = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+    UPSTREAM_RETRY_BASE_DELAY: float = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.5"))
+    UPSTREAM_RETRY_MAX_DELAY: float = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "8"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_SECONDS: float = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    
+    # Analysis Cache Configuration
+    ANALYSIS_CACHE_MAX_ENTRIES: int = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "1024"))
+    ANALYSIS_CACHE_TTL_SECONDS: int = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "86400"))
+    ANALYSIS_CACHE_PERSISTENT: bool = os.getenv("ANALYSIS_CACHE_PERSISTENT", "false").lower() == "true"
+    ANALYSIS_CACHE_COLLECTION: str = os.getenv("ANALYSIS_CACHE_COLLECTION", "analysis_cache")
+    
+    # Near-Duplicate Lookup Configuration
+    PHASH_ENABLED: bool = os.getenv("PHASH_ENABLED", "true").lower() == "true"
+    PHASH_MAX_DISTANCE: int = int(os.getenv("PHASH_MAX_DISTANCE", "4"))
+    PHASH_MAX_ENTRIES: int = int(os.getenv("PHASH_MAX_ENTRIES", "500000"))
     
     # CORS Configuration
     BACKEND_CORS_ORIGINS: list = [
@@ -27,15 +117,33 @@ class Settings:
         "http://frontend:3000",   # Docker container
     ]
     
-    # Database Configuration (for future use)
+    # Database Configuration
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "prompted_plate")
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+    MONGODB_TIMEOUT_MS: int = int(os.getenv("MONGODB_TIMEOUT_MS", "2000"))
+    
+    # Analysis History Configuration
+    ANALYSIS_HISTORY_ENABLED: bool = os.getenv("ANALYSIS_HISTORY_ENABLED", "false").lower() == "true"
+    ANALYSIS_HISTORY_COLLECTION: str = os.getenv("ANALYSIS_HISTORY_COLLECTION", "analyses")
+    DEFAULT_USER_ID: str = os.getenv("DEFAULT_USER_ID", "anonymous")
+    NUTRITION_ROLLUPS_ENABLED: bool = os.getenv("NUTRITION_ROLLUPS_ENABLED", "true").lower() == "true"
+    NUTRITION_ROLLUP_COLLECTION: str = os.getenv("NUTRITION_ROLLUP_COLLECTION", "nutrition_rollups")
+    CHART_CACHE_MAX_AGE: int = int(os.getenv("CHART_CACHE_MAX_AGE", "60"))
+    CHART_MONTHS: int = int(os.getenv("CHART_MONTHS", "12"))
+    CHART_MACRO_DAYS: int = int(os.getenv("CHART_MACRO_DAYS", "30"))
     
     @classmethod
     def validate(cls):
         """Validate required settings"""
-        if not cls.GEMINI_API_KEY:
+        if cls.MODEL_BACKEND == "gemini" and not cls.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY environment variable is required")
+        if cls.ANALYSIS_MODE not in ("direct", "nutrient_db"):
+            raise ValueError(f"ANALYSIS_MODE must be 'direct' or 'nutrient_db', not '{cls.ANALYSIS_MODE}'")
+        if cls.UPSTREAM_REQUESTS_PER_MINUTE < 0:
+            raise ValueError("UPSTREAM_REQUESTS_PER_MINUTE must be 0 (unlimited) or a positive rate")
+        if cls.UPSTREAM_BURST < 1:
+            raise ValueError("UPSTREAM_BURST must be at least 1")
 
 # Create settings instance
 settings = Settings() 
\ No newline at end of file
@@ -1,18 +1,34 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .config.settings import settings
 from .routes import food
+from .utils.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from .utils.request_limits import UploadSizeLimitMiddleware
 
-# Validate settings
-settings.validate()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build this worker's services and warm them before the first request"""
+    # Checked here rather than on import, so tooling and tests can import the app without a key
+    settings.validate()
+    await food.services.startup()
+    yield
+    await food.services.shutdown()
 
 # Create FastAPI app
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    description="AI-powered food analysis API using Gemini"
+    description="AI-powered food analysis API using Gemini",
+    lifespan=lifespan
 )
 
+# Reject oversized uploads before Starlette spools the form; added first so CORS headers still wrap the 413
+app.add_middleware(UploadSizeLimitMiddleware, max_size=lambda: settings.MAX_FILE_SIZE)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -22,9 +38,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request latency histograms
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(food.router, prefix=settings.API_V1_STR)
 
+_CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+def _register_service_metrics() -> None:
+    """Export cache, job queue and upstream state, read only when /metrics is scraped"""
+    def cache_lookups():
+        stats = food.services.food_service.cache_stats()
+        lookups = {("exact", "hit"): stats["exact"]["hits"], ("exact", "miss"): stats["exact"]["misses"]}
+        if "near_duplicate" in stats:
+            lookups[("near_duplicate", "hit")] = stats["near_duplicate"]["hits"]
+            lookups[("near_duplicate", "miss")] = stats["near_duplicate"]["misses"]
+        return lookups
+    
+    REGISTRY.callback(
+        "analysis_cache_lookups", "Analysis cache lookups by tier and result",
+        cache_lookups, ("tier", "result"), kind="counter",
+    )
+    REGISTRY.callback(
+        "analysis_cache_entries", "Entries held by each analysis cache tier",
+        lambda: {tier: stats["entries"] for tier, stats in food.services.food_service.cache_stats().items() if "entries" in stats},
+        ("tier",),
+    )
+    REGISTRY.callback(
+        "analysis_jobs_running", "Background analyses currently running in this process",
+        lambda: food.services.job_queue.stats()["running"],
+    )
+    REGISTRY.callback(
+        "analysis_jobs", "Background analyses by outcome",
+        lambda: {status: food.services.job_queue.stats()[status] for status in ("submitted", "succeeded", "failed")},
+        ("status",), kind="counter",
+    )
+    REGISTRY.callback(
+        "model_circuit_state", "Model API circuit breaker state (0 closed, 1 half-open, 2 open)",
+        lambda: _CIRCUIT_STATES[food.services.food_service.upstream_stats()["circuit"]["state"]],
+    )
+    REGISTRY.callback(
+        "model_rate_limit_tokens", "Model calls available before the rate limiter throttles",
+        lambda: food.services.food_service.upstream_stats()["limiter"]["tokens"],
+    )
+    REGISTRY.callback(
+        "model_rate_limit_wait_seconds", "Time model calls spent waiting on the rate limiter",
+        lambda: food.services.food_service.upstream_stats()["limiter"]["wait_seconds"], kind="counter",
+    )
+
+_register_service_metrics()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/health")
+def health_check():
+    return {"status": "healthy"}
+
 @app.get("/")
 def read_root():
     return {
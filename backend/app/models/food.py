@@ -1,13 +1,142 @@
-from pydantic import BaseModel
-from typing import Optional
+import re
+from datetime import datetime
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Any, Dict, List, Optional
+
+_NUMBER = r"(\d+(?:,\d{3})*(?:\.\d+)?)"
+_AMOUNT = re.compile(_NUMBER + r"(?:\s*(?:-|–|to)\s*" + _NUMBER + r")?\s*([a-zA-Z]*)")
+
+# Unit -> factor to the field's base unit (kcal for energy, grams for mass)
+_ENERGY_UNITS = {"": 1.0, "kcal": 1.0, "cal": 1.0, "calories": 1.0, "kj": 1 / 4.184}
+_MASS_UNITS = {"": 1.0, "g": 1.0, "gram": 1.0, "grams": 1.0, "mg": 0.001, "kg": 1000.0}
+
+def parse_amount(value: Optional[str], units: dict) -> Optional[float]:
+    """
+    Parse a model-reported amount such as "20g", "740 kcal" or "20-25 g"
+    
+    Args:
+        value: Amount as reported by the model
+        units: Mapping of lower-case unit to conversion factor
+        
+    Returns:
+        The amount in the base unit (ranges use their midpoint), or None
+    """
+    if value is None:
+        return None
+    match = _AMOUNT.search(value)
+    if not match:
+        return None
+    low = float(match.group(1).replace(",", ""))
+    high = float(match.group(2).replace(",", "")) if match.group(2) else low
+    factor = units.get(match.group(3).lower())
+    if factor is None:
+        return None
+    return round((low + high) / 2 * factor, 2)
+
+class FoodItem(BaseModel):
+    """Model for a recognized food item, with nutrients from the nutrient database"""
+    name: str = Field(description='Short generic food name, e.g. "white rice"')
+    grams: float = Field(description="Estimated weight in grams")
+    matched: Optional[str] = None
+    calories_kcal: Optional[float] = None
+    protein_g: Optional[float] = None
+    carbohydrates_g: Optional[float] = None
+    fat_g: Optional[float] = None
+    
+    @field_validator("grams", mode="before")
+    @classmethod
+    def _parse_grams(cls, value):
+        """Accept weights reported as strings, e.g. "150 g" """
+        if isinstance(value, str):
+            return parse_amount(value, _MASS_UNITS)
+        return value
 
 class FoodAnalysis(BaseModel):
     """Model for food analysis results from AI"""
-    calories: Optional[str] = None
-    protein: Optional[str] = None
-    carbohydrates: Optional[str] = None
-    fat: Optional[str] = None
+    calories: Optional[str] = Field(None, description='Energy in kcal, e.g. "740"')
+    protein: Optional[str] = Field(None, description='Protein in grams, e.g. "20g"')
+    carbohydrates: Optional[str] = Field(None, description='Carbohydrates in grams, e.g. "30g"')
+    fat: Optional[str] = Field(None, description='Fat in grams, e.g. "15g"')
+    
+    # Numeric values normalized from the strings above
+    calories_kcal: Optional[float] = None
+    protein_g: Optional[float] = None
+    carbohydrates_g: Optional[float] = None
+    fat_g: Optional[float] = None
+    
+    # Recognized items, when the totals come from the nutrient database
+    items: Optional[List[FoodItem]] = None
+    
+    @field_validator("calories", "protein", "carbohydrates", "fat", mode="before")
+    @classmethod
+    def _coerce_to_str(cls, value):
+        """Models sometimes emit bare numbers instead of strings"""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        return value
+    
+    @model_validator(mode="after")
+    def _normalize_amounts(self):
+        if self.calories_kcal is None:
+            self.calories_kcal = parse_amount(self.calories, _ENERGY_UNITS)
+        if self.protein_g is None:
+            self.protein_g = parse_amount(self.protein, _MASS_UNITS)
+        if self.carbohydrates_g is None:
+            self.carbohydrates_g = parse_amount(self.carbohydrates, _MASS_UNITS)
+        if self.fat_g is None:
+            self.fat_g = parse_amount(self.fat, _MASS_UNITS)
+        return self
+    
+# Fields the model reports; the numeric fields are derived from them
+REPORTED_FIELDS = ("calories", "protein", "carbohydrates", "fat")
+
+_SCHEMA_TYPES = {str: "STRING", float: "NUMBER", int: "INTEGER", bool: "BOOLEAN"}
+
+def _schema_properties(model, names) -> Dict[str, Any]:
+    """Schema properties for some fields of a pydantic model"""
+    properties: Dict[str, Any] = {}
+    for name in names:
+        field = model.model_fields[name]
+        # Optional[X] -> X
+        field_type = field.annotation
+        if getattr(field_type, "__args__", None):
+            field_type = next(arg for arg in field_type.__args__ if arg is not type(None))
+        properties[name] = {"type": _SCHEMA_TYPES[field_type], "description": field.description}
+    return properties
+
+def _batch_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Array of the given object schema, each carrying its image "index" """
+    item = dict(schema, properties={"index": {"type": "INTEGER"}, **schema["properties"]})
+    item["required"] = ["index", *schema.get("required", [])]
+    return {"type": "ARRAY", "items": item}
+
+def food_analysis_schema(batch: bool = False) -> Dict[str, Any]:
+    """
+    Response schema for structured model output, derived from FoodAnalysis
+    
+    Args:
+        batch: Describe an array of objects carrying their image "index"
+        
+    Returns:
+        Schema in the format the Gemini API accepts as response_schema
+    """
+    schema = {"type": "OBJECT", "properties": _schema_properties(FoodAnalysis, REPORTED_FIELDS)}
+    return _batch_schema(schema) if batch else schema
+
+def food_items_schema(batch: bool = False) -> Dict[str, Any]:
+    """
+    Response schema asking only for item names and weights, derived from FoodItem
     
+    Args:
+        batch: Describe an array of objects carrying their image "index"
+        
+    Returns:
+        Schema in the format the Gemini API accepts as response_schema
+    """
+    item = {"type": "OBJECT", "properties": _schema_properties(FoodItem, ("name", "grams")), "required": ["name", "grams"]}
+    schema = {"type": "OBJECT", "properties": {"items": {"type": "ARRAY", "items": item}}, "required": ["items"]}
+    return _batch_schema(schema) if batch else schema
+
 class ChartDataItem(BaseModel):
     """Model for chart data items"""
     label: str
@@ -16,4 +145,37 @@ class ChartDataItem(BaseModel):
 class FoodImageRequest(BaseModel):
     """Model for food image analysis request"""
     image_path: str
-    prompt: Optional[str] = None 
\ No newline at end of file
+    prompt: Optional[str] = None
+    model: Optional[str] = None
+    user_id: Optional[str] = None
+
+class BatchImageRequest(BaseModel):
+    """Model for batch food image analysis request"""
+    image_paths: List[str]
+    prompt: Optional[str] = None
+    model: Optional[str] = None
+    user_id: Optional[str] = None
+
+class BatchAnalysisItem(BaseModel):
+    """Model for a single result of a batch analysis"""
+    index: int
+    analysis: Optional[FoodAnalysis] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    """Model for batch food analysis results"""
+    results: List[BatchAnalysisItem]
+
+class AnalysisJob(BaseModel):
+    """Model for a queued food analysis and its outcome"""
+    job_id: str
+    status: str
+    priority: int = 0
+    prompt: Optional[str] = None
+    model: Optional[str] = None
+    user_id: Optional[str] = None
+    callback_url: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    analysis: Optional[FoodAnalysis] = None
+    error: Optional[str] = None
@@ -1,16 +1,38 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from typing import List
-import os
-import tempfile
-from ..models.food import FoodAnalysis, ChartDataItem, FoodImageRequest
-from ..services.food_analysis_service import FoodAnalysisService
-from ..services.chart_data_service import ChartDataService
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
+from typing import Any, List, Optional
+import hashlib
+import json
+import logging
+from ..config.settings import settings
+from ..models.food import (
+    AnalysisJob,
+    FoodAnalysis,
+    ChartDataItem,
+    FoodImageRequest,
+    BatchImageRequest,
+    BatchAnalysisItem,
+    BatchAnalysisResponse,
+)
+from ..services.job_queue import CallbackURLError, QueueFullError
+from ..services.registry import ServiceRegistry
+from ..services.upstream_client import UpstreamUnavailableError
+from ..utils.validators import ImageValidationError
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/food", tags=["food"])
 
-# Initialize services
-food_service = FoodAnalysisService()
-chart_service = ChartDataService()
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+async def _run_job(job: AnalysisJob, image_bytes: bytes):
+    """Analyze a queued upload and record it like a synchronous one"""
+    result = await services.food_service.analyze_image_bytes_async(image_bytes, job.prompt, job.model)
+    await _save_history(job.user_id, [result], job.model)
+    return result
+
+# Services are built per worker process, in the app lifespan or on first use
+services = ServiceRegistry(_run_job)
 
 @router.get("/", response_model=dict)
 async def get_food_root():
@@ -18,7 +40,7 @@ async def get_food_root():
     return {"message": "Food Analysis API"}
 
 @router.post("/analyze", response_model=FoodAnalysis)
-async def analyze_food_image(request: FoodImageRequest):
+async def analyze_food_image(request: FoodImageRequest, background_tasks: BackgroundTasks):
     """
     Analyze a food image and return nutritional information
     
@@ -29,20 +51,61 @@ async def analyze_food_image(request: FoodImageRequest):
         FoodAnalysis object with nutritional data
     """
     try:
-        result = food_service.analyze_food_image(request.image_path, request.prompt)
+        result = await services.food_service.analyze_food_image_async(request.image_path, request.prompt, request.model)
         
         if isinstance(result, str):
             raise HTTPException(status_code=400, detail=result)
         
+        _record_history(background_tasks, request.user_id, [result], request.model)
         return result
         
+    except HTTPException:
+        raise
+    except UpstreamUnavailableError as e:
+        raise _upstream_unavailable(e)
+    except ImageValidationError as e:
+        raise _image_rejected(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@router.post("/analyze-batch", response_model=BatchAnalysisResponse)
+async def analyze_food_image_batch(request: BatchImageRequest, background_tasks: BackgroundTasks):
+    """
+    Analyze several food images, packing them into as few model calls as possible
+    
+    Args:
+        request: BatchImageRequest containing image paths and optional prompt
+        
+    Returns:
+        BatchAnalysisResponse with one result or error per image, by index
+    """
+    if not request.image_paths:
+        raise HTTPException(status_code=400, detail="At least one image path is required")
+    if len(request.image_paths) > settings.ANALYSIS_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.ANALYSIS_BATCH_MAX_IMAGES} images can be analyzed per batch",
+        )
+    
+    try:
+        results = await services.food_service.analyze_batch(request.image_paths, request.prompt, request.model)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    
+    _record_history(background_tasks, request.user_id, results, request.model)
+    return BatchAnalysisResponse(results=[
+        BatchAnalysisItem(index=i, error=result) if isinstance(result, str)
+        else BatchAnalysisItem(index=i, analysis=result)
+        for i, result in enumerate(results)
+    ])
+
 @router.post("/analyze-upload", response_model=FoodAnalysis)
 async def analyze_uploaded_food_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    prompt: str = None
+    prompt: str = None,
+    model: str = None,
+    user_id: str = None
 ):
     """
     Analyze an uploaded food image
@@ -50,6 +113,8 @@ async def analyze_uploaded_food_image(
     Args:
         file: Uploaded image file
         prompt: Optional custom prompt
+        model: Optional model from the configured allowlist
+        user_id: Optional user the analysis is recorded for
         
     Returns:
         FoodAnalysis object with nutritional data
@@ -59,37 +124,225 @@ async def analyze_uploaded_food_image(
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        # Decode straight from memory; no temp file round trip
+        content = await _read_upload(file, settings.MAX_FILE_SIZE)
         
-        try:
-            # Analyze the image
-            result = food_service.analyze_food_image(temp_file_path, prompt)
-            
-            if isinstance(result, str):
-                raise HTTPException(status_code=400, detail=result)
-            
-            return result
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+        # Analyze the image
+        result = await services.food_service.analyze_image_bytes_async(content, prompt, model)
+        
+        if isinstance(result, str):
+            raise HTTPException(status_code=400, detail=result)
+        
+        _record_history(background_tasks, user_id, [result], model)
+        return result
                 
     except HTTPException:
         raise
+    except UpstreamUnavailableError as e:
+        raise _upstream_unavailable(e)
+    except ImageValidationError as e:
+        raise _image_rejected(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@router.post("/analyze-stream")
+async def analyze_uploaded_food_image_stream(
+    file: UploadFile = File(...),
+    prompt: str = None,
+    model: str = None,
+    user_id: str = None
+):
+    """
+    Analyze an uploaded food image, streaming progress as Server-Sent Events
+    
+    Emits "chunk" events with partial model output while it is generated,
+    then a final "result" event with the FoodAnalysis or an "error" event.
+    
+    Args:
+        file: Uploaded image file
+        prompt: Optional custom prompt
+        model: Optional model from the configured allowlist
+        user_id: Optional user the analysis is recorded for
+        
+    Returns:
+        text/event-stream response
+    """
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    content = await _read_upload(file, settings.MAX_FILE_SIZE)
+    
+    async def events():
+        async for event, data in services.food_service.analyze_image_bytes_stream(content, prompt, model):
+            if isinstance(data, FoodAnalysis):
+                await _save_history(user_id, [data], model)
+                data = data.model_dump()
+            yield _sse_event(event, data)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/analyze-jobs", response_model=AnalysisJob, status_code=202)
+async def submit_analysis_job(
+    file: UploadFile = File(...),
+    prompt: str = None,
+    model: str = None,
+    user_id: str = None,
+    priority: int = 0,
+    callback_url: str = None
+):
+    """
+    Queue an uploaded food image for background analysis
+    
+    Returns immediately with a job ID. Poll GET /jobs/{job_id}, or pass a
+    callback_url to receive the finished job as a JSON POST.
+    
+    Args:
+        file: Uploaded image file
+        prompt: Optional custom prompt
+        model: Optional model from the configured allowlist
+        user_id: Optional user the analysis is recorded for
+        priority: Lower values run first (default 0)
+        callback_url: Optional URL notified when the job finishes
+        
+    Returns:
+        The queued AnalysisJob
+    """
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    content = await _read_upload(file, settings.MAX_FILE_SIZE)
+    try:
+        return await services.job_queue.submit(content, prompt, model, user_id, priority, callback_url)
+    except CallbackURLError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJob)
+async def get_analysis_job(job_id: str):
+    """Get the status, and once finished the result, of a background analysis"""
+    job = await services.job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _record_history(
+    background_tasks: BackgroundTasks,
+    user_id: Optional[str],
+    results: List[Any],
+    model: Optional[str],
+) -> None:
+    """Persist successful analyses after the response has been sent"""
+    if services.history is not None:
+        background_tasks.add_task(_save_history, user_id, results, model)
+
+async def _save_history(user_id: Optional[str], results: List[Any], model: Optional[str]) -> None:
+    """Write analyses to the history; failures are logged, never surfaced to the client"""
+    history = services.history
+    if history is None:
+        return
+    for result in results:
+        if not isinstance(result, FoodAnalysis):
+            continue
+        try:
+            await history.record(user_id or settings.DEFAULT_USER_ID, result, model or services.food_service.model_name)
+        except Exception as e:
+            logger.warning("Could not record analysis history: %s", e)
+
+def _upstream_unavailable(error: UpstreamUnavailableError) -> HTTPException:
+    """503 telling the client when the model API is worth retrying"""
+    retry_after = max(1, int(error.retry_after + 0.999))
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(retry_after)})
+
+def _image_rejected(error: ImageValidationError) -> HTTPException:
+    """Error response for an image that failed pre-flight validation"""
+    return HTTPException(status_code=error.status_code, detail={"code": error.code, "message": str(error)})
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _read_upload(file: UploadFile, max_size: int) -> bytes:
+    """
+    Read an upload in chunks, rejecting it if it exceeds max_size
+    
+    UploadSizeLimitMiddleware bounds the request body; this checks the
+    parsed file itself, before reading it when its size is already known.
+    
+    Args:
+        file: Uploaded file
+        max_size: Maximum accepted size in bytes
+        
+    Returns:
+        The file content
+    """
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(status_code=413, detail=f"File exceeds maximum size of {max_size} bytes")
+    chunks = []
+    total = 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_size:
+            raise HTTPException(status_code=413, detail=f"File exceeds maximum size of {max_size} bytes")
+        chunks.append(chunk)
+    # A single join; the service hashes and decodes this buffer without further copies
+    return b"".join(chunks)
+
+@router.get("/cache-stats", response_model=dict)
+async def get_cache_stats():
+    """Get analysis cache hit/miss counters"""
+    return services.food_service.cache_stats()
+
+@router.get("/upstream-stats", response_model=dict)
+async def get_upstream_stats():
+    """Get model API rate limiter, retry and circuit breaker state"""
+    return services.food_service.upstream_stats()
+
+@router.get("/usage-stats", response_model=dict)
+async def get_usage_stats():
+    """Get token usage, latency and cost per model"""
+    return services.food_service.usage_report()
+
 @router.get("/chart-data", response_model=List[ChartDataItem])
-async def get_chart_data():
-    """Get dummy chart data"""
-    return chart_service.get_dummy_chart_data()
+async def get_chart_data(request: Request, user_id: str = settings.DEFAULT_USER_ID):
+    """Get calories per month from the analysis history (dummy data when history is disabled)"""
+    try:
+        items = await services.chart_service.get_monthly_chart_data(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Chart data unavailable: {str(e)}")
+    return _chart_response(request, items)
 
 @router.get("/nutrition-chart", response_model=List[ChartDataItem])
-async def get_nutrition_chart_data():
-    """Get nutrition chart data"""
-    return chart_service.get_nutrition_chart_data() 
\ No newline at end of file
+async def get_nutrition_chart_data(request: Request, user_id: str = settings.DEFAULT_USER_ID):
+    """Get the macronutrient split from the analysis history (dummy data when history is disabled)"""
+    try:
+        items = await services.chart_service.get_macro_chart_data(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Chart data unavailable: {str(e)}")
+    return _chart_response(request, items)
+
+def _chart_response(request: Request, items: List[ChartDataItem]) -> Response:
+    """
+    Serialize chart data with an ETag, answering 304 when the client's copy is current
+    
+    Args:
+        request: Incoming request, checked for If-None-Match
+        items: Chart data
+        
+    Returns:
+        JSON response, or an empty 304 response
+    """
+    body = json.dumps([item.model_dump() for item in items], separators=(",", ":")).encode()
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={settings.CHART_CACHE_MAX_AGE}"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers) 
\ No newline at end of file
@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence
+
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(image_bytes: bytes, prompt: str, model_name: str) -> str:
+    """
+    Build a content-addressed cache key
+
+    Args:
+        image_bytes: Raw bytes of the image
+        prompt: Prompt sent with the image
+        model_name: Name of the model used for the analysis
+
+    Returns:
+        Hex SHA-256 digest over image, prompt and model
+    """
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(image_bytes).digest())
+    digest.update(prompt.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(model_name.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class MongoCacheStore:
+    """Persistent cache tier backed by a MongoDB collection"""
+
+    def __init__(self, url: str, database_name: str, collection_name: str, ttl_seconds: int):
+        self.url = url
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.ttl_seconds = ttl_seconds
+        self._collection = None
+
+    def _get_collection(self):
+        if self._collection is None:
+            from pymongo import MongoClient
+
+            client = MongoClient(self.url, serverSelectionTimeoutMS=1000)
+            collection = client[self.database_name][self.collection_name]
+            collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+            self._collection = collection
+        return self._collection
+
+    def get(self, key: str) -> Optional[Dict]:
+        document = self._get_collection().find_one({"_id": key})
+        return document["result"] if document else None
+
+    def set(self, key: str, value: Dict) -> None:
+        self._get_collection().replace_one(
+            {"_id": key},
+            {"_id": key, "result": value, "created_at": datetime.now(timezone.utc)},
+            upsert=True,
+        )
+
+
+class AnalysisCache:
+    """
+    Tiered cache for analysis results
+
+    An in-process LRU sits in front of optional persistent stores, ordered
+    fastest first (shared Redis, then MongoDB). A hit in a slower store is
+    copied into the faster ones; writes go to every tier.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.ANALYSIS_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = settings.ANALYSIS_CACHE_TTL_SECONDS,
+        stores: Sequence = (),
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stores = list(stores)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.store_hits = 0
+        self.store_errors = 0
+        self.stale_hits = 0
+
+    @classmethod
+    def from_settings(cls) -> "AnalysisCache":
+        """Create a cache configured from application settings"""
+        from .shared_state import RedisCacheStore, get_blocking_redis_client, get_redis_client
+
+        stores = []
+        redis_client = get_redis_client()
+        if redis_client is not None:
+            stores.append(RedisCacheStore(redis_client, get_blocking_redis_client(), settings.ANALYSIS_CACHE_TTL_SECONDS))
+        if settings.ANALYSIS_CACHE_PERSISTENT:
+            stores.append(MongoCacheStore(
+                settings.MONGODB_URL,
+                settings.DATABASE_NAME,
+                settings.ANALYSIS_CACHE_COLLECTION,
+                settings.ANALYSIS_CACHE_TTL_SECONDS,
+            ))
+        return cls(stores=stores)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached result
+
+        Blocks on the persistent tiers; from a coroutine use get_async.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Cached result dict, or None on a miss
+        """
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        for index, store in enumerate(self.stores):
+            try:
+                value = store.get(key)
+            except Exception as e:
+                self._store_failed("lookup", e)
+                continue
+            if value is not None:
+                for faster in self.stores[:index]:
+                    self._save(faster, key, value)
+                return self._fill(key, value)
+        return self._miss()
+
+    async def get_async(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached result without blocking the event loop
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Cached result dict, or None on a miss
+        """
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        for index, store in enumerate(self.stores):
+            try:
+                value = await _call_async(store, "get", key)
+            except Exception as e:
+                self._store_failed("lookup", e)
+                continue
+            if value is not None:
+                for faster in self.stores[:index]:
+                    await self._save_async(faster, key, value)
+                return self._fill(key, value)
+        return self._miss()
+
+    def _get_local(self, key: str) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(value)
+                # Expired entries stay until LRU eviction so they can be served stale
+        return None
+
+    def _fill(self, key: str, value: Dict) -> Dict:
+        """Copy a persistent-tier hit into the in-process tier"""
+        self._put_local(key, value)
+        with self._lock:
+            self.hits += 1
+            self.store_hits += 1
+        return dict(value)
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_stale(self, key: str) -> Optional[Dict]:
+        """
+        Look up an in-process result even if its TTL has passed
+
+        Used as a fallback while the model API is unavailable.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Cached result dict, or None if the entry was evicted
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.stale_hits += 1
+            return dict(entry[1])
+
+    def set(self, key: str, value: Dict) -> None:
+        """Store a result in all cache tiers; blocks on the persistent tiers, so coroutines use set_async"""
+        self._put_local(key, value)
+        for store in self.stores:
+            self._save(store, key, value)
+
+    async def set_async(self, key: str, value: Dict) -> None:
+        """Store a result in all cache tiers without blocking the event loop"""
+        self._put_local(key, value)
+        for store in self.stores:
+            await self._save_async(store, key, value)
+
+    def _save(self, store, key: str, value: Dict) -> None:
+        try:
+            store.set(key, value)
+        except Exception as e:
+            self._store_failed("write", e)
+
+    async def _save_async(self, store, key: str, value: Dict) -> None:
+        try:
+            await _call_async(store, "set", key, value)
+        except Exception as e:
+            self._store_failed("write", e)
+
+    def _store_failed(self, action: str, error: Exception) -> None:
+        with self._lock:
+            self.store_errors += 1
+        logger.warning("Persistent analysis cache %s failed: %s", action, error)
+
+    def _put_local(self, key: str, value: Dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all in-process entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.store_hits = 0
+            self.store_errors = 0
+            self.stale_hits = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "store_hits": self.store_hits,
+                "store_errors": self.store_errors,
+                "stale_hits": self.stale_hits,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+async def _call_async(store, method: str, *args):
+    """Await a store's native async method, or run its blocking one on a thread"""
+    native = getattr(store, f"{method}_async", None)
+    if native is not None:
+        return await native(*args)
+    return await asyncio.to_thread(getattr(store, method), *args)
@@ -0,0 +1,129 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from ..config.settings import settings
+from ..models.food import FoodAnalysis
+from .nutrition_rollups import NutritionRollupRepository
+
+logger = logging.getLogger(__name__)
+
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+]
+
+
+class AnalysisHistoryRepository:
+    """Stores analyses per user and aggregates them for the chart endpoints"""
+
+    def __init__(self, collection, rollups: Optional[NutritionRollupRepository] = None):
+        self.collection = collection
+        self.rollups = rollups
+        self._transactions: Optional[bool] = None
+
+    async def ensure_indexes(self) -> None:
+        """Create the compound index every history query filters and sorts on"""
+        await self.collection.create_index([("user_id", 1), ("timestamp", -1)], name="user_timestamp")
+        if self.rollups is not None:
+            await self.rollups.ensure_indexes()
+
+    async def record(
+        self,
+        user_id: str,
+        analysis: FoodAnalysis,
+        model_name: Optional[str] = None,
+        timestamp: Optional[datetime] = None,
+    ) -> None:
+        """
+        Persist one analysis
+
+        On a replica set or sharded cluster the analysis and its rollup
+        increments are written in one transaction. A standalone server has
+        no transactions, so they are written one after the other; rollups
+        left behind by a failure in between are repaired by a rebuild.
+
+        Args:
+            user_id: Owner of the analysis
+            analysis: Analysis result
+            model_name: Model that produced it (optional)
+            timestamp: When the meal was analyzed (default: now)
+        """
+        timestamp = timestamp or datetime.now(timezone.utc)
+        document = analysis.model_dump()
+        document.update(user_id=user_id, model=model_name, timestamp=timestamp)
+        if self.rollups is None:
+            await self.collection.insert_one(document)
+            return
+        if self._transactions is None:
+            self._transactions = await _supports_transactions(self.collection.database)
+        if not self._transactions:
+            await self.collection.insert_one(document)
+            await self.rollups.add(user_id, analysis, timestamp)
+            return
+        async with await self.collection.database.client.start_session() as session:
+            async with session.start_transaction():
+                await self.collection.insert_one(document, session=session)
+                await self.rollups.add(user_id, analysis, timestamp, session=session)
+
+    async def monthly_calories(self, user_id: str, months: int = settings.CHART_MONTHS) -> List[Dict]:
+        """
+        Total calories per calendar month
+
+        Args:
+            user_id: Owner of the analyses
+            months: How many months back to include
+
+        Returns:
+            List of {"year", "month", "value"} dicts in chronological order
+        """
+        since = datetime.now(timezone.utc) - timedelta(days=31 * months)
+        pipeline = [
+            {"$match": {"user_id": user_id, "timestamp": {"$gte": since}}},
+            {"$group": {
+                "_id": {"year": {"$year": "$timestamp"}, "month": {"$month": "$timestamp"}},
+                "value": {"$sum": {"$ifNull": ["$calories_kcal", 0]}},
+            }},
+            {"$sort": {"_id.year": 1, "_id.month": 1}},
+        ]
+        rows = await self.collection.aggregate(pipeline).to_list(length=None)
+        return [
+            {"year": row["_id"]["year"], "month": row["_id"]["month"], "value": row["value"]}
+            for row in rows[-months:]
+        ]
+
+    async def macro_totals(self, user_id: str, days: int = settings.CHART_MACRO_DAYS) -> Dict[str, float]:
+        """
+        Total grams of protein, carbohydrates and fat
+
+        Args:
+            user_id: Owner of the analyses
+            days: How many days back to include
+
+        Returns:
+            Dict with "protein", "carbohydrates" and "fat" grams
+        """
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        pipeline = [
+            {"$match": {"user_id": user_id, "timestamp": {"$gte": since}}},
+            {"$group": {
+                "_id": None,
+                "protein": {"$sum": {"$ifNull": ["$protein_g", 0]}},
+                "carbohydrates": {"$sum": {"$ifNull": ["$carbohydrates_g", 0]}},
+                "fat": {"$sum": {"$ifNull": ["$fat_g", 0]}},
+            }},
+        ]
+        rows = await self.collection.aggregate(pipeline).to_list(length=1)
+        if not rows:
+            return {"protein": 0.0, "carbohydrates": 0.0, "fat": 0.0}
+        return {key: rows[0][key] for key in ("protein", "carbohydrates", "fat")}
+
+
+async def _supports_transactions(database) -> bool:
+    """Transactions need a replica set member or mongos; a standalone server rejects them"""
+    try:
+        hello = await database.command("hello")
+    except Exception as e:
+        logger.info("Could not check for MongoDB transaction support: %s", e)
+        return False
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
@@ -1,9 +1,68 @@
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from ..config.settings import settings
 from ..models.food import ChartDataItem
+from .analysis_history import MONTH_NAMES, AnalysisHistoryRepository
+from .nutrition_rollups import DAY, MONTH, day_bucket, month_bucket
 
 class ChartDataService:
     """Service for providing chart data"""
     
+    def __init__(self, history: Optional[AnalysisHistoryRepository] = None):
+        self.history = history
+    
+    async def get_monthly_chart_data(self, user_id: str) -> List[ChartDataItem]:
+        """
+        Returns total calories per month for a user, or dummy data without history
+        
+        The last CHART_MONTHS months up to the current one are always
+        returned, labelled with their year, with 0 for months without meals.
+        """
+        if self.history is None:
+            return self.get_dummy_chart_data()
+        since = month_bucket(datetime.now(timezone.utc), settings.CHART_MONTHS - 1)
+        if self.history.rollups is not None:
+            buckets = await self.history.rollups.buckets(user_id, MONTH, since)
+            totals = {(bucket["bucket"].year, bucket["bucket"].month): bucket["calories"] for bucket in buckets}
+        else:
+            rows = await self.history.monthly_calories(user_id)
+            totals = {(row["year"], row["month"]): row["value"] for row in rows}
+        months = [month_bucket(since, -offset) for offset in range(settings.CHART_MONTHS)]
+        return [
+            ChartDataItem(
+                label=f"{MONTH_NAMES[month.month - 1]} {month.year}",
+                value=round(totals.get((month.year, month.month), 0)),
+            )
+            for month in months
+        ]
+    
+    async def get_macro_chart_data(self, user_id: str) -> List[ChartDataItem]:
+        """Returns a user's share of calories from each macronutrient, in percent"""
+        if self.history is None:
+            return self.get_nutrition_chart_data()
+        if self.history.rollups is not None:
+            since = day_bucket(datetime.now(timezone.utc) - timedelta(days=settings.CHART_MACRO_DAYS - 1))
+            buckets = await self.history.rollups.buckets(user_id, DAY, since)
+            return self.macro_split(
+                sum(bucket["protein"] for bucket in buckets),
+                sum(bucket["carbohydrates"] for bucket in buckets),
+                sum(bucket["fat"] for bucket in buckets),
+            )
+        totals = await self.history.macro_totals(user_id)
+        return self.macro_split(totals["protein"], totals["carbohydrates"], totals["fat"])
+    
+    @staticmethod
+    def macro_split(protein_g: float, carbohydrates_g: float, fat_g: float) -> List[ChartDataItem]:
+        """Convert macro grams into percentages of energy (4/4/9 kcal per gram)"""
+        energy = [protein_g * 4, carbohydrates_g * 4, fat_g * 9]
+        total = sum(energy)
+        shares = [round(100 * e / total) if total else 0 for e in energy]
+        return [
+            ChartDataItem(label="Protein", value=shares[0]),
+            ChartDataItem(label="Carbs", value=shares[1]),
+            ChartDataItem(label="Fat", value=shares[2]),
+        ]
+    
     @staticmethod
     def get_dummy_chart_data() -> List[ChartDataItem]:
         """Returns dummy data for charts"""
@@ -24,4 +83,4 @@ class ChartDataService:
             ChartDataItem(label="Protein", value=25),
             ChartDataItem(label="Carbs", value=45),
             ChartDataItem(label="Fat", value=30),
-        ] 
\ No newline at end of file
+        ]
@@ -0,0 +1,37 @@
+from typing import Optional
+
+from ..config.settings import settings
+
+_client = None
+
+
+def get_mongo_client():
+    """
+    Return the process-wide async MongoDB client
+
+    Motor keeps a connection pool per client, so one client is shared by
+    every request instead of connecting per call.
+    """
+    global _client
+    if _client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        _client = AsyncIOMotorClient(
+            settings.MONGODB_URL,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            serverSelectionTimeoutMS=settings.MONGODB_TIMEOUT_MS,
+        )
+    return _client
+
+
+def get_database(client: Optional[object] = None):
+    """Return the application database"""
+    return (client or get_mongo_client())[settings.DATABASE_NAME]
+
+
+def close_mongo_client() -> None:
+    """Close the shared client, if one was opened"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -1,24 +1,59 @@
-import google.generativeai as genai
-import PIL.Image
-import json
-import os
-from typing import Dict, Optional, Union
-from dotenv import load_dotenv
-from ..models.food import FoodAnalysis
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from ..models.food import FoodAnalysis, food_analysis_schema, food_items_schema
+from ..utils.json_extractor import JSONExtractionError, JSONStreamExtractor, extract_json
+from ..utils.metrics import ANALYSIS_ERRORS, ANALYSIS_STAGE_DURATION, IMAGE_VALIDATIONS, PAYLOAD_BYTES
+from ..utils.validators import ImageValidationError, check_image_content, validate_image_header
+from ..config.settings import settings
+from .analysis_cache import AnalysisCache, make_cache_key
+from .image_preprocessor import decode_image, encode_for_model
+from .model_pool import ModelPool
+from .model_usage import ModelUsage
+from .perceptual_index import PerceptualIndex, dhash, make_namespace
+from .shared_state import create_lease, create_rate_limiter
+from .single_flight import SingleFlight
+from .upstream_client import UpstreamClient, UpstreamUnavailableError
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PreparedAnalysis:
+    """Model input for an image that missed every cache tier"""
+    content: List[Any]
+    cache_key: str
+    model_name: str
+    namespace: Optional[str] = None
+    image_hash: Optional[int] = None
+    
+    @property
+    def image_part(self) -> Any:
+        """The image entry of the model content"""
+        return self.content[0]
 
 class FoodAnalysisService:
     """Service for analyzing food images using Gemini AI"""
     
-    def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
+    def __init__(
+        self,
+        cache: Optional[AnalysisCache] = None,
+        perceptual_index: Optional[PerceptualIndex] = None,
+        models: Optional[ModelPool] = None,
+        upstream: Optional[UpstreamClient] = None,
+        lease=None,
+        usage: Optional[ModelUsage] = None,
+    ):
+        api_key = settings.GEMINI_API_KEY
+        if not api_key and models is None and settings.MODEL_BACKEND == "gemini":
             raise ValueError("GEMINI_API_KEY not found in environment variables")
         
-        genai.configure(api_key=api_key)
-        self.model_name = "gemini-2.0-flash-lite"
+        # Shared model instances; the SDK is configured once per process
+        self.models = models if models is not None else ModelPool(api_key)
+        self.model_name = self.models.default_model
         self.default_prompt = """
         Analyze the food item(s) in this image.
         Provide the approximate macronutrient breakdown (Calories, Protein, Carbohydrates, Fat) per typical serving size or per 100g if serving size is ambiguous.
@@ -27,75 +62,595 @@ class FoodAnalysisService:
         Only output the JSON object, do not include any additional text or markdown formatting outside the JSON block.
         If the food is not recognizable or nutritional info cannot be determined, return an empty JSON object {}.
         """
+        self.batch_prompt = """
+        Analyze the food item(s) in each of the numbered images above.
+        For each image, provide the approximate macronutrient breakdown (Calories, Protein, Carbohydrates, Fat) per typical serving size or per 100g if serving size is ambiguous.
+        Return the information strictly as a JSON array with one object per image, with keys: "index", "calories", "protein", "carbohydrates", and "fat".
+        For example: [{"index": 0, "calories": "740", "protein": "20g", "carbohydrates": "30g", "fat": "15g"}].
+        Only output the JSON array, do not include any additional text or markdown formatting outside the JSON block.
+        If the food in an image is not recognizable, return an object containing only its "index".
+        """
+        self._response_schema = food_analysis_schema()
+        self._batch_response_schema = food_analysis_schema(batch=True)
+        
+        # In nutrient_db mode the model only names the items; the macros come from the table
+        self.nutrients = None
+        if settings.ANALYSIS_MODE == "nutrient_db":
+            # Imported here so NumPy is only loaded in this mode
+            from .nutrient_db import get_nutrient_database
+            
+            self.nutrients = get_nutrient_database()
+            self.default_prompt = """
+        Identify the food item(s) in this image and estimate the weight of each in grams.
+        Use short generic names, e.g. "grilled chicken breast", "mashed potatoes", "broccoli".
+        Return a JSON object with an "items" array, for example: {"items": [{"name": "white rice", "grams": 150}]}.
+        If the food is not recognizable, return {"items": []}.
+        """
+            self.batch_prompt = """
+        Identify the food item(s) in each of the numbered images above and estimate the weight of each in grams.
+        Use short generic names, e.g. "grilled chicken breast", "mashed potatoes", "broccoli".
+        Return a JSON array with one object per image, for example: [{"index": 0, "items": [{"name": "white rice", "grams": 150}]}].
+        If the food in an image is not recognizable, return its index with an empty "items" array.
+        """
+            self._response_schema = food_items_schema()
+            self._batch_response_schema = food_items_schema(batch=True)
+        elif settings.STRUCTURED_OUTPUT_ENABLED:
+            # The response schema carries the format, so the prompts only describe the task
+            self.default_prompt = """
+        Analyze the food item(s) in this image.
+        Provide the approximate macronutrient breakdown per typical serving size, or per 100g if serving size is ambiguous.
+        If the food is not recognizable or nutritional info cannot be determined, leave every field empty.
+        """
+            self.batch_prompt = """
+        Analyze the food item(s) in each of the numbered images above.
+        For each image, provide its index and the approximate macronutrient breakdown per typical serving size, or per 100g if serving size is ambiguous.
+        If the food in an image is not recognizable, provide only its index.
+        """
+        
+        self.cache = cache if cache is not None else AnalysisCache.from_settings()
+        if perceptual_index is None and settings.PHASH_ENABLED:
+            perceptual_index = PerceptualIndex()
+        self.perceptual_index = perceptual_index
+        
+        # Bounded pool for blocking image work, and a cap on in-flight analyses
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.ANALYSIS_EXECUTOR_WORKERS,
+            thread_name_prefix="food-analysis",
+        )
+        self._semaphore = asyncio.Semaphore(settings.ANALYSIS_MAX_CONCURRENCY)
+        self._single_flight = SingleFlight()
+        
+        # Extends request coalescing across worker processes when shared state is configured
+        self.lease = lease if lease is not None else create_lease()
+        
+        # Quota-aware rate limiting, retries and circuit breaking for model calls
+        self.upstream = upstream if upstream is not None else UpstreamClient(limiter=create_rate_limiter())
+        
+        # Token usage, latency and cost per model
+        self.usage = usage if usage is not None else ModelUsage()
+    
+    def warmup(self) -> None:
+        """Load the model SDK and image codecs ahead of the first request"""
+        import PIL.Image
+        
+        PIL.Image.preinit()
+        self.models.warmup()
     
-    def analyze_food_image(self, image_path: str, prompt: Optional[str] = None) -> Union[FoodAnalysis, str]:
+    def analyze_food_image(
+        self,
+        image_path: str,
+        prompt: Optional[str] = None,
+        model_name: Optional[str] = None,
+    ) -> Union[FoodAnalysis, str]:
         """
         Analyze a food image and return nutritional information
         
         Args:
             image_path: Path to the image file
             prompt: Custom prompt (optional)
+            model_name: Allowed model to use instead of the default (optional)
             
         Returns:
             FoodAnalysis object or error message string
         """
         try:
-            # Load image
-            img = PIL.Image.open(image_path)
-            
-            # Use custom prompt or default
-            analysis_prompt = prompt or self.default_prompt
+            prepared = self._prepare(image_path, prompt, model_name)
+            if isinstance(prepared, FoodAnalysis):
+                return prepared
             
-            # Create content for API call
-            content = [img, analysis_prompt]
-            
-            # Initialize model
-            model = genai.GenerativeModel(self.model_name)
+            # Shared model instance
+            model = self.models.get(prepared.model_name)
             
             # Generate response
-            response = model.generate_content(content)
+            try:
+                start = time.perf_counter()
+                with ANALYSIS_STAGE_DURATION.time(stage="model"):
+                    response = self.upstream.generate_sync(model, prepared.content, **self._generation_kwargs())
+                self.usage.record(prepared.model_name, response, time.perf_counter() - start)
+            except UpstreamUnavailableError as e:
+                return self._serve_stale(prepared, e)
             
-            if not response or not response.candidates or not response.candidates[0].content:
-                return "API response did not contain any content."
+            return self._finish(prepared, response)
+                
+        except (UpstreamUnavailableError, ImageValidationError):
+            raise
+        except FileNotFoundError:
+            return self._error("FileNotFoundError", f"Error: Image file not found at {image_path}")
+        except Exception as e:
+            return self._error(type(e).__name__, f"An error occurred during analysis: {e}")
+    
+    async def analyze_food_image_async(
+        self,
+        image_path: str,
+        prompt: Optional[str] = None,
+        model_name: Optional[str] = None,
+    ) -> Union[FoodAnalysis, str]:
+        """
+        Analyze a food image without blocking the event loop
+        
+        File reads, PIL decoding and hashing run on a bounded thread pool;
+        the model call uses the SDK's async generation. At most
+        ANALYSIS_MAX_CONCURRENCY analyses are in flight at once.
+        
+        Args:
+            image_path: Path to the image file
+            prompt: Custom prompt (optional)
+            model_name: Allowed model to use instead of the default (optional)
             
-            # Extract response text
-            response_text = response.text.strip()
+        Returns:
+            FoodAnalysis object or error message string
+        """
+        try:
+            return await self._analyze_async(self._prepare, image_path, prompt, model_name)
+        except (UpstreamUnavailableError, ImageValidationError):
+            raise
+        except FileNotFoundError:
+            return self._error("FileNotFoundError", f"Error: Image file not found at {image_path}")
+        except Exception as e:
+            return self._error(type(e).__name__, f"An error occurred during analysis: {e}")
+    
+    async def analyze_image_bytes_async(
+        self,
+        image_bytes: bytes,
+        prompt: Optional[str] = None,
+        model_name: Optional[str] = None,
+    ) -> Union[FoodAnalysis, str]:
+        """
+        Analyze an in-memory food image without blocking the event loop
+        
+        Args:
+            image_bytes: Encoded image data (any bytes-like object)
+            prompt: Custom prompt (optional)
+            model_name: Allowed model to use instead of the default (optional)
             
-            # Parse JSON response
-            parsed_json = self._parse_json_response(response_text)
+        Returns:
+            FoodAnalysis object or error message string
+        """
+        try:
+            return await self._analyze_async(self._prepare_bytes, image_bytes, prompt, model_name)
+        except (UpstreamUnavailableError, ImageValidationError):
+            raise
+        except Exception as e:
+            return self._error(type(e).__name__, f"An error occurred during analysis: {e}")
+    
+    async def _analyze_async(self, prepare, source, prompt: Optional[str], model_name: Optional[str]) -> Union[FoodAnalysis, str]:
+        """Run a prepare stage on the executor and the model call on the event loop"""
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            prepared = await loop.run_in_executor(self._executor, prepare, source, prompt, model_name)
+        if isinstance(prepared, FoodAnalysis):
+            return prepared
+        
+        # Identical requests already in flight share one upstream call
+        return await self._single_flight.do(prepared.cache_key, lambda: self._generate_once(prepared))
+    
+    async def _generate_once(self, prepared: "PreparedAnalysis") -> Union[FoodAnalysis, str]:
+        """Call the model unless another worker is already analyzing the same image"""
+        if self.lease is None:
+            return await self._generate(prepared)
+        
+        if not await self.lease.acquire(prepared.cache_key):
+            await self.lease.wait(prepared.cache_key)
+            cached = await self.cache.get_async(prepared.cache_key)
+            if cached is not None:
+                return FoodAnalysis(**cached)
+            # The other worker failed; make the call ourselves
+            return await self._generate(prepared)
+        
+        try:
+            return await self._generate(prepared)
+        finally:
+            await self.lease.release(prepared.cache_key)
+    
+    async def _generate(self, prepared: "PreparedAnalysis") -> Union[FoodAnalysis, str]:
+        """Call the model for a prepared analysis"""
+        try:
+            async with self._semaphore:
+                response = await self._call_model(prepared.model_name, prepared.content)
+        except UpstreamUnavailableError as e:
+            return self._serve_stale(prepared, e)
+        
+        return await self._finish_async(prepared, response)
+    
+    async def _call_model(self, model_name: str, content: List[Any], batch_size: Optional[int] = None) -> Any:
+        """Call the model with the generation config, recording latency and token usage"""
+        model = self.models.get(model_name)
+        start = time.perf_counter()
+        with ANALYSIS_STAGE_DURATION.time(stage="model"):
+            response = await self.upstream.generate(model, content, **self._generation_kwargs(batch_size))
+        self.usage.record(model_name, response, time.perf_counter() - start)
+        return response
+    
+    def _generation_kwargs(self, batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Generation arguments for a model call
+        
+        Args:
+            batch_size: Images in a multi-image prompt, or None for a single image
             
-            if isinstance(parsed_json, dict):
-                return FoodAnalysis(**parsed_json)
-            else:
-                return parsed_json
+        Returns:
+            Keyword arguments for generate_content; with structured output,
+            a JSON response schema and an output token cap
+        """
+        if not settings.STRUCTURED_OUTPUT_ENABLED:
+            return {}
+        return {
+            "generation_config": {
+                "response_mime_type": "application/json",
+                "response_schema": self._response_schema if batch_size is None else self._batch_response_schema,
+                "max_output_tokens": settings.MODEL_MAX_OUTPUT_TOKENS * (batch_size or 1),
+            }
+        }
+    
+    def _serve_stale(self, prepared: "PreparedAnalysis", error: UpstreamUnavailableError) -> FoodAnalysis:
+        """Fall back to an expired cached result while the model API is unavailable"""
+        stale = self.cache.get_stale(prepared.cache_key)
+        if stale is None:
+            ANALYSIS_ERRORS.inc(type="UpstreamUnavailableError")
+            raise error
+        logger.warning("Model API unavailable; serving stale result for %s", prepared.cache_key[:12])
+        return FoodAnalysis(**stale)
+    
+    async def analyze_image_bytes_stream(
+        self,
+        image_bytes: bytes,
+        prompt: Optional[str] = None,
+        model_name: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Analyze an in-memory food image, yielding model output as it arrives
+        
+        Args:
+            image_bytes: Encoded image data (any bytes-like object)
+            prompt: Custom prompt (optional)
+            model_name: Allowed model to use instead of the default (optional)
+            
+        Yields:
+            ("chunk", text) for each streamed piece of model output, then
+            ("result", FoodAnalysis) or ("error", message). A rejected image
+            ends the stream with ("error", {"code": ..., "message": ...})
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._semaphore:
+                prepared = await loop.run_in_executor(
+                    self._executor, self._prepare_bytes, image_bytes, prompt, model_name
+                )
+                if isinstance(prepared, FoodAnalysis):
+                    yield "result", prepared
+                    return
                 
-        except FileNotFoundError:
-            return f"Error: Image file not found at {image_path}"
+                model = self.models.get(prepared.model_name)
+                start = time.perf_counter()
+                response = await self.upstream.generate(
+                    model, prepared.content, stream=True, **self._generation_kwargs()
+                )
+                
+                # The object is decoded as soon as its closing brace streams in
+                extractor = JSONStreamExtractor("{")
+                text_parts = []
+                async for chunk in response:
+                    text = chunk.text
+                    if text:
+                        text_parts.append(text)
+                        extractor.feed(text)
+                        yield "chunk", text
+                self.usage.record(prepared.model_name, response, time.perf_counter() - start)
+        except ImageValidationError as e:
+            yield "error", {"code": e.code, "message": str(e)}
+            return
         except Exception as e:
-            return f"An error occurred during analysis: {e}"
+            yield "error", self._error(type(e).__name__, f"An error occurred during analysis: {e}")
+            return
+        
+        if extractor.done:
+            try:
+                yield "result", await self._store_async(prepared, extractor.result)
+            except Exception as e:
+                yield "error", self._error(type(e).__name__, f"An error occurred during analysis: {e}")
+        elif not text_parts:
+            yield "error", self._error("EmptyResponse", "API response did not contain any content.")
+        else:
+            yield "error", self._error(
+                "JSONExtractionError",
+                f"API response did not appear to be valid JSON. Response: {''.join(text_parts)}",
+            )
     
-    def _parse_json_response(self, response_text: str) -> Union[Dict, str]:
-        """Parse JSON from API response"""
-        try:
-            # Check if it's pure JSON
-            if response_text.startswith('{') and response_text.endswith('}'):
-                return json.loads(response_text)
+    async def analyze_batch(
+        self,
+        image_paths: List[str],
+        prompt: Optional[str] = None,
+        model_name: Optional[str] = None,
+    ) -> List[Union[FoodAnalysis, str]]:
+        """
+        Analyze several food images with as few model calls as possible
+        
+        Cached images are answered directly; the rest are packed into
+        multi-image prompts of up to ANALYSIS_BATCH_GROUP_SIZE images, and
+        the groups run concurrently. A custom prompt is written for a single
+        image, so with one each image gets its own call with that prompt.
+        
+        Args:
+            image_paths: Paths to the image files
+            prompt: Custom prompt (optional)
+            model_name: Allowed model to use instead of the default (optional)
             
-            # Check for markdown code blocks
-            elif '```json' in response_text and '```' in response_text:
-                json_start = response_text.find('```json') + len('```json')
-                json_end = response_text.find('```', json_start)
-                json_string = response_text[json_start:json_end].strip()
-                return json.loads(json_string)
+        Returns:
+            One FoodAnalysis object or error message string per image, in input order
+        """
+        loop = asyncio.get_running_loop()
+        
+        async def prepare(image_path: str):
+            try:
+                return await loop.run_in_executor(self._executor, self._prepare, image_path, prompt, model_name)
+            except FileNotFoundError:
+                return self._error("FileNotFoundError", f"Error: Image file not found at {image_path}")
+            except Exception as e:
+                return self._error(type(e).__name__, f"An error occurred during analysis: {e}")
+        
+        results: List[Any] = list(await asyncio.gather(*(prepare(path) for path in image_paths)))
+        
+        pending = [i for i, item in enumerate(results) if isinstance(item, PreparedAnalysis)]
+        
+        if prompt:
+            # Results are cached under the prompt that produced them, never the batch prompt
+            async def analyze_one(prepared: PreparedAnalysis):
+                try:
+                    return await self._single_flight.do(prepared.cache_key, lambda: self._generate_once(prepared))
+                except Exception as e:
+                    return self._error(type(e).__name__, f"An error occurred during analysis: {e}")
             
-            # Try parsing directly
+            analyses = await asyncio.gather(*(analyze_one(results[i]) for i in pending))
+            for i, analysis in zip(pending, analyses):
+                results[i] = analysis
+            return results
+        
+        group_size = max(1, settings.ANALYSIS_BATCH_GROUP_SIZE)
+        groups = [pending[i:i + group_size] for i in range(0, len(pending), group_size)]
+        
+        group_results = await asyncio.gather(
+            *(self._analyze_group([results[i] for i in group]) for group in groups)
+        )
+        for group, analyses in zip(groups, group_results):
+            for i, analysis in zip(group, analyses):
+                results[i] = analysis
+        
+        return results
+    
+    async def _analyze_group(self, group: List["PreparedAnalysis"]) -> List[Union[FoodAnalysis, str]]:
+        """Send one multi-image prompt and map the returned array back to its images"""
+        content: List[Any] = []
+        for index, prepared in enumerate(group):
+            content.append(f"Image {index}:")
+            content.append(prepared.image_part)
+        content.append(self.batch_prompt)
+        
+        try:
+            async with self._semaphore:
+                response = await self._call_model(group[0].model_name, content, len(group))
+        except Exception as e:
+            return [self._error(type(e).__name__, f"An error occurred during analysis: {e}")] * len(group)
+        
+        if not response or not response.candidates or not response.candidates[0].content:
+            return [self._error("EmptyResponse", "API response did not contain any content.")] * len(group)
+        
+        parsed_json = self._parse_json_response(response.text.strip())
+        if isinstance(parsed_json, dict):
+            parsed_json = [parsed_json]
+        if not isinstance(parsed_json, list):
+            return [parsed_json] * len(group)
+        
+        by_index: Dict[int, Dict] = {}
+        for item in parsed_json:
+            if isinstance(item, dict) and isinstance(item.get("index"), int):
+                by_index[item.pop("index")] = item
+        
+        results: List[Union[FoodAnalysis, str]] = []
+        for index, prepared in enumerate(group):
+            item = by_index.get(index)
+            if item is None:
+                results.append(self._error(
+                    "MissingBatchItem", f"API response did not contain a result for image {index} of the group."
+                ))
             else:
                 try:
-                    return json.loads(response_text)
-                except json.JSONDecodeError:
-                    return f"API response did not appear to be valid JSON. Response: {response_text}"
+                    results.append(await self._store_async(prepared, item))
+                except Exception as e:
+                    results.append(self._error(type(e).__name__, f"An error occurred during analysis: {e}"))
+        return results
+    
+    def _prepare(
+        self,
+        image_path: str,
+        prompt: Optional[str],
+        model_name: Optional[str] = None,
+    ) -> Union[FoodAnalysis, "PreparedAnalysis"]:
+        """Read an image file and hand its bytes to _prepare_bytes"""
+        # Read raw bytes once; they key the cache and feed the decoder
+        with ANALYSIS_STAGE_DURATION.time(stage="read"), open(image_path, "rb") as image_file:
+            image_bytes = image_file.read()
+        return self._prepare_bytes(image_bytes, prompt, model_name)
+    
+    def _prepare_bytes(
+        self,
+        image_bytes: bytes,
+        prompt: Optional[str],
+        model_name: Optional[str] = None,
+    ) -> Union[FoodAnalysis, "PreparedAnalysis"]:
+        """Resolve an image from the caches, or decode it and build the model content"""
+        # Fail fast on models outside the allowlist
+        model_name = self.models.resolve(model_name)
+        
+        # Use custom prompt or default
+        analysis_prompt = prompt or self.default_prompt
+        
+        # Serve repeat uploads from the cache without touching the model
+        with ANALYSIS_STAGE_DURATION.time(stage="hash"):
+            cache_key = make_cache_key(image_bytes, analysis_prompt, model_name)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return FoodAnalysis(**cached)
+        
+        # Reject non-images and decompression bombs from the header alone
+        PAYLOAD_BYTES.observe(len(image_bytes), kind="upload")
+        with ANALYSIS_STAGE_DURATION.time(stage="validate"):
+            self._validate(validate_image_header, image_bytes)
+        
+        # Load image; downscaled and upright unless preprocessing is disabled
+        with ANALYSIS_STAGE_DURATION.time(stage="decode"):
+            try:
+                if settings.IMAGE_PREPROCESS_ENABLED:
+                    img = decode_image(image_bytes)
+                else:
+                    import PIL.Image
                     
-        except json.JSONDecodeError as e:
-            return f"Failed to decode JSON from response: {e}\nResponse text was:\n{response_text}"
+                    img = PIL.Image.open(io.BytesIO(image_bytes))
+                    img.load()
+            except (OSError, SyntaxError, ValueError) as e:
+                IMAGE_VALIDATIONS.inc(outcome="corrupt_image")
+                raise ImageValidationError("corrupt_image", f"The image could not be decoded: {e}", 422)
+        
+        # Blank photos are not worth a model call; blurry ones are only flagged unless IMAGE_BLUR_REJECT
+        with ANALYSIS_STAGE_DURATION.time(stage="validate"):
+            warning = self._validate(check_image_content, img)
+        if warning is not None:
+            # Counted so the blur threshold can be tuned against real traffic
+            IMAGE_VALIDATIONS.inc(outcome=f"{warning}_warning")
+            logger.info("Analyzing image despite validation warning: %s", warning)
+        IMAGE_VALIDATIONS.inc(outcome="accepted")
+        
+        # Re-photographed or re-compressed plates match a stored result
+        image_hash = None
+        namespace = None
+        if self.perceptual_index is not None:
+            with ANALYSIS_STAGE_DURATION.time(stage="phash"):
+                image_hash = dhash(img)
+                namespace = make_namespace(analysis_prompt, model_name)
+                near_duplicate = self.perceptual_index.find(namespace, image_hash)
+            if near_duplicate is not None:
+                self.cache.set(cache_key, near_duplicate)
+                return FoodAnalysis(**near_duplicate)
+        
+        # Create content for API call; a re-encoded JPEG is a fraction of the upload
+        image_part = img
+        if settings.IMAGE_PREPROCESS_ENABLED:
+            with ANALYSIS_STAGE_DURATION.time(stage="encode"):
+                image_part = encode_for_model(img)
+            PAYLOAD_BYTES.observe(len(image_part["data"]), kind="model")
+            logger.info("Preprocessed image %d -> %d bytes", len(image_bytes), len(image_part["data"]))
+        return PreparedAnalysis(
+            content=[image_part, analysis_prompt],
+            cache_key=cache_key,
+            model_name=model_name,
+            namespace=namespace,
+            image_hash=image_hash,
+        )
+    
+    @staticmethod
+    def _validate(check, subject) -> Any:
+        """Run a validation check, counting rejections by code; returns what the check returns"""
+        try:
+            return check(subject)
+        except ImageValidationError as e:
+            IMAGE_VALIDATIONS.inc(outcome=e.code)
+            raise
+    
+    def _finish(self, prepared: "PreparedAnalysis", response) -> Union[FoodAnalysis, str]:
+        """Parse a model response and store successful results in the caches"""
+        parsed_json = self._parse_model_response(response)
+        if not isinstance(parsed_json, dict):
+            return parsed_json
+        analysis = self._build_analysis(prepared, parsed_json)
+        self.cache.set(prepared.cache_key, analysis.model_dump())
+        return analysis
+    
+    async def _finish_async(self, prepared: "PreparedAnalysis", response) -> Union[FoodAnalysis, str]:
+        """Parse a model response and store successful results without blocking the event loop"""
+        parsed_json = self._parse_model_response(response)
+        if not isinstance(parsed_json, dict):
+            return parsed_json
+        return await self._store_async(prepared, parsed_json)
+    
+    async def _store_async(self, prepared: "PreparedAnalysis", parsed_json: Dict) -> FoodAnalysis:
+        """Build the analysis result and record it in the caches; the persistent tier is written off the loop"""
+        analysis = self._build_analysis(prepared, parsed_json)
+        await self.cache.set_async(prepared.cache_key, analysis.model_dump())
+        return analysis
+    
+    def _parse_model_response(self, response) -> Union[Dict, List, str]:
+        """Extract the JSON object from a model response, or an error message"""
+        if not response or not response.candidates or not response.candidates[0].content:
+            return self._error("EmptyResponse", "API response did not contain any content.")
+        
+        with ANALYSIS_STAGE_DURATION.time(stage="parse"):
+            # Extract response text
+            response_text = response.text.strip()
+            
+            # Parse JSON response
+            return self._parse_json_response(response_text, "{")
+    
+    def _build_analysis(self, prepared: "PreparedAnalysis", parsed_json: Dict) -> FoodAnalysis:
+        """Build the analysis result and add it to the near-duplicate index"""
+        if self.nutrients is not None and "items" in parsed_json:
+            analysis = FoodAnalysis(**self.nutrients.estimate(parsed_json["items"] or []))
+        else:
+            analysis = FoodAnalysis(**parsed_json)
+        if prepared.image_hash is not None:
+            self.perceptual_index.add(prepared.namespace, prepared.image_hash, analysis.model_dump())
+        return analysis
+    
+    def _parse_json_response(self, response_text: str, openers: str = "{[") -> Union[Dict, List, str]:
+        """Parse the first JSON value from an API response"""
+        try:
+            return extract_json(response_text, openers)
+        except JSONExtractionError:
+            return self._error("JSONExtractionError", f"API response did not appear to be valid JSON. Response: {response_text}")
         except Exception as e:
-            return f"An unexpected error occurred during JSON parsing: {e}\nResponse text was:\n{response_text}" 
\ No newline at end of file
+            return self._error(
+                type(e).__name__,
+                f"An unexpected error occurred during JSON parsing: {e}\nResponse text was:\n{response_text}",
+            )
+    
+    @staticmethod
+    def _error(error_type: str, message: str) -> str:
+        """Count a failed analysis by type and return its error message"""
+        ANALYSIS_ERRORS.inc(type=error_type)
+        return message
+    
+    def upstream_stats(self) -> Dict[str, Any]:
+        """Return rate limiter, retry and circuit breaker state"""
+        return self.upstream.stats()
+    
+    def usage_report(self) -> Dict[str, Dict[str, Any]]:
+        """Return token usage, latency and cost per model"""
+        return self.usage.report()
+    
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Return counters for the result caches and request coalescing"""
+        stats = {"exact": self.cache.stats()}
+        if self.perceptual_index is not None:
+            stats["near_duplicate"] = self.perceptual_index.stats()
+        stats["single_flight"] = self._single_flight.stats()
+        if self.nutrients is not None:
+            stats["nutrient_lookup"] = self.nutrients.stats()
+        return stats 
\ No newline at end of file
@@ -0,0 +1,87 @@
+import io
+import logging
+from typing import TYPE_CHECKING, Dict, Tuple
+
+from ..config.settings import settings
+
+if TYPE_CHECKING:
+    import PIL.Image
+
+logger = logging.getLogger(__name__)
+
+
+def decode_image(
+    image_bytes: bytes,
+    max_edge: int = settings.IMAGE_MAX_EDGE,
+) -> "PIL.Image.Image":
+    """
+    Decode an image at roughly the size needed for analysis
+
+    JPEGs use draft mode, so the decoder scales by 1/2, 1/4 or 1/8 while
+    decoding instead of materialising every pixel of a phone photo. The
+    EXIF orientation is applied and the result is downscaled so its
+    longest edge is at most max_edge.
+
+    Args:
+        image_bytes: Encoded image data
+        max_edge: Maximum width/height of the returned image
+
+    Returns:
+        Upright RGB image
+    """
+    # Imported on first use to keep PIL out of application start-up
+    import PIL.Image
+    import PIL.ImageOps
+
+    img = PIL.Image.open(io.BytesIO(image_bytes))
+    if img.format == "JPEG":
+        img.draft("RGB", (max_edge, max_edge))
+    img = PIL.ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img.thumbnail((max_edge, max_edge), PIL.Image.Resampling.LANCZOS)
+    return img
+
+
+def encode_for_model(
+    img: "PIL.Image.Image",
+    quality: int = settings.IMAGE_JPEG_QUALITY,
+) -> Dict:
+    """
+    Re-encode an image as a metadata-free JPEG blob for the model
+
+    Args:
+        img: Decoded RGB image
+        quality: JPEG quality
+
+    Returns:
+        Blob dict with mime_type and data, accepted as-is by the Gemini SDK
+    """
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return {"mime_type": "image/jpeg", "data": buffer.getvalue()}
+
+
+def preprocess_image(
+    image_bytes: bytes,
+    max_edge: int = settings.IMAGE_MAX_EDGE,
+    quality: int = settings.IMAGE_JPEG_QUALITY,
+) -> Tuple["PIL.Image.Image", Dict]:
+    """
+    Decode, orient, downscale and re-encode an image for analysis
+
+    Args:
+        image_bytes: Encoded image data
+        max_edge: Maximum width/height sent to the model
+        quality: JPEG quality of the re-encoded image
+
+    Returns:
+        Tuple of the decoded image and the blob to send to the model
+    """
+    img = decode_image(image_bytes, max_edge)
+    blob = encode_for_model(img, quality)
+    logger.info(
+        "Preprocessed image %d -> %d bytes (%dx%d)",
+        len(image_bytes), len(blob["data"]), img.width, img.height,
+    )
+    return img, blob
@@ -0,0 +1,443 @@
+import asyncio
+import ipaddress
+import itertools
+import logging
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from ..config.settings import settings
+from ..models.food import AnalysisJob, FoodAnalysis
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Pause after a backend error (e.g. Redis connection reset) before a worker polls again
+WORKER_ERROR_BACKOFF_SECONDS = 1.0
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds JOB_QUEUE_MAX_DEPTH jobs"""
+
+
+class CallbackURLError(ValueError):
+    """Raised for callback URLs the service must not call"""
+
+
+async def validate_callback_url(url: str) -> str:
+    """
+    Check that a callback URL points at an allowed, public https endpoint
+
+    The host is resolved and every address it resolves to must be
+    public, so callbacks cannot reach loopback, private networks or cloud
+    metadata endpoints. The check runs at submission and again before
+    each delivery, since DNS can change in between.
+
+    Args:
+        url: Callback URL supplied with the job
+
+    Returns:
+        A checked address of the host; deliveries connect to it instead
+        of resolving the host again
+
+    Raises:
+        CallbackURLError: If the URL must not be called
+    """
+    parts = urlsplit(url)
+    allowed_schemes = ("https", "http") if settings.JOB_CALLBACK_ALLOW_HTTP else ("https",)
+    if parts.scheme not in allowed_schemes:
+        raise CallbackURLError(f"Callback URL must use {' or '.join(allowed_schemes)}")
+    host = (parts.hostname or "").lower()
+    if not host:
+        raise CallbackURLError("Callback URL has no host")
+    allowed_hosts = settings.JOB_CALLBACK_ALLOWED_HOSTS
+    if allowed_hosts and not any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts):
+        raise CallbackURLError(f"Callback host '{host}' is not allowed")
+
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError) as e:
+        raise CallbackURLError(f"Callback host '{host}' cannot be resolved: {e}")
+    addresses = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    if not addresses:
+        raise CallbackURLError(f"Callback host '{host}' cannot be resolved")
+    for address in addresses:
+        if not address.is_global:
+            raise CallbackURLError(f"Callback host '{host}' resolves to a non-public address")
+    return str(addresses[0])
+
+
+class InMemoryQueueBackend:
+    """
+    In-process queue backend
+
+    Mirrors the Redis backend's operations (a priority-ordered queue plus
+    expiring key/value records) so the job queue can run and be tested
+    without a Redis server. Jobs die with the process, so claimed jobs
+    need no reclaiming.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, Tuple[float, str]] = {}
+        self._payloads: Dict[str, bytes] = {}
+
+    async def push(self, job_id: str, priority: int) -> None:
+        await self._queue.put((priority, next(self._sequence), job_id))
+
+    async def pop(self) -> str:
+        _, _, job_id = await self._queue.get()
+        return job_id
+
+    async def ack(self, job_id: str) -> None:
+        self._payloads.pop(job_id, None)
+
+    async def reclaim(self) -> int:
+        return 0
+
+    async def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def save_job(self, job: AnalysisJob, ttl_seconds: int) -> None:
+        self._purge()
+        self._jobs[job.job_id] = (time.monotonic() + ttl_seconds, job.model_dump_json())
+
+    async def load_job(self, job_id: str) -> Optional[AnalysisJob]:
+        entry = self._jobs.get(job_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return AnalysisJob.model_validate_json(entry[1])
+
+    async def save_payload(self, job_id: str, payload: bytes) -> None:
+        self._payloads[job_id] = payload
+
+    async def load_payload(self, job_id: str) -> Optional[bytes]:
+        return self._payloads.get(job_id)
+
+    async def close(self) -> None:
+        pass
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        expired = [job_id for job_id, (expires_at, _) in self._jobs.items() if expires_at < now]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Move the next job to the claimed set atomically, with its lease deadline as score
+_CLAIM_SCRIPT = """
+local item = redis.call('ZPOPMIN', KEYS[1])
+if #item == 0 then
+    return false
+end
+redis.call('ZADD', KEYS[2], ARGV[1], item[1])
+return item[1]
+"""
+
+
+class RedisQueueBackend:
+    """
+    Queue backend on Redis: a sorted set ordered by priority, and expiring job keys
+
+    A popped job moves into a claimed set until it is acknowledged. Jobs
+    whose claim is older than the visibility timeout (their worker died)
+    are put back on the queue by reclaim().
+    """
+
+    def __init__(
+        self,
+        url: str = "",
+        namespace: str = "prompted_plate:jobs",
+        visibility_timeout: float = settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+        client=None,
+    ):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self._redis = client
+        self.visibility_timeout = visibility_timeout
+        self._queue_key = f"{namespace}:queue"
+        self._claimed_key = f"{namespace}:claimed"
+        self._wakeup_key = f"{namespace}:wakeup"
+        self._job_prefix = f"{namespace}:job:"
+        self._payload_prefix = f"{namespace}:payload:"
+        self._claim = client.register_script(_CLAIM_SCRIPT)
+
+    async def push(self, job_id: str, priority: int) -> None:
+        # Score orders by priority, then submission time
+        await self._redis.zadd(self._queue_key, {job_id: priority * 1e10 + time.time()})
+        # Wake one idle worker; the list is only a hint and is kept short
+        async with self._redis.pipeline(transaction=False) as pipe:
+            await pipe.lpush(self._wakeup_key, 1).ltrim(self._wakeup_key, 0, 999).execute()
+
+    async def pop(self) -> str:
+        while True:
+            job_id = await self._claim(
+                keys=[self._queue_key, self._claimed_key], args=[time.time() + self.visibility_timeout]
+            )
+            if job_id:
+                return job_id.decode() if isinstance(job_id, bytes) else job_id
+            await self._redis.blpop([self._wakeup_key], timeout=1)
+
+    async def ack(self, job_id: str) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            await pipe.zrem(self._claimed_key, job_id).delete(self._payload_prefix + job_id).execute()
+
+    async def reclaim(self) -> int:
+        """Requeue jobs whose worker stopped before acknowledging them"""
+        reclaimed = 0
+        for job_id in await self._redis.zrangebyscore(self._claimed_key, "-inf", time.time()):
+            job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+            # Only the process that removes the claim requeues the job
+            if not await self._redis.zrem(self._claimed_key, job_id):
+                continue
+            job = await self.load_job(job_id)
+            if job is None or job.status in (SUCCEEDED, FAILED):
+                continue
+            logger.warning("Requeueing job %s after its worker's claim expired", job_id)
+            await self.push(job_id, job.priority)
+            reclaimed += 1
+        return reclaimed
+
+    async def depth(self) -> int:
+        return await self._redis.zcard(self._queue_key)
+
+    async def save_job(self, job: AnalysisJob, ttl_seconds: int) -> None:
+        await self._redis.set(self._job_prefix + job.job_id, job.model_dump_json(), ex=ttl_seconds)
+
+    async def load_job(self, job_id: str) -> Optional[AnalysisJob]:
+        data = await self._redis.get(self._job_prefix + job_id)
+        return AnalysisJob.model_validate_json(data) if data else None
+
+    async def save_payload(self, job_id: str, payload: bytes) -> None:
+        await self._redis.set(self._payload_prefix + job_id, payload, ex=settings.JOB_RESULT_TTL_SECONDS)
+
+    async def load_payload(self, job_id: str) -> Optional[bytes]:
+        return await self._redis.get(self._payload_prefix + job_id)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_queue_backend(url: str = settings.JOB_QUEUE_URL):
+    """
+    Create a queue backend from a URL
+
+    Args:
+        url: "memory://" for the in-process backend, or a redis:// URL
+
+    Returns:
+        Queue backend instance
+    """
+    if url.startswith("memory://"):
+        return InMemoryQueueBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisQueueBackend(url)
+    raise ValueError(f"Unsupported job queue URL: {url}")
+
+
+class JobQueue:
+    """Runs analyses submitted as jobs on a bounded pool of worker tasks"""
+
+    def __init__(
+        self,
+        analyze: Callable[[AnalysisJob, bytes], Awaitable],
+        backend=None,
+        workers: int = settings.JOB_WORKERS,
+        ttl_seconds: int = settings.JOB_RESULT_TTL_SECONDS,
+        max_depth: int = settings.JOB_QUEUE_MAX_DEPTH,
+    ):
+        self.analyze = analyze
+        self.backend = backend if backend is not None else create_queue_backend()
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.max_depth = max_depth
+        self._tasks: List[asyncio.Task] = []
+        self._http_client = None
+        self.submitted = 0
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    async def submit(
+        self,
+        image_bytes: bytes,
+        prompt: Optional[str] = None,
+        model: Optional[str] = None,
+        user_id: Optional[str] = None,
+        priority: int = 0,
+        callback_url: Optional[str] = None,
+    ) -> AnalysisJob:
+        """
+        Queue an analysis
+
+        Args:
+            image_bytes: Encoded image data
+            prompt: Custom prompt (optional)
+            model: Allowed model (optional)
+            user_id: User the analysis is recorded for (optional)
+            priority: Lower runs first
+            callback_url: URL that receives the finished job as a JSON POST (optional)
+
+        Returns:
+            The queued job
+
+        Raises:
+            QueueFullError: If max_depth jobs are already waiting
+            CallbackURLError: If the callback URL must not be called
+        """
+        # Waiting jobs hold their image bytes, so the queue depth bounds memory too
+        if await self.backend.depth() >= self.max_depth:
+            raise QueueFullError(f"The analysis queue is full ({self.max_depth} jobs waiting)")
+        if callback_url:
+            await validate_callback_url(callback_url)
+        
+        job = AnalysisJob(
+            job_id=uuid.uuid4().hex,
+            status=QUEUED,
+            priority=priority,
+            prompt=prompt,
+            model=model,
+            user_id=user_id,
+            callback_url=callback_url,
+            created_at=datetime.now(timezone.utc),
+        )
+        await self.backend.save_payload(job.job_id, image_bytes)
+        await self.backend.save_job(job, self.ttl_seconds)
+        await self.backend.push(job.job_id, priority)
+        self.submitted += 1
+        return job
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        """Look up a job by ID"""
+        return await self.backend.load_job(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Return job counters for this process"""
+        return {
+            "submitted": self.submitted,
+            "running": self.running,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "workers": self.workers if self._tasks else 0,
+        }
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._reclaimer()))
+
+    async def stop(self) -> None:
+        """Cancel the workers and release connections"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        await self.backend.close()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = None
+            try:
+                job_id = await self.backend.pop()
+                try:
+                    await self._run(job_id)
+                except Exception:
+                    logger.exception("Job %s crashed", job_id)
+                # Not acknowledged when cancelled mid-job: the claim expires and the job is reclaimed
+                await self.backend.ack(job_id)
+            except Exception as e:
+                # A lost connection must not end the worker; an unacknowledged job is reclaimed later
+                logger.warning("Job queue backend error%s: %s", f" on job {job_id}" if job_id else "", e)
+                await asyncio.sleep(WORKER_ERROR_BACKOFF_SECONDS)
+
+    async def _reclaimer(self) -> None:
+        """Periodically requeue jobs claimed by workers that died"""
+        interval = max(1.0, settings.JOB_VISIBILITY_TIMEOUT_SECONDS / 4)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.backend.reclaim()
+            except Exception as e:
+                logger.warning("Could not reclaim stalled jobs: %s", e)
+
+    async def _run(self, job_id: str) -> None:
+        job = await self.backend.load_job(job_id)
+        payload = await self.backend.load_payload(job_id)
+        # Expired, or finished by a worker that died before acknowledging it
+        if job is None or payload is None or job.status in (SUCCEEDED, FAILED):
+            return
+
+        job.status = RUNNING
+        await self.backend.save_job(job, self.ttl_seconds)
+
+        self.running += 1
+        try:
+            result = await self.analyze(job, payload)
+        except Exception as e:
+            result = f"An error occurred during analysis: {e}"
+        finally:
+            self.running -= 1
+
+        if isinstance(result, FoodAnalysis):
+            job.status = SUCCEEDED
+            job.analysis = result
+            self.succeeded += 1
+        else:
+            job.status = FAILED
+            job.error = str(result)
+            self.failed += 1
+        job.finished_at = datetime.now(timezone.utc)
+        await self.backend.save_job(job, self.ttl_seconds)
+
+        if job.callback_url:
+            await self._notify(job)
+
+    async def _notify(self, job: AnalysisJob) -> None:
+        """POST the finished job to its callback URL, retrying transient failures"""
+        import httpx
+
+        try:
+            address = await validate_callback_url(job.callback_url)
+        except CallbackURLError as e:
+            logger.warning("Not calling back job %s: %s", job.job_id, e)
+            return
+        if self._http_client is None:
+            # Redirects could lead to hosts the URL check never saw
+            self._http_client = httpx.AsyncClient(
+                timeout=settings.JOB_CALLBACK_TIMEOUT_SECONDS, follow_redirects=False
+            )
+        # Connect to the checked address rather than letting httpx resolve the
+        # host again, which a rebinding DNS server could answer differently.
+        # Host header and TLS server name stay those of the original URL
+        url = httpx.URL(job.callback_url)
+        pinned_url = url.copy_with(host=address)
+        headers = {"Host": url.netloc.decode("ascii")}
+        extensions = {"sni_hostname": url.host} if url.scheme == "https" else {}
+        body = job.model_dump(mode="json")
+        for attempt in range(settings.JOB_CALLBACK_ATTEMPTS):
+            try:
+                request = self._http_client.build_request(
+                    "POST", pinned_url, json=body, headers=headers, extensions=extensions
+                )
+                response = await self._http_client.send(request)
+                if response.status_code < 500:
+                    return
+            except httpx.HTTPError as e:
+                logger.warning("Callback for job %s failed: %s", job.job_id, e)
+            await asyncio.sleep(2 ** attempt)
+        logger.warning("Giving up on callback for job %s", job.job_id)
@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Protocol
+
+from ..config.settings import settings
+
+
+class GenerativeBackend(Protocol):
+    """
+    Interface FoodAnalysisService expects from a model backend
+
+    google.generativeai.GenerativeModel satisfies it; so does
+    FakeGenerativeModel below.
+    """
+
+    def generate_content(self, contents: List[Any], **kwargs) -> Any: ...
+
+    async def generate_content_async(self, contents: List[Any], stream: bool = False, **kwargs) -> Any: ...
+
+
+class FakeCandidate:
+    def __init__(self, text: str):
+        self.content = {"parts": [{"text": text}]}
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeResponse:
+    """Response object shaped like the SDK's GenerateContentResponse"""
+
+    def __init__(self, text: str, usage_metadata: Optional[FakeUsageMetadata] = None):
+        self.text = text
+        self.candidates = [FakeCandidate(text)]
+        self.usage_metadata = usage_metadata
+
+
+class FakeStreamResponse:
+    """Async iterator of response chunks, like a streamed SDK response"""
+
+    def __init__(self, text: str, chunk_delay: float, usage_metadata: FakeUsageMetadata, chunk_size: int = 24):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self._chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self._chunk_delay = chunk_delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._chunk_delay)
+            yield FakeResponse(chunk)
+
+
+# Item names the fake reports in nutrient_db mode
+FAKE_FOODS = (
+    "grilled chicken breast", "mashed potatoes", "steamed broccoli", "white rice",
+    "salmon fillet", "green salad", "pasta", "fried egg",
+)
+
+
+class FakeGenerativeModel:
+    """
+    Local, deterministic stand-in for a Gemini model
+
+    Answers are derived from a hash of the request content, so the same
+    image always gets the same numbers. Token usage is estimated the way
+    Gemini bills it (258 tokens per image, about 4 characters per text
+    token), and max_output_tokens truncates the answer. Latency, jitter
+    and the rate of upstream-style errors are configurable, which makes it
+    suitable for load testing without calling the real API.
+    """
+
+    IMAGE_TOKENS = 258
+
+    def __init__(
+        self,
+        model_name: str,
+        latency_ms: float = settings.FAKE_MODEL_LATENCY_MS,
+        jitter_ms: float = settings.FAKE_MODEL_JITTER_MS,
+        error_rate: float = settings.FAKE_MODEL_ERROR_RATE,
+        rng: Optional[random.Random] = None,
+    ):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = rng or random.Random()
+
+    def generate_content(self, contents: List[Any], **kwargs) -> FakeResponse:
+        time.sleep(self._delay())
+        self._maybe_fail()
+        return self._respond(contents, kwargs.get("generation_config"))
+
+    async def generate_content_async(self, contents: List[Any], stream: bool = False, **kwargs) -> Any:
+        delay = self._delay()
+        if stream:
+            # Spread the latency over time-to-first-chunk and the chunks themselves
+            await asyncio.sleep(delay / 2)
+            self._maybe_fail()
+            response = self._respond(contents, kwargs.get("generation_config"))
+            text = response.text
+            return FakeStreamResponse(text, delay / 2 / max(1, len(text) // 24), response.usage_metadata)
+        await asyncio.sleep(delay)
+        self._maybe_fail()
+        return self._respond(contents, kwargs.get("generation_config"))
+
+    def _respond(self, contents: List[Any], generation_config: Optional[Dict[str, Any]]) -> FakeResponse:
+        text = self._answer(contents, self._wants_items(generation_config))
+        output_tokens = max(1, len(text) // 4)
+        max_output_tokens = (generation_config or {}).get("max_output_tokens")
+        if max_output_tokens and output_tokens > max_output_tokens:
+            text = text[:max_output_tokens * 4]
+            output_tokens = max_output_tokens
+        input_tokens = sum(
+            max(1, len(part) // 4) if isinstance(part, str) else self.IMAGE_TOKENS for part in contents
+        )
+        return FakeResponse(text, FakeUsageMetadata(input_tokens, output_tokens))
+
+    def _delay(self) -> float:
+        jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _maybe_fail(self) -> None:
+        if self.error_rate > 0 and self._rng.random() < self.error_rate:
+            from google.api_core import exceptions
+
+            error = self._rng.choice([exceptions.ResourceExhausted, exceptions.ServiceUnavailable])
+            raise error("Simulated upstream error from the fake model backend")
+
+    @staticmethod
+    def _wants_items(generation_config: Optional[Dict[str, Any]]) -> bool:
+        """Whether the response schema asks for recognized items instead of macros"""
+        schema = (generation_config or {}).get("response_schema") or {}
+        if schema.get("type") == "ARRAY":
+            schema = schema.get("items", {})
+        return "items" in schema.get("properties", {})
+
+    def _answer(self, contents: List[Any], itemized: bool = False) -> str:
+        describe = self._items if itemized else self._nutrients
+        labels = [part for part in contents if isinstance(part, str) and part.startswith("Image ")]
+        images = [part for part in contents if not isinstance(part, str)]
+        if labels:
+            items = [dict(index=i, **describe(image)) for i, image in enumerate(images)]
+            return json.dumps(items)
+        return json.dumps(describe(images[0] if images else contents))
+
+    def _digest(self, image: Any) -> bytes:
+        if isinstance(image, dict) and "data" in image:
+            seed_bytes = bytes(image["data"])
+        elif hasattr(image, "size") and hasattr(image, "mode"):
+            seed_bytes = f"{image.mode}{image.size}".encode()
+        else:
+            seed_bytes = repr(image).encode()
+        return hashlib.sha256(seed_bytes + self.model_name.encode()).digest()
+
+    def _items(self, image: Any) -> Dict[str, List[Dict[str, Any]]]:
+        digest = self._digest(image)
+        count = 1 + digest[3] % 3
+        return {
+            "items": [
+                {"name": FAKE_FOODS[digest[4 + i] % len(FAKE_FOODS)], "grams": 50 + digest[8 + i] % 200}
+                for i in range(count)
+            ]
+        }
+
+    def _nutrients(self, image: Any) -> Dict[str, str]:
+        digest = self._digest(image)
+        protein = 5 + digest[0] % 45
+        carbohydrates = 10 + digest[1] % 90
+        fat = 2 + digest[2] % 40
+        calories = protein * 4 + carbohydrates * 4 + fat * 9
+        return {
+            "calories": str(calories),
+            "protein": f"{protein}g",
+            "carbohydrates": f"{carbohydrates}g",
+            "fat": f"{fat}g",
+        }
+
+
+MODEL_BACKENDS: Dict[str, Optional[Callable[[str], GenerativeBackend]]] = {
+    # None means the SDK's GenerativeModel, imported by the model pool
+    "gemini": None,
+    "fake": FakeGenerativeModel,
+}
+
+
+def get_model_factory(backend: str) -> Optional[Callable[[str], GenerativeBackend]]:
+    """
+    Look up the model factory for a backend name
+
+    Args:
+        backend: Name from MODEL_BACKENDS
+
+    Returns:
+        Factory taking a model name, or None for the Gemini SDK
+    """
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}'. Available: {', '.join(MODEL_BACKENDS)}")
+    return MODEL_BACKENDS[backend]
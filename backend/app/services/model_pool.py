@@ -0,0 +1,109 @@
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from ..config.settings import settings
+from .model_backends import get_model_factory
+
+logger = logging.getLogger(__name__)
+
+_configure_lock = threading.Lock()
+_configured_api_key: Optional[str] = None
+
+
+def configure_genai(api_key: str) -> None:
+    """
+    Configure the Gemini SDK once per process
+
+    genai.configure() drops the SDK's cached clients, so calling it again
+    with the same key would throw away warm connections.
+
+    Args:
+        api_key: Gemini API key
+    """
+    global _configured_api_key
+    with _configure_lock:
+        if _configured_api_key != api_key:
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+
+
+class ModelPool:
+    """Process-wide pool of model instances, one per allowed model, from the configured backend"""
+
+    def __init__(
+        self,
+        api_key: str,
+        default_model: str = settings.GEMINI_MODEL_NAME,
+        allowed_models: Optional[List[str]] = None,
+        model_factory: Optional[Callable] = None,
+        backend: str = settings.MODEL_BACKEND,
+    ):
+        if model_factory is None:
+            model_factory = get_model_factory(backend)
+        self._uses_sdk = model_factory is None
+        self._api_key = api_key
+        self.default_model = default_model
+        allowed = allowed_models if allowed_models is not None else settings.GEMINI_ALLOWED_MODELS
+        self.allowed_models = list(dict.fromkeys([default_model, *allowed]))
+        self._model_factory = model_factory or self._gemini_model
+        self._models: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _gemini_model(self, model_name: str):
+        """Build an SDK model; the SDK is imported and configured on first use"""
+        import google.generativeai as genai
+
+        configure_genai(self._api_key)
+        return genai.GenerativeModel(model_name)
+
+    def resolve(self, model_name: Optional[str] = None) -> str:
+        """
+        Resolve a requested model name against the allowlist
+
+        Args:
+            model_name: Requested model, or None for the default
+
+        Returns:
+            The model name to use
+        """
+        name = model_name or self.default_model
+        if name not in self.allowed_models:
+            raise ValueError(f"Model '{name}' is not allowed. Allowed models: {', '.join(self.allowed_models)}")
+        return name
+
+    def get(self, model_name: Optional[str] = None):
+        """
+        Get the shared model instance for a model name
+
+        Args:
+            model_name: Requested model, or None for the default
+
+        Returns:
+            A GenerativeModel (or factory product) reused across requests
+        """
+        name = self.resolve(model_name)
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = self._model_factory(name)
+                    self._models[name] = model
+        return model
+
+    def warmup(self) -> None:
+        """Build every allowed model and open the SDK's transport clients ahead of traffic"""
+        for name in self.allowed_models:
+            self.get(name)
+        if not self._uses_sdk:
+            return
+        try:
+            from google.generativeai import client as genai_client
+
+            genai_client.get_default_generative_client()
+            genai_client.get_default_generative_async_client()
+        except Exception as e:
+            logger.warning("Could not pre-open Gemini clients: %s", e)
@@ -0,0 +1,106 @@
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+
+from ..config.settings import settings
+from ..utils.metrics import MODEL_TOKENS
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class _ModelTotals:
+    def __init__(self, latency_window: int):
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency_seconds = 0.0
+        self.latencies = deque(maxlen=latency_window)
+
+
+class ModelUsage:
+    """
+    Token usage, latency and cost of model calls, aggregated per model
+
+    Token counts come from the usage metadata the API returns with every
+    response; cost uses MODEL_PRICES (USD per million input and output
+    tokens). The report answers which model and configuration is the
+    cheapest and fastest for the traffic actually served.
+    """
+
+    def __init__(self, prices: Optional[Dict[str, Sequence[float]]] = None, latency_window: int = 1000):
+        self.prices = prices if prices is not None else settings.MODEL_PRICES
+        self._latency_window = latency_window
+        self._models: Dict[str, _ModelTotals] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_name: str, response: Any, latency_seconds: float) -> Dict[str, int]:
+        """
+        Record one model call
+
+        Args:
+            model_name: Model that answered
+            response: SDK response (or completed stream) carrying usage_metadata
+            latency_seconds: Time from the first attempt to the complete response
+
+        Returns:
+            The call's input and output token counts
+        """
+        usage = getattr(response, "usage_metadata", None)
+        input_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        MODEL_TOKENS.inc(input_tokens, model=model_name, direction="input")
+        MODEL_TOKENS.inc(output_tokens, model=model_name, direction="output")
+        with self._lock:
+            totals = self._models.get(model_name)
+            if totals is None:
+                totals = self._models[model_name] = _ModelTotals(self._latency_window)
+            totals.requests += 1
+            totals.input_tokens += input_tokens
+            totals.output_tokens += output_tokens
+            totals.latency_seconds += latency_seconds
+            totals.latencies.append(latency_seconds)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens}
+
+    def cost(self, model_name: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+        """Cost in USD of the given tokens, or None for a model without a price"""
+        price = self.prices.get(model_name)
+        if price is None:
+            return None
+        input_price, output_price = price
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Summarize usage per model
+
+        Returns:
+            Per model: requests, token totals and means, latency mean and
+            percentiles (over the last calls), and total and per-request cost
+        """
+        with self._lock:
+            snapshot = {
+                name: (totals.requests, totals.input_tokens, totals.output_tokens,
+                       totals.latency_seconds, sorted(totals.latencies))
+                for name, totals in self._models.items()
+            }
+        report = {}
+        for name, (requests, input_tokens, output_tokens, latency_seconds, latencies) in snapshot.items():
+            cost = self.cost(name, input_tokens, output_tokens)
+            report[name] = {
+                "requests": requests,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "mean_input_tokens": round(input_tokens / requests, 1),
+                "mean_output_tokens": round(output_tokens / requests, 1),
+                "mean_latency_ms": round(latency_seconds / requests * 1000, 1),
+                "p50_latency_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+                "p95_latency_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+                "cost_usd": round(cost, 6) if cost is not None else None,
+                "cost_per_request_usd": round(cost / requests, 8) if cost is not None else None,
+            }
+        return report
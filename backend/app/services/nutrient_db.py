@@ -0,0 +1,183 @@
+import csv
+import functools
+import logging
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import ValidationError
+
+from ..config.settings import settings
+from ..models.food import FoodItem
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_TABLE = Path(__file__).resolve().parent.parent / "data" / "nutrients.csv"
+
+# Table columns, per 100 g, in FoodAnalysis field names
+NUTRIENTS = ("calories_kcal", "protein_g", "carbohydrates_g", "fat_g")
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """Lower-case a food name and collapse punctuation and whitespace"""
+    return _NON_WORD.sub(" ", name.lower()).strip()
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NutrientDatabase:
+    """
+    Nutrients per 100 g for common foods, with a fuzzy name index
+
+    The values live in one float32 array (one row per food), so the
+    nutrients of a whole plate are a single gather and matrix product.
+    Names and aliases are indexed by character trigrams: an exact name
+    is a dict hit, anything else is scored only against the foods that
+    share a trigram with it. Name lookups are memoized, since models
+    describe the same foods over and over.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        values: np.ndarray,
+        aliases: Optional[Dict[str, int]] = None,
+        match_threshold: float = settings.NUTRIENT_MATCH_THRESHOLD,
+        lookup_cache_size: int = 4096,
+    ):
+        self.names = list(names)
+        self.values = np.asarray(values, dtype=np.float32).reshape(len(self.names), len(NUTRIENTS))
+        self.match_threshold = match_threshold
+
+        # Every name and alias -> row, and trigram -> keys containing it
+        self._keys: Dict[str, int] = {normalize_name(name): row for row, name in enumerate(self.names)}
+        for alias, row in (aliases or {}).items():
+            self._keys.setdefault(normalize_name(alias), row)
+        self._key_trigrams = {key: _trigrams(key) for key in self._keys}
+        self._index: Dict[str, List[str]] = defaultdict(list)
+        for key, grams in self._key_trigrams.items():
+            for gram in grams:
+                self._index[gram].append(key)
+
+        self.lookup = functools.lru_cache(maxsize=lookup_cache_size)(self._lookup)
+
+    @classmethod
+    def from_csv(cls, path: Path = BUNDLED_TABLE, **kwargs) -> "NutrientDatabase":
+        """
+        Load a table with name, aliases ("|"-separated) and the NUTRIENTS columns
+
+        Args:
+            path: CSV file
+            **kwargs: Passed to the constructor
+
+        Returns:
+            The loaded database
+        """
+        names, rows, aliases = [], [], {}
+        with open(path, newline="", encoding="utf-8") as table:
+            for record in csv.DictReader(table):
+                row = len(names)
+                names.append(record["name"])
+                rows.append([float(record[column]) for column in NUTRIENTS])
+                for alias in filter(None, (record.get("aliases") or "").split("|")):
+                    aliases[alias] = row
+        logger.info("Loaded %d foods from %s", len(names), path)
+        return cls(names, np.array(rows, dtype=np.float32), aliases, **kwargs)
+
+    def _lookup(self, name: str) -> Optional[int]:
+        """Row of the best matching food, or None below the match threshold"""
+        key = normalize_name(name)
+        row = self._keys.get(key)
+        if row is not None or not key:
+            return row
+
+        query = _trigrams(key)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in query:
+            for candidate in self._index.get(gram, ()):
+                shared[candidate] += 1
+        best_key, best_score = None, 0.0
+        for candidate, count in shared.items():
+            # Dice coefficient over trigram sets
+            score = 2 * count / (len(query) + len(self._key_trigrams[candidate]))
+            if score > best_score:
+                best_key, best_score = candidate, score
+        if best_score < self.match_threshold:
+            return None
+        return self._keys[best_key]
+
+    def estimate(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Compute the nutrients of recognized food items
+
+        Args:
+            items: Model output, [{"name": "white rice", "grams": 150}, ...]
+
+        Returns:
+            FoodAnalysis fields: total nutrients (as strings and numbers)
+            and each item with its matched food and nutrients. When no
+            item matched, only the items are returned and the totals stay
+            unset, as in a direct analysis that found no food
+        """
+        recognized: List[FoodItem] = []
+        for item in items:
+            try:
+                recognized.append(FoodItem.model_validate(item))
+            except ValidationError:
+                logger.debug("Skipping unusable item %r", item)
+        rows = [self.lookup(item.name) for item in recognized]
+        if all(row is None for row in rows):
+            return {"items": [item.model_dump() for item in recognized]}
+
+        # Unmatched items stay in the list but contribute nothing
+        indices = np.array([row if row is not None else 0 for row in rows], dtype=np.intp)
+        scale = np.array(
+            [item.grams / 100 if row is not None else 0.0 for item, row in zip(recognized, rows)],
+            dtype=np.float32,
+        )
+        per_item = self.values[indices] * scale[:, None]
+        totals = per_item.sum(axis=0)
+
+        result: Dict[str, Any] = {
+            column: round(float(value), 1) for column, value in zip(NUTRIENTS, totals)
+        }
+        result.update(
+            calories=f"{result['calories_kcal']:g}",
+            protein=f"{result['protein_g']:g}g",
+            carbohydrates=f"{result['carbohydrates_g']:g}g",
+            fat=f"{result['fat_g']:g}g",
+        )
+        result["items"] = [
+            item.model_copy(update={
+                "matched": self.names[row],
+                **{column: round(float(value), 1) for column, value in zip(NUTRIENTS, nutrients)},
+            }).model_dump() if row is not None else item.model_dump()
+            for item, row, nutrients in zip(recognized, rows, per_item)
+        ]
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """Return the table size and name lookup memo counters"""
+        info = self.lookup.cache_info()
+        return {"foods": len(self.names), "lookup_hits": info.hits, "lookup_misses": info.misses}
+
+
+@functools.lru_cache(maxsize=None)
+def get_nutrient_database(path: Optional[str] = None) -> NutrientDatabase:
+    """
+    Return the process-wide nutrient database, loaded on first use
+
+    Args:
+        path: CSV table (defaults to NUTRIENT_DB_PATH, or the bundled table)
+
+    Returns:
+        The shared NutrientDatabase
+    """
+    return NutrientDatabase.from_csv(Path(path or settings.NUTRIENT_DB_PATH or BUNDLED_TABLE))
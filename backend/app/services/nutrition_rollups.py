@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from ..config.settings import settings
+from ..models.food import FoodAnalysis
+
+logger = logging.getLogger(__name__)
+
+DAY = "day"
+MONTH = "month"
+NUTRIENT_FIELDS = {
+    "calories": "calories_kcal",
+    "protein": "protein_g",
+    "carbohydrates": "carbohydrates_g",
+    "fat": "fat_g",
+}
+
+
+def _utc_naive(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def day_bucket(timestamp: datetime) -> datetime:
+    """Start of the UTC day containing timestamp"""
+    timestamp = _utc_naive(timestamp)
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+
+def month_bucket(timestamp: datetime, months_back: int = 0) -> datetime:
+    """Start of the UTC month containing timestamp, optionally shifted back"""
+    timestamp = _utc_naive(timestamp)
+    index = timestamp.year * 12 + timestamp.month - 1 - months_back
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _rollup_id(user_id: str, granularity: str, bucket: datetime) -> str:
+    return f"{user_id}:{granularity}:{bucket.date().isoformat()}"
+
+
+class NutritionRollupRepository:
+    """
+    Per-user daily and monthly nutrient totals
+
+    Each recorded analysis increments one daily and one monthly document,
+    so charts read O(buckets) documents instead of scanning every analysis.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self) -> None:
+        """Create the index chart reads use"""
+        await self.collection.create_index(
+            [("user_id", 1), ("granularity", 1), ("bucket", 1)], name="user_granularity_bucket"
+        )
+
+    async def add(self, user_id: str, analysis: FoodAnalysis, timestamp: datetime, session=None) -> None:
+        """
+        Fold one analysis into the day and month rollups
+
+        Args:
+            user_id: Owner of the analysis
+            analysis: Analysis result
+            timestamp: When the meal was analyzed
+            session: Client session of the transaction recording the analysis (optional)
+        """
+        increments = {"count": 1}
+        for name, field in NUTRIENT_FIELDS.items():
+            increments[name] = getattr(analysis, field) or 0
+        for granularity, bucket in ((DAY, day_bucket(timestamp)), (MONTH, month_bucket(timestamp))):
+            await self.collection.update_one(
+                {"_id": _rollup_id(user_id, granularity, bucket)},
+                {
+                    "$inc": increments,
+                    "$setOnInsert": {"user_id": user_id, "granularity": granularity, "bucket": bucket},
+                },
+                upsert=True,
+                session=session,
+            )
+
+    async def buckets(self, user_id: str, granularity: str, since: datetime) -> List[Dict]:
+        """
+        Rollup documents for a user from since onwards, oldest first
+
+        Args:
+            user_id: Owner of the analyses
+            granularity: DAY or MONTH
+            since: Earliest bucket start to include
+
+        Returns:
+            Rollup documents
+        """
+        cursor = self.collection.find(
+            {"user_id": user_id, "granularity": granularity, "bucket": {"$gte": _utc_naive(since)}}
+        ).sort("bucket", 1)
+        return await cursor.to_list(length=None)
+
+    async def rebuild(self, analyses_collection, user_id: Optional[str] = None) -> int:
+        """
+        Recompute rollups from the raw analyses
+
+        Readers never see a partial result: a full rebuild is written to a
+        scratch collection and renamed over the live one, and a single-user
+        rebuild replaces that user's documents one by one before deleting
+        buckets that no longer exist. Increments recorded while the
+        aggregation runs may be lost, so rebuild while writes are quiet.
+
+        Args:
+            analyses_collection: Collection written by AnalysisHistoryRepository
+            user_id: Only rebuild this user (default: everyone)
+
+        Returns:
+            Number of rollup documents written
+        """
+        match = {"user_id": user_id} if user_id else {}
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "year": {"$year": "$timestamp"},
+                    "month": {"$month": "$timestamp"},
+                    "day": {"$dayOfMonth": "$timestamp"},
+                },
+                "count": {"$sum": 1},
+                **{name: {"$sum": {"$ifNull": [f"${field}", 0]}} for name, field in NUTRIENT_FIELDS.items()},
+            }},
+        ]
+        days = await analyses_collection.aggregate(pipeline).to_list(length=None)
+
+        documents: Dict[str, Dict] = {}
+        for row in days:
+            key = row["_id"]
+            day = datetime(key["year"], key["month"], key["day"])
+            for granularity, bucket in ((DAY, day), (MONTH, month_bucket(day))):
+                rollup_id = _rollup_id(key["user_id"], granularity, bucket)
+                document = documents.setdefault(rollup_id, {
+                    "_id": rollup_id,
+                    "user_id": key["user_id"],
+                    "granularity": granularity,
+                    "bucket": bucket,
+                    "count": 0,
+                    **{name: 0 for name in NUTRIENT_FIELDS},
+                })
+                for name in ("count", *NUTRIENT_FIELDS):
+                    document[name] += row[name]
+
+        if user_id:
+            await self._replace_user(user_id, documents)
+        else:
+            await self._replace_all(documents)
+        return len(documents)
+
+    async def _replace_all(self, documents: Dict[str, Dict]) -> None:
+        """Swap in a complete set of rollups with a single rename"""
+        if not documents:
+            await self.collection.delete_many({})
+            return
+        scratch = self.collection.database[f"{self.collection.name}_rebuild"]
+        await scratch.drop()
+        await scratch.insert_many(list(documents.values()))
+        await NutritionRollupRepository(scratch).ensure_indexes()
+        await scratch.rename(self.collection.name, dropTarget=True)
+
+    async def _replace_user(self, user_id: str, documents: Dict[str, Dict]) -> None:
+        """Overwrite one user's rollups in place, then drop buckets that are gone"""
+        for rollup_id, document in documents.items():
+            await self.collection.replace_one({"_id": rollup_id}, document, upsert=True)
+        await self.collection.delete_many({"user_id": user_id, "_id": {"$nin": list(documents)}})
+
+
+async def _rebuild_all() -> None:
+    from .database import close_mongo_client, get_database
+
+    database = get_database()
+    rollups = NutritionRollupRepository(database[settings.NUTRITION_ROLLUP_COLLECTION])
+    await rollups.ensure_indexes()
+    written = await rollups.rebuild(database[settings.ANALYSIS_HISTORY_COLLECTION])
+    close_mongo_client()
+    print(f"Rebuilt {written} rollup documents")
+
+
+if __name__ == "__main__":
+    asyncio.run(_rebuild_all())
@@ -0,0 +1,143 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from ..config.settings import settings
+
+if TYPE_CHECKING:
+    import PIL.Image
+
+HASH_BITS = 64
+
+
+def dhash(img: "PIL.Image.Image", hash_size: int = 8) -> int:
+    """
+    Compute a difference hash of an image
+
+    Args:
+        img: PIL image
+        hash_size: Width/height of the hash grid (8 gives a 64-bit hash)
+
+    Returns:
+        Hash as an integer
+    """
+    import PIL.Image
+
+    # convert() returns a copy; the caller's image is sent to the model
+    # unchanged, so it must not be put in draft mode here
+    small = img.convert("L").resize((hash_size + 1, hash_size), PIL.Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    row_width = hash_size + 1
+    for row in range(hash_size):
+        offset = row * row_width
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def make_namespace(prompt: str, model_name: str) -> str:
+    """Build the namespace a hash is matched in, so results never cross prompts or models"""
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class PerceptualIndex:
+    """
+    Near-duplicate index over 64-bit perceptual hashes
+
+    Uses multi-index hashing: each hash is split into max_distance + 1
+    disjoint chunks, so by the pigeonhole principle any hash within
+    max_distance bits shares at least one chunk exactly. Lookups probe
+    one exact-match table per chunk and verify candidates by popcount.
+    """
+
+    def __init__(
+        self,
+        max_distance: int = settings.PHASH_MAX_DISTANCE,
+        max_entries: int = settings.PHASH_MAX_ENTRIES,
+    ):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        chunk_count = max_distance + 1
+        base, extra = divmod(HASH_BITS, chunk_count)
+        self._chunks: List[Tuple[int, int]] = []
+        shift = 0
+        for i in range(chunk_count):
+            width = base + (1 if i < extra else 0)
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables: List[Dict[Tuple[str, int], set]] = [{} for _ in self._chunks]
+        self._entries: "OrderedDict[int, Tuple[str, int, Dict]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, namespace: str, hash_value: int, result: Dict) -> None:
+        """Index a result under its perceptual hash"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (namespace, hash_value, dict(result))
+            for table, (shift, mask) in zip(self._tables, self._chunks):
+                table.setdefault((namespace, (hash_value >> shift) & mask), set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def find(self, namespace: str, hash_value: int) -> Optional[Dict]:
+        """
+        Find the closest stored result within max_distance
+
+        Args:
+            namespace: Namespace from make_namespace
+            hash_value: Perceptual hash of the query image
+
+        Returns:
+            Stored result dict, or None if no near-duplicate exists
+        """
+        with self._lock:
+            best = None
+            best_distance = self.max_distance + 1
+            seen = set()
+            for table, (shift, mask) in zip(self._tables, self._chunks):
+                bucket = table.get((namespace, (hash_value >> shift) & mask))
+                if not bucket:
+                    continue
+                for entry_id in bucket:
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    distance = (self._entries[entry_id][1] ^ hash_value).bit_count()
+                    if distance < best_distance:
+                        best, best_distance = entry_id, distance
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(self._entries[best][2])
+
+    def _evict_oldest(self) -> None:
+        entry_id, (namespace, hash_value, _) = self._entries.popitem(last=False)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            chunk_key = (namespace, (hash_value >> shift) & mask)
+            bucket = table.get(chunk_key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[chunk_key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Return near-duplicate hit/miss counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_distance": self.max_distance,
+            }
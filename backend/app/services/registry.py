@@ -0,0 +1,75 @@
+import logging
+from functools import cached_property
+from typing import Awaitable, Callable
+
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """
+    Lazily built application services
+
+    Nothing is constructed on import, so every worker process builds its
+    own services after forking: on first use, or ahead of traffic in
+    startup() from the application lifespan.
+    """
+
+    def __init__(self, run_job: Callable[..., Awaitable]):
+        self._run_job = run_job
+
+    @cached_property
+    def food_service(self):
+        from .food_analysis_service import FoodAnalysisService
+
+        return FoodAnalysisService()
+
+    @cached_property
+    def history(self):
+        if not settings.ANALYSIS_HISTORY_ENABLED:
+            return None
+        from .analysis_history import AnalysisHistoryRepository
+        from .database import get_database
+        from .nutrition_rollups import NutritionRollupRepository
+
+        rollups = None
+        if settings.NUTRITION_ROLLUPS_ENABLED:
+            rollups = NutritionRollupRepository(get_database()[settings.NUTRITION_ROLLUP_COLLECTION])
+        return AnalysisHistoryRepository(get_database()[settings.ANALYSIS_HISTORY_COLLECTION], rollups)
+
+    @cached_property
+    def chart_service(self):
+        from .chart_data_service import ChartDataService
+
+        return ChartDataService(self.history)
+
+    @cached_property
+    def job_queue(self):
+        from .job_queue import JobQueue
+
+        return JobQueue(self._run_job)
+
+    def is_initialized(self, name: str) -> bool:
+        """Whether a service has been built (without building it)"""
+        return name in self.__dict__
+
+    async def startup(self) -> None:
+        """Build the services and warm their connections before the first request"""
+        self.food_service.warmup()
+        if self.history is not None:
+            try:
+                await self.history.ensure_indexes()
+            except Exception as e:
+                logger.warning("Could not create analysis history indexes: %s", e)
+        self.job_queue.start()
+
+    async def shutdown(self) -> None:
+        """Stop background work and close shared connections"""
+        from .database import close_mongo_client
+        from .shared_state import close_redis_client
+
+        if self.is_initialized("job_queue"):
+            await self.job_queue.stop()
+        close_mongo_client()
+        await close_redis_client()
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Dict, Optional
+
+from ..config.settings import settings
+from .upstream_client import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "prompted_plate"
+
+_client = None
+_blocking_client = None
+
+
+def get_redis_client(url: Optional[str] = None):
+    """
+    Return the process-wide asyncio Redis client for state shared between workers
+
+    Any server speaking the Redis protocol works (Redis, Valkey, KeyDB,
+    Dragonfly). The rate limiter, the in-flight lease and cache access
+    from coroutines all go through this client, so no Redis round trip
+    blocks the event loop.
+
+    Args:
+        url: Server URL (defaults to SHARED_STATE_URL)
+
+    Returns:
+        redis.asyncio.Redis client, or None when no shared state is configured
+    """
+    global _client
+    url = url or settings.SHARED_STATE_URL
+    if not url:
+        return None
+    if _client is None:
+        import redis.asyncio
+
+        _client = redis.asyncio.Redis.from_url(url, socket_timeout=settings.SHARED_STATE_TIMEOUT_SECONDS)
+    return _client
+
+
+def get_blocking_redis_client(url: Optional[str] = None):
+    """
+    Return the process-wide blocking Redis client
+
+    Only for cache lookups made on executor threads (the prepare stage),
+    which cannot await the asyncio client.
+
+    Args:
+        url: Server URL (defaults to SHARED_STATE_URL)
+
+    Returns:
+        redis.Redis client, or None when no shared state is configured
+    """
+    global _blocking_client
+    url = url or settings.SHARED_STATE_URL
+    if not url:
+        return None
+    if _blocking_client is None:
+        import redis
+
+        _blocking_client = redis.Redis.from_url(url, socket_timeout=settings.SHARED_STATE_TIMEOUT_SECONDS)
+    return _blocking_client
+
+
+async def close_redis_client() -> None:
+    """Close the shared clients, if they were opened"""
+    global _client, _blocking_client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _blocking_client is not None:
+        _blocking_client.close()
+        _blocking_client = None
+
+
+class RedisCacheStore:
+    """Shared cache tier on Redis, so every worker serves results any worker produced"""
+
+    def __init__(self, client, blocking_client, ttl_seconds: int, namespace: str = f"{NAMESPACE}:cache"):
+        """
+        Args:
+            client: asyncio Redis client, used from coroutines
+            blocking_client: Blocking Redis client, used from worker threads
+            ttl_seconds: Lifetime of a cached result
+            namespace: Key prefix
+        """
+        self._client = client
+        self._blocking_client = blocking_client
+        self.ttl_seconds = ttl_seconds
+        self._prefix = f"{namespace}:"
+
+    def get(self, key: str) -> Optional[Dict]:
+        data = self._blocking_client.get(self._prefix + key)
+        return json.loads(data) if data else None
+
+    def set(self, key: str, value: Dict) -> None:
+        self._blocking_client.set(self._prefix + key, json.dumps(value), ex=self.ttl_seconds)
+
+    async def get_async(self, key: str) -> Optional[Dict]:
+        data = await self._client.get(self._prefix + key)
+        return json.loads(data) if data else None
+
+    async def set_async(self, key: str, value: Dict) -> None:
+        await self._client.set(self._prefix + key, json.dumps(value), ex=self.ttl_seconds)
+
+
+# Refill and take one token atomically; returns the wait in microseconds
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = redis.call('TIME')
+local now_us = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now_us
+tokens = math.min(capacity, tokens + (now_us - updated) * rate / 1000000) - 1
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now_us)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+if tokens >= 0 then
+    return 0
+end
+return math.ceil(-tokens / rate * 1000000)
+"""
+
+
+class RedisTokenBucket(TokenBucket):
+    """
+    Token bucket whose tokens live in Redis, shared by all workers
+
+    The whole fleet stays within one quota instead of each worker
+    assuming it has the quota to itself. If Redis is unreachable the
+    bucket falls back to its local state for that call.
+    """
+
+    def __init__(self, client, rate_per_second: float, burst: int, key: str = f"{NAMESPACE}:rate_limit"):
+        super().__init__(rate_per_second, burst)
+        self._client = client
+        self._key = key
+        self._script = client.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self) -> None:
+        try:
+            wait = int(await self._script(keys=[self._key], args=[self.rate, self.capacity])) / 1_000_000
+        except Exception as e:
+            logger.warning("Shared rate limiter unavailable, limiting locally: %s", e)
+            wait = self._reserve()
+        else:
+            if wait:
+                with self._lock:
+                    self.waits += 1
+                    self.wait_seconds += wait
+        if wait:
+            await asyncio.sleep(wait)
+
+    # acquire_sync is inherited: blocking callers have no event loop to reach Redis from and limit locally
+
+
+# Delete the lease only if this worker still holds it
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """
+    Cross-worker marker for an analysis in flight
+
+    SingleFlight coalesces identical requests within a worker; the lease
+    extends that across workers. The worker holding the lease calls the
+    model, the others wait for it to be released and read the result from
+    the shared cache.
+    """
+
+    def __init__(
+        self,
+        client,
+        ttl_seconds: float = settings.SHARED_LEASE_TTL_SECONDS,
+        poll_seconds: float = 0.05,
+        namespace: str = f"{NAMESPACE}:in_flight",
+    ):
+        self._client = client
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds
+        self._prefix = f"{namespace}:"
+        self._token = uuid.uuid4().hex
+        self._release = client.register_script(_RELEASE_SCRIPT)
+        self.acquired = 0
+        self.waited = 0
+
+    async def acquire(self, key: str) -> bool:
+        """Take the lease for key; False if another worker holds it"""
+        try:
+            taken = bool(await self._client.set(self._prefix + key, self._token, nx=True, px=int(self.ttl_seconds * 1000)))
+        except Exception as e:
+            logger.warning("Shared lease unavailable: %s", e)
+            return True
+        if taken:
+            self.acquired += 1
+        return taken
+
+    async def release(self, key: str) -> None:
+        try:
+            await self._release(keys=[self._prefix + key], args=[self._token])
+        except Exception as e:
+            logger.warning("Could not release shared lease: %s", e)
+
+    async def wait(self, key: str) -> None:
+        """Wait until the lease for key is released or expires"""
+        self.waited += 1
+        deadline = time.monotonic() + self.ttl_seconds
+        while time.monotonic() < deadline:
+            try:
+                if not await self._client.exists(self._prefix + key):
+                    return
+            except Exception:
+                return
+            await asyncio.sleep(self.poll_seconds)
+
+    def stats(self) -> Dict[str, int]:
+        return {"acquired": self.acquired, "waited": self.waited}
+
+
+def create_rate_limiter() -> TokenBucket:
+    """
+    Build the model API rate limiter
+
+    With SHARED_STATE_URL the quota is enforced fleet-wide in Redis;
+    otherwise each of the WEB_CONCURRENCY workers gets an equal share.
+    A rate of 0 disables limiting.
+    """
+    rate = settings.UPSTREAM_REQUESTS_PER_MINUTE / 60
+    client = get_redis_client()
+    if client is not None and rate > 0:
+        return RedisTokenBucket(client, rate, settings.UPSTREAM_BURST)
+    workers = max(1, settings.WEB_CONCURRENCY)
+    return TokenBucket(rate / workers, max(1, settings.UPSTREAM_BURST // workers))
+
+
+def create_lease() -> Optional[RedisLease]:
+    """Build the cross-worker in-flight lease, or None without shared state"""
+    client = get_redis_client()
+    return RedisLease(client) if client is not None else None
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..config.settings import settings
+from ..utils.metrics import MODEL_ERRORS, MODEL_REQUEST_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised when the model API cannot be reached: retries exhausted or circuit open"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether an upstream error is worth retrying
+
+    Rate limiting (429), server errors (5xx) and timeouts are; invalid
+    requests and auth failures are not.
+    """
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    return isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError))
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by sync and async callers; a rate of 0 disables limiting"""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def _reserve(self) -> float:
+        """Take a token, possibly in the future; return how long to wait for it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            wait = -self._tokens / self.rate
+            self.waits += 1
+            self.wait_seconds += wait
+            return wait
+
+    async def acquire(self) -> None:
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self) -> None:
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            tokens = min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+            return {
+                "rate_per_second": self.rate,
+                "burst": self.capacity,
+                "tokens": round(tokens, 2),
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing upstream for a cool-down period
+
+    After failure_threshold consecutive retryable failures the circuit
+    opens and calls fail fast. Once reset_seconds have passed, a single
+    trial call is let through (half-open); its outcome closes or re-opens
+    the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """Let another half-open trial through after one ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+            }
+
+
+class UpstreamClient:
+    """Rate-limited, retrying, circuit-broken calls to the model API"""
+
+    def __init__(
+        self,
+        limiter: Optional[TokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_retries: int = settings.UPSTREAM_MAX_RETRIES,
+        base_delay: float = settings.UPSTREAM_RETRY_BASE_DELAY,
+        max_delay: float = settings.UPSTREAM_RETRY_MAX_DELAY,
+    ):
+        self.limiter = limiter or TokenBucket(
+            settings.UPSTREAM_REQUESTS_PER_MINUTE / 60, settings.UPSTREAM_BURST
+        )
+        self.breaker = breaker or CircuitBreaker(
+            settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_SECONDS
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+
+    async def generate(self, model, contents: List[Any], **kwargs) -> Any:
+        """
+        Call model.generate_content_async with limiting, retries and circuit breaking
+
+        Args:
+            model: Model from the model pool
+            contents: Content to send
+            **kwargs: Passed through to the SDK (e.g. stream=True)
+
+        Returns:
+            The SDK response
+        """
+        if kwargs.get("stream"):
+            return await StreamedResponse.open(self, model, contents, kwargs)
+        response, _ = await self._generate(model, contents, kwargs)
+        self.breaker.record_success()
+        return response
+
+    async def _generate(self, model, contents: List[Any], kwargs: Dict[str, Any], first_attempt: int = 0):
+        """Make the call, retrying from first_attempt; returns the response and the attempt that produced it"""
+        for attempt in range(first_attempt, self.max_retries + 1):
+            self._check_circuit()
+            try:
+                await self.limiter.acquire()
+                start = time.perf_counter()
+                try:
+                    self.calls += 1
+                    response = await model.generate_content_async(contents, **kwargs)
+                except Exception as e:
+                    self._observe(model, start)
+                    delay = self._on_error(e, attempt)
+                    await asyncio.sleep(delay)
+                    continue
+            except BaseException:
+                # Cancelled (client gone, shutdown) before an outcome: a half-open trial must not stay taken
+                self.breaker.release_trial()
+                raise
+            self._observe(model, start)
+            return response, attempt
+
+    def generate_sync(self, model, contents: List[Any], **kwargs) -> Any:
+        """Blocking variant of generate for model.generate_content"""
+        for attempt in range(self.max_retries + 1):
+            self._check_circuit()
+            try:
+                self.limiter.acquire_sync()
+                start = time.perf_counter()
+                try:
+                    self.calls += 1
+                    response = model.generate_content(contents, **kwargs)
+                except Exception as e:
+                    self._observe(model, start)
+                    time.sleep(self._on_error(e, attempt))
+                    continue
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+            self._observe(model, start)
+            self.breaker.record_success()
+            return response
+
+    def _check_circuit(self) -> None:
+        if not self.breaker.allow():
+            self.rejected += 1
+            retry_after = self.breaker.retry_after()
+            raise UpstreamUnavailableError(
+                f"Model API is unavailable; retry in {retry_after:.0f}s", retry_after
+            )
+
+    @staticmethod
+    def _observe(model, start: float) -> None:
+        model_name = getattr(model, "model_name", "unknown")
+        MODEL_REQUEST_DURATION.observe(time.perf_counter() - start, model=model_name)
+
+    def _on_error(self, error: Exception, attempt: int, final: bool = False) -> float:
+        """Re-raise final or non-retryable errors; otherwise return the backoff delay"""
+        MODEL_ERRORS.inc(type=type(error).__name__)
+        if not is_retryable(error):
+            self.breaker.record_success()
+            raise error
+        self.failures += 1
+        self.breaker.record_failure()
+        if final or attempt >= self.max_retries:
+            raise UpstreamUnavailableError(
+                f"Model API failed after {attempt + 1} attempts: {error}", self.breaker.retry_after()
+            ) from error
+        self.retries += 1
+        # Full jitter keeps many workers from retrying in lockstep
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        logger.info("Retrying model call in %.2fs after: %s", delay, error)
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        """Return limiter, breaker and retry counters"""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "limiter": self.limiter.stats(),
+            "circuit": self.breaker.stats(),
+        }
+
+
+class StreamedResponse:
+    """
+    A streamed model response whose reading is accounted like the call itself
+
+    The SDK reports most failures while the stream is read rather than when
+    it is opened. An error before the first chunk is retried with a fresh
+    call; once chunks have been handed out the call cannot be replayed, so
+    a later error counts against the breaker and is raised. Success is
+    recorded only when the stream has been read to the end. Other
+    attributes (text, usage_metadata) come from the underlying response.
+    """
+
+    def __init__(self, client: UpstreamClient, model, contents: List[Any], kwargs: Dict[str, Any], response, attempt: int):
+        self._client = client
+        self._model = model
+        self._contents = contents
+        self._kwargs = kwargs
+        self._response = response
+        self._attempt = attempt
+
+    @classmethod
+    async def open(cls, client: UpstreamClient, model, contents: List[Any], kwargs: Dict[str, Any]) -> "StreamedResponse":
+        response, attempt = await client._generate(model, contents, kwargs)
+        return cls(client, model, contents, kwargs, response, attempt)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._response, name)
+
+    async def __aiter__(self):
+        delivered = False
+        settled = False
+        try:
+            while True:
+                try:
+                    async for chunk in self._response:
+                        delivered = True
+                        yield chunk
+                except Exception as e:
+                    # The failure is accounted here and in the retried call
+                    settled = True
+                    delay = self._client._on_error(e, self._attempt, final=delivered)
+                    await asyncio.sleep(delay)
+                    self._response, self._attempt = await self._client._generate(
+                        self._model, self._contents, self._kwargs, self._attempt + 1
+                    )
+                    settled = False
+                    continue
+                self._client.breaker.record_success()
+                settled = True
+                return
+        finally:
+            # A reader that stops early still releases a half-open trial
+            if not settled:
+                self._client.breaker.record_success()
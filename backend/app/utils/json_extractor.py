@@ -0,0 +1,151 @@
+import json
+import re
+from typing import Any, List, Optional
+
+try:
+    import orjson
+
+    def _loads(text: str) -> Any:
+        return orjson.loads(text)
+
+    JSON_BACKEND = "orjson"
+except ImportError:  # pragma: no cover - depends on installed packages
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+_STRUCTURAL = re.compile(r'[\[\]{}"\\]')
+_OPENERS = {"{": "}", "[": "]"}
+
+
+class JSONExtractionError(ValueError):
+    """Raised when no JSON value can be extracted from model output"""
+
+
+class JSONStreamExtractor:
+    """
+    Single-pass extractor for the first balanced JSON value in model output
+
+    Text may arrive in chunks. Prose before the value, markdown fences and
+    trailing text are skipped. Scanning only stops on structural characters
+    (brackets, quotes, backslashes), so plain text is skipped at C speed,
+    and the value is decoded once, when its closing bracket arrives.
+    """
+
+    def __init__(self, openers: str = "{["):
+        self.openers = openers
+        self.result: Any = None
+        self.done = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        """
+        Consume the next chunk of model output
+
+        Args:
+            chunk: Text to append
+
+        Returns:
+            The decoded value once it is complete, otherwise None
+        """
+        if self.done or not chunk:
+            return None
+
+        while True:
+            pos = 0
+            if self._depth == 0:
+                pos = self._find_start(chunk, 0)
+                if pos < 0:
+                    return None
+
+            end = self._scan(chunk, pos)
+            if end < 0:
+                self._parts.append(chunk[pos:])
+                return None
+
+            self._parts.append(chunk[pos:end + 1])
+            candidate = "".join(self._parts)
+            self._reset()
+            try:
+                self.result = _loads(candidate)
+            except ValueError:
+                # Balanced but not JSON, e.g. "[see below]"; rescan after its opener
+                chunk = candidate[1:] + chunk[end + 1:]
+                continue
+            self.done = True
+            return self.result
+
+    def finish(self) -> Any:
+        """
+        Return the extracted value after the last chunk
+
+        Returns:
+            The decoded value
+        """
+        if not self.done:
+            raise JSONExtractionError("No complete JSON value found in response")
+        return self.result
+
+    def _find_start(self, chunk: str, pos: int) -> int:
+        starts = [i for i in (chunk.find(c, pos) for c in self.openers) if i >= 0]
+        return min(starts) if starts else -1
+
+    def _scan(self, chunk: str, pos: int) -> int:
+        """Advance the bracket state machine; return the index closing the value or -1"""
+        if self._depth == 0:
+            # pos points at the opener
+            self._depth = 1
+            pos += 1
+        for match in _STRUCTURAL.finditer(chunk, pos):
+            index = match.start()
+            if self._escape:
+                self._escape = False
+                if index == pos:
+                    pos = index + 1
+                    continue
+            char = match.group()
+            if self._in_string:
+                if char == "\\":
+                    self._escape = True
+                    pos = index + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _OPENERS:
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    return index
+        if self._escape and pos < len(chunk):
+            # The escaped character was plain text already passed by the regex
+            self._escape = False
+        return -1
+
+
+def extract_json(text: str, openers: str = "{[") -> Any:
+    """
+    Extract the first balanced JSON value from model output
+
+    Args:
+        text: Model output, possibly wrapped in prose or markdown fences
+        openers: Which value types may start the match ("{" for objects only)
+
+    Returns:
+        The decoded value
+    """
+    # Fast path: the whole response is the value, as the prompt asks for
+    if text[:1] in openers and text[-1:] == _OPENERS.get(text[:1]):
+        try:
+            return _loads(text)
+        except ValueError:
+            pass
+    extractor = JSONStreamExtractor(openers)
+    extractor.feed(text)
+    return extractor.finish()
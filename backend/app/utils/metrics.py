@@ -0,0 +1,298 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name + "_total", _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative bucketed observations, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall-clock duration of a block, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            values = [(key, list(series[0]), series[1]) for key, series in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield self.name + "_bucket", _format_labels(self.labelnames, key, le), cumulative
+            yield self.name + "_sum", _format_labels(self.labelnames, key), total
+            yield self.name + "_count", _format_labels(self.labelnames, key), cumulative
+
+
+class CallbackMetric:
+    """
+    Gauge or counter read from a callback at scrape time
+
+    The callback returns a number, or a dict mapping label values (tuples
+    for several labels) to numbers. Nothing is recorded on the request
+    path, so existing stats counters can be exported for free.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], object],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        sample_name = self.name + "_total" if self.kind == "counter" else self.name
+        value = self.callback()
+        if isinstance(value, dict):
+            for key, item in value.items():
+                key = key if isinstance(key, tuple) else (key,)
+                yield sample_name, _format_labels(self.labelnames, key), item
+        else:
+            yield sample_name, "", value
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric; registering a name again replaces the earlier metric"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], object],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, kind))
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{labels} {_format_value(value)}")
+            except Exception as e:  # a broken gauge callback must not break the scrape
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+ANALYSIS_STAGE_DURATION = REGISTRY.histogram(
+    "analysis_stage_duration_seconds",
+    "Time spent in each analysis stage (read, decode, hash, encode, model, parse)",
+    ("stage",),
+)
+MODEL_REQUEST_DURATION = REGISTRY.histogram(
+    "model_request_duration_seconds",
+    "Latency of individual model API calls",
+    ("model",),
+)
+PAYLOAD_BYTES = REGISTRY.histogram(
+    "analysis_payload_bytes",
+    "Image sizes as uploaded and as sent to the model",
+    ("kind",),
+    SIZE_BUCKETS,
+)
+MODEL_TOKENS = REGISTRY.counter(
+    "model_tokens",
+    "Tokens billed by the model API, by model and direction (input, output)",
+    ("model", "direction"),
+)
+MODEL_ERRORS = REGISTRY.counter(
+    "model_errors",
+    "Failed model API calls by exception type, including retried ones",
+    ("type",),
+)
+IMAGE_VALIDATIONS = REGISTRY.counter(
+    "image_validations",
+    "Pre-flight image checks by outcome: accepted, or the rejection code",
+    ("outcome",),
+)
+ANALYSIS_ERRORS = REGISTRY.counter(
+    "analysis_errors",
+    "Failed analyses by error type",
+    ("type",),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template
+
+    Routes are labelled by their path template (/jobs/{job_id}, not the
+    concrete path) to keep label cardinality bounded.
+    """
+
+    def __init__(self, app, histogram: Histogram = HTTP_REQUEST_DURATION):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.histogram.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=_route_template(scope),
+                status=status,
+            )
+
+
+def _route_template(scope) -> str:
+    """Path template of the matched route, including any router prefix"""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is None or regex.match(path):
+        return template
+    # Routes of included routers may only know their path below the prefix
+    for index in range(1, len(path)):
+        if path[index] == "/" and regex.match(path[index:]):
+            return path[:index] + template
+    return template
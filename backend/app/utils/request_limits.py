@@ -0,0 +1,85 @@
+import json
+from typing import Callable
+
+from starlette.exceptions import HTTPException
+
+# Room for multipart boundaries, part headers and small form fields around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware capping the size of multipart request bodies
+
+    Starlette parses and spools the whole form before a route sees its
+    UploadFile, so a size check in the route only runs after the body has
+    been received. This middleware rejects a request up front when its
+    Content-Length is too large, and stops reading a chunked body as soon
+    as it passes the limit.
+    """
+
+    def __init__(self, app, max_size: Callable[[], int]):
+        """
+        Args:
+            app: The wrapped ASGI application
+            max_size: Returns the largest accepted file in bytes; read per
+                request so configuration changes apply without a restart
+        """
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _is_multipart(scope):
+            await self.app(scope, receive, send)
+            return
+
+        max_size = self.max_size()
+        limit = max_size + MULTIPART_OVERHEAD
+        content_length = _content_length(scope)
+        if content_length is not None and content_length > limit:
+            await _reject(send, max_size)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=_detail(max_size))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _is_multipart(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            return value.lower().startswith(b"multipart/form-data")
+    return False
+
+
+def _content_length(scope):
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+def _detail(max_size: int) -> str:
+    return f"File exceeds maximum size of {max_size} bytes"
+
+
+async def _reject(send, max_size: int) -> None:
+    body = json.dumps({"detail": _detail(max_size)}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
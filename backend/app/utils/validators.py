@@ -1,7 +1,19 @@
 import os
-from typing import List
+import struct
+from typing import TYPE_CHECKING, List, Optional, Tuple
 from ..config.settings import settings
 
+if TYPE_CHECKING:
+    import PIL.Image
+
+class ImageValidationError(ValueError):
+    """Raised when an image is rejected before any model call"""
+    
+    def __init__(self, code: str, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.code = code
+        self.status_code = status_code
+
 def validate_image_file(file_path: str) -> bool:
     """
     Validate if a file is a valid image
@@ -62,4 +74,179 @@ def sanitize_filename(filename: str) -> str:
     for char in dangerous_chars:
         filename = filename.replace(char, '_')
     
-    return filename 
\ No newline at end of file
+    return filename
+
+def sniff_image_type(data: bytes) -> Optional[str]:
+    """
+    Identify an image format from its magic bytes
+    
+    Args:
+        data: Start of the file (at least 12 bytes)
+        
+    Returns:
+        MIME type, or None if the data is not a recognized image
+    """
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1", b"avif"):
+        return "image/heic" if data[8:12] != b"avif" else "image/avif"
+    return None
+
+def read_image_size(data: bytes, mime_type: str) -> Optional[Tuple[int, int]]:
+    """
+    Read image dimensions from the file header, without decoding pixels
+    
+    Args:
+        data: Encoded image
+        mime_type: Format from sniff_image_type
+        
+    Returns:
+        (width, height), or None if the header is malformed
+    """
+    try:
+        if mime_type == "image/png":
+            if data[12:16] != b"IHDR":
+                return None
+            return struct.unpack(">II", data[16:24])
+        if mime_type == "image/jpeg":
+            return _read_jpeg_size(data)
+        if mime_type == "image/webp":
+            return _read_webp_size(data)
+        if mime_type == "image/gif":
+            return struct.unpack("<HH", data[6:10])
+    except struct.error:
+        return None
+    return None
+
+def _read_jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    # Walk the marker segments up to the start-of-frame, which holds the size
+    index = 2
+    while index + 4 <= len(data):
+        if data[index] != 0xFF:
+            return None
+        marker = data[index + 1]
+        if marker == 0xFF:  # fill byte
+            index += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # segments without a length
+            index += 2
+            continue
+        (length,) = struct.unpack(">H", data[index + 2:index + 4])
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[index + 5:index + 9])
+            return width, height
+        index += 2 + length
+    return None
+
+def _read_webp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", data[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return 1 + int.from_bytes(data[24:27], "little"), 1 + int.from_bytes(data[27:30], "little")
+    return None
+
+def validate_image_header(
+    data: bytes,
+    allowed_types: Optional[List[str]] = None,
+    max_pixels: int = settings.IMAGE_MAX_PIXELS,
+    min_edge: int = settings.IMAGE_MIN_EDGE,
+) -> Tuple[str, Tuple[int, int]]:
+    """
+    Reject empty, non-image, unsupported, malformed or oversized images from their header
+    
+    Costs microseconds: only the magic bytes and the header are read.
+    
+    Args:
+        data: Encoded image
+        allowed_types: Accepted MIME types (defaults to ALLOWED_IMAGE_TYPES)
+        max_pixels: Maximum width * height, guarding against decompression bombs
+        min_edge: Minimum width/height worth analyzing
+        
+    Returns:
+        Tuple of the sniffed MIME type and (width, height)
+    """
+    if not data:
+        raise ImageValidationError("empty_file", "The image file is empty", 400)
+    mime_type = sniff_image_type(bytes(data[:32]))
+    if mime_type is None:
+        raise ImageValidationError("not_an_image", "The file is not a recognized image", 415)
+    allowed = allowed_types if allowed_types is not None else settings.ALLOWED_IMAGE_TYPES
+    if mime_type not in allowed:
+        raise ImageValidationError(
+            "unsupported_format",
+            f"Image format {mime_type} is not supported. Supported formats: {', '.join(allowed)}",
+            415,
+        )
+    size = read_image_size(data, mime_type)
+    if size is None or 0 in size:
+        raise ImageValidationError("corrupt_image", "The image header could not be read", 422)
+    width, height = size
+    if width * height > max_pixels:
+        raise ImageValidationError(
+            "too_many_pixels", f"Image is {width}x{height}; at most {max_pixels} pixels are accepted", 413,
+        )
+    if min(width, height) < min_edge:
+        raise ImageValidationError(
+            "image_too_small", f"Image is {width}x{height}; both sides must be at least {min_edge} pixels", 422,
+        )
+    return mime_type, size
+
+_LAPLACIAN = None
+
+def check_image_content(
+    img: "PIL.Image.Image",
+    blank_stddev: float = settings.IMAGE_BLANK_STDDEV,
+    blur_threshold: float = settings.IMAGE_BLUR_THRESHOLD,
+    reject_blurry: bool = settings.IMAGE_BLUR_REJECT,
+) -> Optional[str]:
+    """
+    Reject blank images and flag badly blurred ones using a small grayscale copy
+    
+    A blank frame (lens cap, black screen) has almost no brightness
+    variation; a blurred one has almost no edge response (variance of
+    the Laplacian). Both are measured at 256 pixels on the long edge,
+    which takes a millisecond or two. A smooth dish on a plain plate can
+    score as low as a blurred photo, so blur is only a warning unless
+    reject_blurry is set.
+    
+    Args:
+        img: Decoded image
+        blank_stddev: Brightness standard deviation below which the image is blank
+        blur_threshold: Laplacian variance below which the image is blurry (0 disables)
+        reject_blurry: Raise for blurry images instead of returning a warning
+        
+    Returns:
+        "blurry_image" if the image looks blurred but was accepted, else None
+    """
+    global _LAPLACIAN
+    import PIL.Image
+    import PIL.ImageFilter
+    import PIL.ImageStat
+    
+    if _LAPLACIAN is None:
+        _LAPLACIAN = PIL.ImageFilter.Kernel((3, 3), [0, 1, 0, 1, -4, 1, 0, 1, 0], scale=1, offset=128)
+    
+    small = img.convert("L")
+    small.thumbnail((256, 256), PIL.Image.Resampling.BILINEAR, reducing_gap=2.0)
+    if PIL.ImageStat.Stat(small).stddev[0] < blank_stddev:
+        raise ImageValidationError("blank_image", "The image is blank or nearly uniform", 422)
+    if blur_threshold > 0:
+        width, height = small.size
+        # The kernel leaves the border untouched; crop it so it does not skew the variance
+        edges = small.filter(_LAPLACIAN).crop((1, 1, width - 1, height - 1))
+        if PIL.ImageStat.Stat(edges).var[0] < blur_threshold:
+            if reject_blurry:
+                raise ImageValidationError("blurry_image", "The image is too blurry to analyze", 422)
+            return "blurry_image"
+    return None
@@ -0,0 +1,78 @@
+"""
+Benchmark application cold start
+
+Imports app.main in fresh interpreters under `python -X importtime` and
+reports the median total import time, the slowest modules, and whether
+the heavy SDKs (google.generativeai, PIL) were kept out of the import.
+Exits non-zero when the median exceeds the budget, so it can gate CI.
+
+Usage:
+    python -m benchmarks.bench_import [--runs 5] [--budget-ms 800] [--top 10]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Cold-start budget for `import app.main`, in milliseconds. Measured at about
+# 500 ms on the development machine with the SDKs deferred (1.25 s before).
+DEFAULT_BUDGET_MS = 800
+
+LAZY_MODULES = ("google.generativeai", "PIL")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure_once():
+    """Import the app once; return (total us, {module: cumulative us}, leaked heavy modules)"""
+    env = dict(os.environ, GEMINI_API_KEY="")
+    check = f"import json, sys; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import app.main; {check}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    cumulative = {}
+    total = 0
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, module = match.groups()
+        cumulative[module] = int(cumulative_us)
+        if len(indent) == 1:  # top-level import
+            total += int(cumulative_us)
+    leaked = json.loads(completed.stdout.strip().splitlines()[-1])
+    return total, cumulative, leaked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.runs)]
+    totals = sorted(total for total, _, _ in runs)
+    median_ms = statistics.median(totals) / 1000
+    _, cumulative, leaked = runs[-1]
+
+    print(f"import app.main: median {median_ms:.0f} ms over {args.runs} runs "
+          f"(min {totals[0] / 1000:.0f} ms, max {totals[-1] / 1000:.0f} ms), budget {args.budget_ms:.0f} ms")
+    print("slowest modules (cumulative):")
+    for module, us in sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {module}")
+    if leaked:
+        print(f"eagerly imported: {', '.join(leaked)}")
+
+    if leaked or median_ms > args.budget_ms:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
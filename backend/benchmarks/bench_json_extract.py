@@ -0,0 +1,64 @@
+"""
+Benchmark JSON extraction from model output
+
+Runs the previous multi-scan parser and the single-pass extractor over the
+recorded model outputs in tests/data/model_outputs.json and reports
+throughput and how many outputs each could parse.
+
+Usage:
+    python -m benchmarks.bench_json_extract [--rounds 2000]
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from app.utils.json_extractor import JSON_BACKEND, extract_json
+
+CORPUS_PATH = Path(__file__).resolve().parent.parent / "tests" / "data" / "model_outputs.json"
+
+
+def legacy_parse(response_text: str):
+    """The parser this benchmark replaces, kept for comparison"""
+    if response_text.startswith('{') and response_text.endswith('}'):
+        return json.loads(response_text)
+    elif '```json' in response_text and '```' in response_text:
+        json_start = response_text.find('```json') + len('```json')
+        json_end = response_text.find('```', json_start)
+        return json.loads(response_text[json_start:json_end].strip())
+    return json.loads(response_text)
+
+
+def _run(parse, texts, rounds):
+    parsed = 0
+    for text in texts:
+        try:
+            parse(text)
+            parsed += 1
+        except ValueError:
+            pass
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            try:
+                parse(text)
+            except ValueError:
+                pass
+    elapsed = time.perf_counter() - start
+    return parsed, elapsed / (rounds * len(texts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    texts = [case["text"] for case in json.loads(CORPUS_PATH.read_text())]
+    print(f"corpus: {len(texts)} outputs, backend: {JSON_BACKEND}")
+    for name, parse in (("legacy", legacy_parse), ("single-pass", lambda t: extract_json(t, "{"))):
+        parsed, per_call = _run(parse, texts, args.rounds)
+        print(f"{name:12} parsed {parsed:>2}/{len(texts)}  {per_call * 1e6:6.2f} us/output")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark server-side image preprocessing
+
+Compares the payload the service used to send (the full-resolution image,
+encoded by the SDK) against the downscaled, re-encoded JPEG, and turns the
+size difference into an estimated upload time per request.
+
+Usage:
+    python -m benchmarks.bench_preprocess [--image PATH] [--uplink-mbps 20]
+"""
+import argparse
+import io
+import statistics
+import time
+
+import PIL.Image
+import PIL.ImageFilter
+
+from app.services.image_preprocessor import preprocess_image
+
+
+def _synthetic_photo(width: int = 4000, height: int = 3000) -> bytes:
+    """Build a phone-sized JPEG with enough texture to compress like a photo"""
+    noise = PIL.Image.effect_noise((width // 4, height // 4), 64).resize((width, height))
+    img = PIL.Image.merge("RGB", (noise, noise.rotate(90, expand=False), noise.transpose(PIL.Image.Transpose.FLIP_LEFT_RIGHT)))
+    img = img.filter(PIL.ImageFilter.GaussianBlur(2))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def _baseline(image_bytes: bytes) -> bytes:
+    """What the service did before: full decode, SDK re-encodes at full size"""
+    img = PIL.Image.open(io.BytesIO(image_bytes))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _time(fn, image_bytes: bytes, rounds: int):
+    samples = []
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn(image_bytes)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Image to benchmark (default: synthetic 4000x3000 JPEG)")
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="Assumed upload bandwidth to the model API")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            image_bytes = f.read()
+    else:
+        image_bytes = _synthetic_photo()
+
+    base_time, base_payload = _time(_baseline, image_bytes, args.rounds)
+    prep_time, (_, blob) = _time(preprocess_image, image_bytes, args.rounds)
+    prep_payload = blob["data"]
+
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+    base_total = base_time + len(base_payload) / bytes_per_second
+    prep_total = prep_time + len(prep_payload) / bytes_per_second
+
+    print(f"input:         {len(image_bytes):>10,} bytes")
+    print(f"full-res:      {len(base_payload):>10,} bytes  encode {base_time * 1000:7.1f} ms  est. total {base_total * 1000:7.1f} ms")
+    print(f"preprocessed:  {len(prep_payload):>10,} bytes  encode {prep_time * 1000:7.1f} ms  est. total {prep_total * 1000:7.1f} ms")
+    print(f"saved per request: {(base_total - prep_total) * 1000:.1f} ms at {args.uplink_mbps:g} Mbit/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Load test the API and report latency percentiles and throughput
+
+By default the app runs in-process on the local fake model backend
+(MODEL_BACKEND=fake), so no Gemini key or network access is needed. Point
+--base-url at a running server to test a real deployment instead.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 32 --requests 500
+    python -m benchmarks.load_test --endpoints analyze-upload --unique-images
+    python -m benchmarks.load_test --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+import PIL.Image
+
+API_PREFIX = "/api/v1/food"
+ENDPOINTS = ["analyze", "analyze-upload", "chart-data", "nutrition-chart"]
+
+
+def _make_images(count: int, size: int = 256) -> List[bytes]:
+    """Distinct noise images, so exact and near-duplicate caches miss"""
+    images = []
+    for _ in range(count):
+        img = PIL.Image.effect_noise((size, size), 96).convert("RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class EndpointLoad:
+    """Builds requests for one endpoint and records their outcomes"""
+
+    def __init__(self, name: str, images: List[bytes], image_dir: str):
+        self.name = name
+        self.images = images
+        self.image_paths = []
+        if name == "analyze":
+            for i, data in enumerate(images):
+                path = os.path.join(image_dir, f"bench-{i}.jpg")
+                with open(path, "wb") as f:
+                    f.write(data)
+                self.image_paths.append(path)
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+
+    async def send(self, client: httpx.AsyncClient, i: int) -> None:
+        start = time.perf_counter()
+        try:
+            if self.name == "analyze":
+                path = self.image_paths[i % len(self.image_paths)]
+                response = await client.post(f"{API_PREFIX}/analyze", json={"image_path": path})
+            elif self.name == "analyze-upload":
+                data = self.images[i % len(self.images)]
+                files = {"file": ("plate.jpg", data, "image/jpeg")}
+                response = await client.post(f"{API_PREFIX}/analyze-upload", files=files)
+            else:
+                response = await client.get(f"{API_PREFIX}/{self.name}")
+            self.statuses[response.status_code] += 1
+        except httpx.HTTPError as e:
+            self.statuses[type(e).__name__] += 1
+        self.latencies.append(time.perf_counter() - start)
+
+    def report(self, elapsed: float) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": len(latencies),
+            "rps": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": _percentile(latencies, 0.50) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+            "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        }
+
+
+async def run_endpoint(client: httpx.AsyncClient, load: EndpointLoad, requests: int, concurrency: int) -> float:
+    """Send `requests` requests with at most `concurrency` in flight; return elapsed seconds"""
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            await load.send(client, i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main_async(args) -> None:
+    if args.base_url:
+        transport = None
+        base_url = args.base_url
+    else:
+        from app.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://benchmark"
+
+    print(f"target: {base_url}  concurrency: {args.concurrency}  requests/endpoint: {args.requests}")
+    print(f"{'endpoint':16} {'req':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+
+    with tempfile.TemporaryDirectory() as image_dir:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            for name in args.endpoints:
+                # Fresh images per endpoint, so one endpoint does not warm the cache for the next
+                images = _make_images(args.requests if args.unique_images else 1)
+                load = EndpointLoad(name, images, image_dir)
+                elapsed = await run_endpoint(client, load, args.requests, args.concurrency)
+                r = load.report(elapsed)
+                statuses = ", ".join(f"{k}:{v}" for k, v in sorted(load.statuses.items(), key=str))
+                print(
+                    f"{name:16} {r['requests']:>6} {r['rps']:>9.1f} {r['p50_ms']:>9.1f} "
+                    f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}  {statuses}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Server to test (default: in-process app on the fake backend)")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--unique-images", action="store_true", help="Send a distinct image per request to bypass caches")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    if not args.base_url:
+        os.environ.setdefault("MODEL_BACKEND", "fake")
+        # Measure the app, not the model API quota
+        os.environ.setdefault("UPSTREAM_REQUESTS_PER_MINUTE", "0")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Production server configuration
+
+Run with:
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Each worker is a separate process running uvicorn's event loop. The app
+is not preloaded, so every worker builds its own services in the app
+lifespan after forking; set SHARED_STATE_URL so the workers share the
+analysis cache, the model API rate limit and in-flight analyses. More
+than one worker requires a redis:// JOB_QUEUE_URL.
+"""
+import logging
+import multiprocessing
+import os
+
+logger = logging.getLogger("gunicorn.error")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Jobs in the in-memory queue live on the worker that accepted them, so polling
+# another worker would 404; one worker per core needs a redis:// JOB_QUEUE_URL
+memory_queue = os.getenv("JOB_QUEUE_URL", "memory://").startswith("memory://")
+workers = int(os.getenv("WEB_CONCURRENCY", 1 if memory_queue else multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Analyses wait on the model API for seconds; give them time to finish on restart
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "60"))
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth from image decoding
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+preload_app = False
+
+# The settings and the rate limiter split read the worker count from here
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+
+def on_starting(server):
+    if workers > 1 and not os.getenv("SHARED_STATE_URL"):
+        logger.warning(
+            "Running %d workers without SHARED_STATE_URL: caches and in-flight analyses "
+            "are per worker and the model API quota is split evenly between them",
+            workers,
+        )
+    if workers > 1 and memory_queue:
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={workers} needs a shared job queue: with the in-memory queue a job "
+            "can only be polled on the worker that accepted it; set JOB_QUEUE_URL to a redis:// URL"
+        )
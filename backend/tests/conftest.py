@@ -0,0 +1,112 @@
+import asyncio
+import os
+import random
+import pytest
+
+# The app's own services run on the local fake model, so no Gemini key is needed
+os.environ.setdefault("MODEL_BACKEND", "fake")
+
+import PIL.Image
+from app.services import food_analysis_service
+from app.services.analysis_cache import AnalysisCache
+from app.services.model_pool import ModelPool
+
+FAKE_RESPONSE_TEXT = '{"calories": "740", "protein": "20g", "carbohydrates": "30g", "fat": "15g"}'
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.candidates = [type("Candidate", (), {"content": True})()]
+        self.usage_metadata = usage_metadata or FakeUsageMetadata(300, len(text) // 4)
+
+
+class FakeStreamResponse:
+    def __init__(self, text, chunk_size=16):
+        self._chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(0)
+            yield FakeResponse(chunk)
+
+
+class FakeModel:
+    """Stand-in for genai.GenerativeModel that counts calls"""
+    calls = 0
+    in_flight = 0
+    max_in_flight = 0
+    delay = 0.0
+    last_kwargs = None
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    @classmethod
+    def reset(cls):
+        cls.calls = 0
+        cls.in_flight = 0
+        cls.max_in_flight = 0
+        cls.delay = 0.0
+        cls.last_kwargs = None
+
+    @staticmethod
+    def _respond(content):
+        labels = [part for part in content if isinstance(part, str) and part.startswith("Image ")]
+        if not labels:
+            return FakeResponse(FAKE_RESPONSE_TEXT)
+        items = ", ".join(f'{{"index": {i}, {FAKE_RESPONSE_TEXT[1:-1]}}}' for i in range(len(labels)))
+        return FakeResponse(f"```json\n[{items}]\n```")
+
+    def generate_content(self, content, **kwargs):
+        FakeModel.calls += 1
+        FakeModel.last_kwargs = kwargs
+        return self._respond(content)
+
+    async def generate_content_async(self, content, stream=False, **kwargs):
+        FakeModel.calls += 1
+        FakeModel.last_kwargs = kwargs
+        FakeModel.in_flight += 1
+        FakeModel.max_in_flight = max(FakeModel.max_in_flight, FakeModel.in_flight)
+        try:
+            await asyncio.sleep(FakeModel.delay)
+        finally:
+            FakeModel.in_flight -= 1
+        response = self._respond(content)
+        if stream:
+            return FakeStreamResponse(response.text)
+        return response
+
+
+def make_plate_image(seed=0, size=64):
+    """A textured test image that passes the blank/blur checks; distinct per seed"""
+    pixels = random.Random(seed).randbytes(size * size * 3)
+    return PIL.Image.frombytes("RGB", (size, size), pixels)
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = tmp_path / "plate.png"
+    make_plate_image().save(path)
+    return str(path)
+
+
+@pytest.fixture
+def fake_models():
+    FakeModel.reset()
+    return ModelPool("test-key", default_model="fake-model", allowed_models=["fake-model-pro"], model_factory=FakeModel)
+
+
+@pytest.fixture
+def service(monkeypatch, fake_models):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    return food_analysis_service.FoodAnalysisService(cache=AnalysisCache(max_entries=8), models=fake_models)
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from app.models.food import FoodAnalysis
+from app.services.analysis_cache import AnalysisCache, make_cache_key
+from .conftest import FakeModel
+
+
+class RecordingStore:
+    """Persistent tier that records which thread each call ran on"""
+
+    def __init__(self):
+        self.data = {}
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.threads.append(threading.get_ident())
+        self.data[key] = value
+
+
+def test_cache_key_depends_on_prompt_and_model():
+    """Test that the key changes with image, prompt and model"""
+    base = make_cache_key(b"image", "prompt", "model")
+    assert base == make_cache_key(b"image", "prompt", "model")
+    assert base != make_cache_key(b"other", "prompt", "model")
+    assert base != make_cache_key(b"image", "other", "model")
+    assert base != make_cache_key(b"image", "prompt", "other")
+
+
+def test_lru_eviction_and_counters():
+    """Test size-bounded eviction and hit/miss counting"""
+    cache = AnalysisCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", {"calories": "1"})
+    cache.set("b", {"calories": "2"})
+    assert cache.get("a") == {"calories": "1"}
+    cache.set("c", {"calories": "3"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["entries"] == 2
+
+
+def test_ttl_expiry():
+    """Test that expired entries are treated as misses"""
+    cache = AnalysisCache(max_entries=2, ttl_seconds=0)
+    cache.set("a", {"calories": "1"})
+    assert cache.get("a") is None
+
+
+def test_repeat_analysis_served_from_cache(service, image_path):
+    """Test that a repeated image does not reach the model"""
+    first = service.analyze_food_image(image_path)
+    second = service.analyze_food_image(image_path)
+    assert isinstance(first, FoodAnalysis)
+    assert second == first
+    assert FakeModel.calls == 1
+    assert service.cache.stats()["hits"] == 1
+
+
+def test_async_analysis_keeps_persistent_tier_off_the_event_loop(service, image_path):
+    """Test that coroutine paths read and write the persistent tier on worker threads"""
+    store = RecordingStore()
+    service.cache = AnalysisCache(max_entries=8, stores=[store])
+
+    async def run():
+        return threading.get_ident(), await service.analyze_food_image_async(image_path)
+
+    loop_thread, result = asyncio.run(run())
+
+    assert isinstance(result, FoodAnalysis)
+    assert len(store.data) == 1
+    assert store.threads
+    assert loop_thread not in store.threads
+
+
+def test_slower_tier_hit_is_copied_into_faster_tiers():
+    """Test that a miss in the first store falls through to the next and backfills it"""
+    shared, persistent = RecordingStore(), RecordingStore()
+    persistent.data["a"] = {"calories": "1"}
+    cache = AnalysisCache(max_entries=2, stores=[shared, persistent])
+
+    assert asyncio.run(cache.get_async("a")) == {"calories": "1"}
+    assert shared.data["a"] == {"calories": "1"}
+    cache.set("b", {"calories": "2"})
+    assert shared.data["b"] == persistent.data["b"] == {"calories": "2"}
+    assert cache.stats()["store_hits"] == 1
+
+
+def test_shared_state_does_not_replace_the_persistent_tier(monkeypatch):
+    """Test that Redis and MongoDB tiers are both configured when both are enabled"""
+    from app.services import analysis_cache, shared_state
+
+    monkeypatch.setattr(shared_state, "get_redis_client", lambda: object())
+    monkeypatch.setattr(shared_state, "get_blocking_redis_client", lambda: object())
+    monkeypatch.setattr(analysis_cache.settings, "ANALYSIS_CACHE_PERSISTENT", True)
+
+    cache = AnalysisCache.from_settings()
+
+    assert [type(store) for store in cache.stores] == [shared_state.RedisCacheStore, analysis_cache.MongoCacheStore]
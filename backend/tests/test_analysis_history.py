@@ -0,0 +1,143 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.models.food import FoodAnalysis
+from app.services.analysis_history import MONTH_NAMES, AnalysisHistoryRepository
+from app.services.chart_data_service import ChartDataService
+from app.services.nutrition_rollups import NutritionRollupRepository, month_bucket
+
+
+@pytest.fixture
+def run_with_collection():
+    """Run a scenario against a real mongod when MONGODB_TEST_URL is set, mongomock otherwise"""
+    url = os.getenv("MONGODB_TEST_URL")
+    if not url:
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    def run(scenario):
+        async def wrapper():
+            if url:
+                from motor.motor_asyncio import AsyncIOMotorClient
+                client = AsyncIOMotorClient(url)
+            else:
+                client = mongomock_motor.AsyncMongoMockClient()
+            collection = client["prompted_plate_test"]["analyses"]
+            await collection.drop()
+            try:
+                return await scenario(collection)
+            finally:
+                await collection.drop()
+        return asyncio.run(wrapper())
+
+    return run
+
+
+async def _seed(repository):
+    now = datetime.now(timezone.utc)
+    meals = [
+        ("alice", now, FoodAnalysis(calories="700", protein="40g", carbohydrates="60g", fat="20g")),
+        ("alice", now, FoodAnalysis(calories="300", protein="10g", carbohydrates="40g", fat="10g")),
+        ("alice", now - timedelta(days=40), FoodAnalysis(calories="500")),
+        ("bob", now, FoodAnalysis(calories="900", protein="50g", carbohydrates="50g", fat="50g")),
+    ]
+    for user_id, timestamp, analysis in meals:
+        await repository.record(user_id, analysis, "fake-model", timestamp)
+
+
+def test_monthly_calories_per_user(run_with_collection):
+    """Test that calories are grouped by month and scoped to the user"""
+    async def scenario(collection):
+        repository = AnalysisHistoryRepository(collection)
+        await repository.ensure_indexes()
+        await _seed(repository)
+        return await repository.monthly_calories("alice", months=3)
+
+    rows = run_with_collection(scenario)
+    assert [row["value"] for row in rows] == [500, 1000]
+    assert rows[-1]["month"] == datetime.now(timezone.utc).month
+
+
+def test_monthly_chart_labels_years_and_fills_gaps(run_with_collection, monkeypatch):
+    """Test that every month in the window is returned, labelled with its year"""
+    from app.services import chart_data_service
+
+    monkeypatch.setattr(chart_data_service.settings, "CHART_MONTHS", 4)
+    this_month = month_bucket(datetime.now(timezone.utc))
+    three_back = month_bucket(this_month, 3)
+
+    async def scenario(collection):
+        repository = AnalysisHistoryRepository(collection)
+        await repository.record("alice", FoodAnalysis(calories="400"), timestamp=this_month.replace(tzinfo=timezone.utc))
+        await repository.record("alice", FoodAnalysis(calories="600"), timestamp=three_back.replace(tzinfo=timezone.utc))
+        return await ChartDataService(repository).get_monthly_chart_data("alice")
+
+    chart = run_with_collection(scenario)
+    assert [item.value for item in chart] == [600, 0, 0, 400]
+    assert chart[0].label == f"{MONTH_NAMES[three_back.month - 1]} {three_back.year}"
+    assert chart[-1].label == f"{MONTH_NAMES[this_month.month - 1]} {this_month.year}"
+
+
+def test_macro_chart_from_history(run_with_collection):
+    """Test the macro split served from the aggregation"""
+    async def scenario(collection):
+        repository = AnalysisHistoryRepository(collection)
+        await _seed(repository)
+        return await ChartDataService(repository).get_macro_chart_data("alice")
+
+    chart = run_with_collection(scenario)
+    values = {item.label: item.value for item in chart}
+    # 50g protein, 100g carbs, 30g fat -> 200 / 400 / 270 kcal
+    assert values == {"Protein": 23, "Carbs": 46, "Fat": 31}
+
+
+def test_empty_history():
+    """Test that users without analyses get zeroed charts"""
+    assert [item.value for item in ChartDataService.macro_split(0, 0, 0)] == [0, 0, 0]
+
+
+def test_rollups_match_rebuild_and_feed_charts(run_with_collection):
+    """Test that incremental rollups equal a rebuild and answer the charts"""
+    async def scenario(collection):
+        rollups = NutritionRollupRepository(collection.database["rollups_test"])
+        await rollups.collection.drop()
+        repository = AnalysisHistoryRepository(collection, rollups)
+        await _seed(repository)
+        incremental = await rollups.collection.find({}).sort("_id", 1).to_list(length=None)
+        written = await rollups.rebuild(collection)
+        rebuilt = await rollups.collection.find({}).sort("_id", 1).to_list(length=None)
+        service = ChartDataService(repository)
+        monthly = await service.get_monthly_chart_data("alice")
+        macros = await service.get_macro_chart_data("alice")
+        await rollups.collection.drop()
+        return incremental, written, rebuilt, monthly, macros
+
+    incremental, written, rebuilt, monthly, macros = run_with_collection(scenario)
+    assert incremental == rebuilt
+    assert written == len(rebuilt)
+    assert [item.value for item in monthly if item.value] == [500, 1000]
+    assert {item.label: item.value for item in macros} == {"Protein": 23, "Carbs": 46, "Fat": 31}
+
+
+def test_rebuild_replaces_rollups_in_place(run_with_collection):
+    """Test that rebuilds repair drift without dropping other users or leaving scratch data"""
+    async def scenario(collection):
+        rollups = NutritionRollupRepository(collection.database["rollups_test"])
+        await rollups.collection.drop()
+        repository = AnalysisHistoryRepository(collection, rollups)
+        await _seed(repository)
+        expected = await rollups.collection.find({}).sort("_id", 1).to_list(length=None)
+        await rollups.collection.update_many({"user_id": "alice"}, {"$inc": {"calories": 1}})
+        await rollups.collection.insert_one({"_id": "alice:day:2000-01-01", "user_id": "alice"})
+        await rollups.rebuild(collection, user_id="alice")
+        per_user = await rollups.collection.find({}).sort("_id", 1).to_list(length=None)
+        await rollups.rebuild(collection)
+        full = await rollups.collection.find({}).sort("_id", 1).to_list(length=None)
+        names = await collection.database.list_collection_names()
+        await rollups.collection.drop()
+        return expected, per_user, full, names
+
+    expected, per_user, full, names = run_with_collection(scenario)
+    assert per_user == expected
+    assert full == expected
+    assert "rollups_test_rebuild" not in names
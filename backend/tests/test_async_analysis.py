@@ -0,0 +1,51 @@
+import asyncio
+from app.models.food import FoodAnalysis
+from .conftest import FakeModel, make_plate_image
+
+
+def test_async_analysis_returns_result(service, image_path):
+    """Test the non-blocking analysis path"""
+    result = asyncio.run(service.analyze_food_image_async(image_path))
+    assert isinstance(result, FoodAnalysis)
+    assert result.calories == "740"
+
+
+def test_async_analysis_missing_file(service):
+    """Test that a missing file is reported as an error string"""
+    result = asyncio.run(service.analyze_food_image_async("/nonexistent/image.jpg"))
+    assert isinstance(result, str)
+
+
+def test_async_analyses_overlap_up_to_limit(service, tmp_path):
+    """Test that analyses run concurrently but respect the concurrency cap"""
+    service.perceptual_index = None
+    service._semaphore = asyncio.Semaphore(3)
+    FakeModel.delay = 0.05
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"plate{i}.png"
+        make_plate_image(i).save(path)
+        paths.append(str(path))
+
+    async def run_all():
+        return await asyncio.gather(*(service.analyze_food_image_async(p) for p in paths))
+
+    results = asyncio.run(run_all())
+    assert all(isinstance(r, FoodAnalysis) for r in results)
+    assert FakeModel.max_in_flight == 3
+
+
+def test_identical_concurrent_requests_are_coalesced(service, image_path):
+    """Test that a burst of identical requests makes one model call"""
+    FakeModel.delay = 0.05
+
+    async def run_all():
+        return await asyncio.gather(*(service.analyze_food_image_async(image_path) for _ in range(5)))
+
+    results = asyncio.run(run_all())
+    assert all(r == results[0] for r in results)
+    assert FakeModel.calls == 1
+    stats = service.cache_stats()["single_flight"]
+    assert stats["leaders"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["in_flight"] == 0
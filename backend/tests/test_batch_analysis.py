@@ -0,0 +1,66 @@
+import asyncio
+from app.config.settings import settings
+from app.models.food import FoodAnalysis
+from .conftest import FakeModel, make_plate_image
+
+
+def _image_paths(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"plate{i}.png"
+        make_plate_image(i).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_batch_groups_images_into_fewer_calls(service, tmp_path, monkeypatch):
+    """Test that N images cost ceil(N / group size) model calls"""
+    monkeypatch.setattr(settings, "ANALYSIS_BATCH_GROUP_SIZE", 4)
+    service.perceptual_index = None
+    results = asyncio.run(service.analyze_batch(_image_paths(tmp_path, 10)))
+    assert len(results) == 10
+    assert all(isinstance(r, FoodAnalysis) for r in results)
+    assert FakeModel.calls == 3
+
+
+def test_batch_reports_per_item_errors(service, tmp_path):
+    """Test that a bad path fails alone while the rest succeed"""
+    paths = _image_paths(tmp_path, 2)
+    paths.insert(1, "/nonexistent/image.jpg")
+    results = asyncio.run(service.analyze_batch(paths))
+    assert isinstance(results[0], FoodAnalysis)
+    assert isinstance(results[1], str)
+    assert isinstance(results[2], FoodAnalysis)
+
+
+def test_batch_uses_cache(service, tmp_path):
+    """Test that cached images skip the model"""
+    service.perceptual_index = None
+    paths = _image_paths(tmp_path, 2)
+    asyncio.run(service.analyze_batch(paths))
+    FakeModel.calls = 0
+    results = asyncio.run(service.analyze_batch(paths))
+    assert all(isinstance(r, FoodAnalysis) for r in results)
+    assert FakeModel.calls == 0
+
+
+def test_batch_sends_custom_prompt_per_image(service, tmp_path, monkeypatch):
+    """Test that a custom prompt reaches the model and keys the cache it is stored under"""
+    service.perceptual_index = None
+    paths = _image_paths(tmp_path, 3)
+    sent = []
+    original = FakeModel._respond
+
+    def record(content):
+        sent.append(content[-1])
+        return original(content)
+
+    monkeypatch.setattr(FakeModel, "_respond", staticmethod(record))
+    results = asyncio.run(service.analyze_batch(paths, prompt="Custom prompt"))
+
+    assert all(isinstance(r, FoodAnalysis) for r in results)
+    assert sent == ["Custom prompt"] * 3
+
+    FakeModel.calls = 0
+    service.analyze_food_image(paths[0], prompt="Custom prompt")
+    assert FakeModel.calls == 0
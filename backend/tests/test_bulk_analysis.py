@@ -0,0 +1,128 @@
+import asyncio
+import io
+import json
+import pytest
+import api_call
+from api_call import BulkProgress, bulk_analyze, iter_image_paths, load_processed_hashes
+from app.models.food import FoodAnalysis
+from app.services.upstream_client import UpstreamUnavailableError
+
+
+def _make_images(directory, count):
+    paths = []
+    for i in range(count):
+        path = directory / f"plate_{i}.jpg"
+        path.write_bytes(f"image-{i}".encode())
+        paths.append(str(path))
+    return paths
+
+
+def _counting_analyzer(calls, fail_on=None):
+    async def analyze(image_bytes):
+        calls.append(image_bytes)
+        await asyncio.sleep(0)
+        if image_bytes == fail_on:
+            return "API response did not contain any content."
+        return FoodAnalysis(calories="100", protein="1g", carbohydrates="2g", fat="3g")
+    return analyze
+
+
+def _run(paths, output, analyze, concurrency=4):
+    progress = BulkProgress(len(paths), stream=io.StringIO())
+    return asyncio.run(bulk_analyze(paths, str(output), analyze, concurrency, progress))
+
+
+def test_iter_image_paths_walks_directory_and_reads_manifest(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "one.JPG").write_bytes(b"1")
+    (tmp_path / "two.png").write_bytes(b"2")
+    (tmp_path / "notes.txt").write_text("not an image")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text('a/one.JPG\n# comment\n\n{"path": "two.png"}\n')
+
+    assert [p.replace(str(tmp_path), "") for p in iter_image_paths(str(tmp_path))] == ["/two.png", "/a/one.JPG"]
+    assert list(iter_image_paths(str(manifest))) == [str(tmp_path / "a/one.JPG"), str(tmp_path / "two.png")]
+
+
+def test_bulk_writes_one_record_per_image(tmp_path):
+    paths = _make_images(tmp_path, 5)
+    output = tmp_path / "results.jsonl"
+    calls = []
+
+    progress = _run(paths, output, _counting_analyzer(calls, fail_on=b"image-3"))
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(r["path"] for r in records) == sorted(paths)
+    assert progress.ok == 4 and progress.failed == 1
+    assert {r["status"] for r in records if r["path"].endswith("plate_3.jpg")} == {"error"}
+    assert all(r["analysis"]["calories_kcal"] == 100 for r in records if r["status"] == "ok")
+
+
+def test_bulk_resumes_and_retries_failures(tmp_path):
+    paths = _make_images(tmp_path, 5)
+    output = tmp_path / "results.jsonl"
+    _run(paths, output, _counting_analyzer([], fail_on=b"image-3"))
+    # A crash mid-write leaves a truncated last line behind
+    with open(output, "a") as results:
+        results.write('{"path": "x", "sha2')
+
+    calls = []
+    progress = _run(paths, output, _counting_analyzer(calls))
+
+    assert calls == [b"image-3"]
+    assert progress.skipped == 4 and progress.ok == 1
+    assert len(load_processed_hashes(str(output))) == 5
+
+
+def test_bulk_analyzes_duplicate_content_once(tmp_path):
+    paths = _make_images(tmp_path, 2)
+    copy = tmp_path / "copy.jpg"
+    copy.write_bytes(b"image-0")
+    calls = []
+
+    progress = _run(paths + [str(copy)], tmp_path / "results.jsonl", _counting_analyzer(calls), concurrency=1)
+
+    assert len(calls) == 2
+    assert progress.skipped == 1
+
+
+def test_bulk_waits_out_unavailable_upstream(tmp_path, monkeypatch):
+    paths = _make_images(tmp_path, 1)
+    attempts = []
+    monkeypatch.setattr(api_call.asyncio, "sleep", _no_sleep)
+
+    async def analyze(image_bytes):
+        attempts.append(image_bytes)
+        if len(attempts) == 1:
+            raise UpstreamUnavailableError("circuit open", retry_after=5)
+        return FoodAnalysis(calories="100")
+
+    progress = _run(paths, tmp_path / "results.jsonl", analyze)
+
+    assert len(attempts) == 2
+    assert progress.ok == 1
+
+
+def test_bulk_service_skips_near_duplicate_matching_unless_asked(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+
+    assert api_call.build_bulk_service(rpm=0).perceptual_index is None
+    assert api_call.build_bulk_service(rpm=0, near_duplicates=True).perceptual_index is not None
+
+
+async def _no_sleep(seconds):
+    return None
+
+
+def test_progress_reports_rate_and_eta():
+    stream = io.StringIO()
+    progress = BulkProgress(10, stream=stream)
+    progress.ok = 4
+    progress.skipped = 2
+    progress._started -= 2
+
+    progress.report(force=True)
+
+    assert progress.rate() == pytest.approx(2.0, rel=0.01)
+    assert progress.eta_seconds() == pytest.approx(2.0, rel=0.01)
+    assert "6/10" in stream.getvalue() and "ETA 00:00:02" in stream.getvalue()
@@ -1,7 +1,12 @@
+import io
+import time
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.config.settings import settings
 from app.models.food import FoodAnalysis
+from app.routes import food
+from .conftest import make_plate_image
 
 client = TestClient(app)
 
@@ -57,4 +62,116 @@ def test_analyze_food_image_invalid_path():
     """Test food analysis with invalid image path"""
     request_data = {"image_path": "/nonexistent/image.jpg"}
     response = client.post("/api/v1/food/analyze", json=request_data)
-    assert response.status_code == 400 
\ No newline at end of file
+    assert response.status_code == 400
+
+def _png_bytes():
+    buffer = io.BytesIO()
+    make_plate_image(1).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_analyze_upload_in_memory(monkeypatch, fake_models):
+    """Test upload analysis without touching the filesystem"""
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    monkeypatch.setattr("tempfile.NamedTemporaryFile", None)
+    files = {"file": ("plate.png", _png_bytes(), "image/png")}
+    response = client.post("/api/v1/food/analyze-upload", files=files)
+    assert response.status_code == 200
+    assert response.json()["calories"] == "740"
+
+def test_analyze_upload_too_large(monkeypatch):
+    """Test that an upload larger than the limit is rejected"""
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 16)
+    files = {"file": ("plate.png", _png_bytes(), "image/png")}
+    response = client.post("/api/v1/food/analyze-upload", files=files)
+    assert response.status_code == 413
+
+def test_analyze_upload_rejected_on_content_length(monkeypatch):
+    """Test that an oversized body is rejected from its Content-Length before the form is parsed"""
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 16)
+    parsed = []
+    monkeypatch.setattr("starlette.requests.Request.form", lambda *args, **kwargs: parsed.append(True))
+    files = {"file": ("plate.png", b"\0" * (256 * 1024), "image/png")}
+    response = client.post("/api/v1/food/analyze-upload", files=files)
+    assert response.status_code == 413
+    assert not parsed
+
+def test_analyze_upload_rejected_without_content_length(monkeypatch):
+    """Test that a chunked upload is cut off while the body is received, before the route runs"""
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 16)
+    reached = []
+    monkeypatch.setattr(food, "_read_upload", lambda *args: reached.append(True))
+    boundary = "limit-test"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"plate.png\"\r\n"
+            "Content-Type: image/png\r\n\r\n").encode()
+
+    def body():
+        yield head
+        for _ in range(8):
+            yield b"\0" * (64 * 1024)
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(
+        "/api/v1/food/analyze-upload",
+        content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    assert response.status_code == 413
+    assert not reached
+
+def test_analyze_batch_empty():
+    """Test batch analysis with no images"""
+    response = client.post("/api/v1/food/analyze-batch", json={"image_paths": []})
+    assert response.status_code == 400
+
+def test_analyze_batch_invalid_path():
+    """Test that batch analysis reports errors per image"""
+    response = client.post("/api/v1/food/analyze-batch", json={"image_paths": ["/nonexistent/image.jpg"]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["results"][0]["index"] == 0
+    assert data["results"][0]["error"]
+
+def test_analyze_stream_emits_chunks_then_result(monkeypatch, fake_models):
+    """Test that the SSE endpoint streams partial output and ends with the analysis"""
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    files = {"file": ("plate.png", _png_bytes(), "image/png")}
+    response = client.post("/api/v1/food/analyze-stream", files=files, params={"prompt": "stream test"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in response.text.split("\n\n") if block]
+    assert events[0].startswith("event: chunk")
+    assert events[-1].startswith("event: result")
+    assert '"calories": "740"' in events[-1]
+
+def test_chart_data_etag():
+    """Test that chart responses carry an ETag and answer 304 when unchanged"""
+    response = client.get("/api/v1/food/chart-data")
+    etag = response.headers["etag"]
+    assert "max-age" in response.headers["cache-control"]
+    cached = client.get("/api/v1/food/chart-data", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+
+def test_analysis_job_lifecycle(monkeypatch, fake_models):
+    """Test submitting a background analysis and polling for its result"""
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    with TestClient(app) as lifespan_client:
+        files = {"file": ("plate.png", _png_bytes(), "image/png")}
+        response = lifespan_client.post("/api/v1/food/analyze-jobs", files=files, params={"priority": 1})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        for _ in range(100):
+            job = lifespan_client.get(f"/api/v1/food/jobs/{job_id}").json()
+            if job["status"] == "succeeded":
+                break
+            time.sleep(0.01)
+        assert job["status"] == "succeeded"
+        assert job["analysis"]["calories"] == "740"
+    assert client.get("/api/v1/food/jobs/unknown").status_code == 404
+
+def test_analysis_job_rejects_internal_callback_url():
+    """Test that callbacks to internal addresses are refused at submission"""
+    files = {"file": ("plate.png", _png_bytes(), "image/png")}
+    params = {"callback_url": "https://169.254.169.254/latest/meta-data"}
+    response = client.post("/api/v1/food/analyze-jobs", files=files, params=params)
+    assert response.status_code == 400
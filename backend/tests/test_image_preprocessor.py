@@ -0,0 +1,35 @@
+import io
+import PIL.Image
+from app.services.image_preprocessor import preprocess_image
+
+
+def _jpeg_bytes(size, orientation=None):
+    img = PIL.Image.new("RGB", size, "tan")
+    exif = PIL.Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def test_downscales_to_max_edge():
+    """Test that large photos are shrunk to the configured edge"""
+    img, blob = preprocess_image(_jpeg_bytes((4000, 3000)), max_edge=512)
+    assert max(img.size) == 512
+    assert blob["mime_type"] == "image/jpeg"
+    assert max(PIL.Image.open(io.BytesIO(blob["data"])).size) == 512
+
+
+def test_applies_orientation_and_strips_exif():
+    """Test that rotated photos come out upright without metadata"""
+    img, blob = preprocess_image(_jpeg_bytes((400, 200), orientation=6), max_edge=1024)
+    assert img.size == (200, 400)
+    encoded = PIL.Image.open(io.BytesIO(blob["data"]))
+    assert 0x0112 not in encoded.getexif()
+
+
+def test_small_images_keep_their_size():
+    """Test that images under the limit are not upscaled"""
+    img, _ = preprocess_image(_jpeg_bytes((300, 200)), max_edge=1024)
+    assert img.size == (300, 200)
@@ -0,0 +1,275 @@
+import asyncio
+import socket
+from datetime import datetime, timezone
+import httpx
+import pytest
+from app.config.settings import settings
+from app.models.food import AnalysisJob, FoodAnalysis
+from app.services import job_queue
+from app.services.job_queue import (
+    FAILED,
+    SUCCEEDED,
+    CallbackURLError,
+    InMemoryQueueBackend,
+    JobQueue,
+    QueueFullError,
+    RedisQueueBackend,
+    validate_callback_url,
+)
+
+
+async def _wait_for(queue, job_id, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await queue.get(job_id)
+        if job.status in (SUCCEEDED, FAILED) or asyncio.get_running_loop().time() > deadline:
+            return job
+        await asyncio.sleep(0.01)
+
+
+def test_jobs_complete_and_can_be_polled():
+    """Test submit -> poll -> result, with per-job failures"""
+    async def analyze(job: AnalysisJob, image_bytes: bytes):
+        if image_bytes == b"bad":
+            return "Error: not an image"
+        return FoodAnalysis(calories="100")
+
+    async def scenario():
+        queue = JobQueue(analyze, InMemoryQueueBackend(), workers=2, ttl_seconds=60)
+        queue.start()
+        good = await queue.submit(b"plate")
+        bad = await queue.submit(b"bad")
+        assert good.status == "queued"
+        results = await _wait_for(queue, good.job_id), await _wait_for(queue, bad.job_id)
+        await queue.stop()
+        return results
+
+    good, bad = asyncio.run(scenario())
+    assert good.status == SUCCEEDED
+    assert good.analysis.calories == "100"
+    assert good.finished_at is not None
+    assert bad.status == FAILED
+    assert bad.error == "Error: not an image"
+
+
+def test_priority_order_with_one_worker():
+    """Test that lower priority values run first"""
+    order = []
+
+    async def analyze(job: AnalysisJob, image_bytes: bytes):
+        order.append(image_bytes)
+        return FoodAnalysis()
+
+    async def scenario():
+        queue = JobQueue(analyze, InMemoryQueueBackend(), workers=1, ttl_seconds=60)
+        jobs = [
+            await queue.submit(b"low", priority=5),
+            await queue.submit(b"high", priority=0),
+            await queue.submit(b"mid", priority=1),
+        ]
+        queue.start()
+        for job in jobs:
+            await _wait_for(queue, job.job_id)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert order == [b"high", b"mid", b"low"]
+
+
+class FlakyPopBackend(InMemoryQueueBackend):
+    """In-memory backend whose first pop fails like a dropped Redis connection"""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    async def pop(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        return await super().pop()
+
+
+def test_worker_survives_backend_errors(monkeypatch):
+    """Test that a backend error pauses a worker instead of ending it"""
+    monkeypatch.setattr(job_queue, "WORKER_ERROR_BACKOFF_SECONDS", 0.01)
+
+    async def analyze(job: AnalysisJob, image_bytes: bytes):
+        return FoodAnalysis(calories="100")
+
+    async def scenario():
+        backend = FlakyPopBackend()
+        queue = JobQueue(analyze, backend, workers=1, ttl_seconds=60)
+        queue.start()
+        await asyncio.sleep(0.05)
+        job = await queue.submit(b"plate")
+        result = await _wait_for(queue, job.job_id)
+        await queue.stop()
+        return backend, result
+
+    backend, result = asyncio.run(scenario())
+    assert backend.failures == 0
+    assert result.status == SUCCEEDED
+
+
+def test_expired_jobs_are_forgotten():
+    """Test that finished jobs expire after their TTL"""
+    async def scenario():
+        queue = JobQueue(None, InMemoryQueueBackend(), workers=1, ttl_seconds=0)
+        job = await queue.submit(b"plate")
+        await asyncio.sleep(0.01)
+        return await queue.get(job.job_id)
+
+    assert asyncio.run(scenario()) is None
+
+
+@pytest.mark.parametrize("url", [
+    "http://93.184.215.14/hook",
+    "https://127.0.0.1/hook",
+    "https://localhost:8000/hook",
+    "https://10.0.0.5/hook",
+    "https://169.254.169.254/latest/meta-data",
+    "https://[::1]/hook",
+    "file:///etc/passwd",
+])
+def test_unsafe_callback_urls_are_rejected(url):
+    with pytest.raises(CallbackURLError):
+        asyncio.run(validate_callback_url(url))
+
+
+def test_callback_host_allowlist(monkeypatch):
+    asyncio.run(validate_callback_url("https://93.184.215.14/hook"))
+
+    monkeypatch.setattr(settings, "JOB_CALLBACK_ALLOWED_HOSTS", ["hooks.example.com"])
+    with pytest.raises(CallbackURLError):
+        asyncio.run(validate_callback_url("https://93.184.215.14/hook"))
+
+
+def test_callbacks_connect_to_the_checked_address(monkeypatch):
+    """Test that delivery does not resolve the host a second time"""
+    answers = iter(["93.184.215.14", "127.0.0.1"])
+
+    async def getaddrinfo(self, host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (next(answers), port))]
+
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", getaddrinfo)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(204)
+
+    async def scenario():
+        queue = JobQueue(None, InMemoryQueueBackend(), workers=1, ttl_seconds=60)
+        queue._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        job = AnalysisJob(
+            job_id="j1", status=SUCCEEDED, callback_url="https://hooks.example.com/done",
+            created_at=datetime.now(timezone.utc),
+        )
+        await queue._notify(job)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    [request] = requests
+    assert request.url.host == "93.184.215.14"
+    assert request.headers["Host"] == "hooks.example.com"
+    assert request.extensions["sni_hostname"] == "hooks.example.com"
+
+
+def test_submit_fails_when_queue_is_full():
+    async def scenario():
+        queue = JobQueue(None, InMemoryQueueBackend(), workers=1, ttl_seconds=60, max_depth=2)
+        await queue.submit(b"one")
+        await queue.submit(b"two")
+        with pytest.raises(QueueFullError):
+            await queue.submit(b"three")
+
+    asyncio.run(scenario())
+
+
+class FakeAsyncRedis:
+    """The sorted-set, key and list commands the Redis queue backend uses, in memory"""
+
+    def __init__(self):
+        self.data = {}
+        self.zsets = {}
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        return int(self.zsets.get(key, {}).pop(member, None) is not None)
+
+    async def zrangebyscore(self, key, low, high):
+        return [member for member, score in self.zsets.get(key, {}).items() if score <= high]
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def blpop(self, keys, timeout=0):
+        await asyncio.sleep(0)
+
+    def register_script(self, script):
+        async def claim(keys, args):
+            queue = self.zsets.get(keys[0], {})
+            if not queue:
+                return None
+            member = min(queue, key=queue.get)
+            del queue[member]
+            self.zsets.setdefault(keys[1], {})[member] = args[0]
+            return member.encode()
+        return claim
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def command(*args):
+            self.calls.append((name, args))
+            return self
+        return command
+
+    async def execute(self):
+        for name, args in self.calls:
+            if name == "zrem":
+                await self.redis.zrem(*args)
+            elif name == "delete":
+                self.redis.data.pop(args[0], None)
+
+
+def test_redis_jobs_of_dead_workers_are_reclaimed():
+    """Test that a claimed job nobody acknowledged goes back on the queue"""
+    async def scenario():
+        backend = RedisQueueBackend(client=FakeAsyncRedis(), visibility_timeout=0)
+        queue = JobQueue(None, backend, workers=1, ttl_seconds=60)
+        job = await queue.submit(b"plate")
+
+        # A worker claims the job and dies before acknowledging it
+        assert await backend.pop() == job.job_id
+        assert await backend.depth() == 0
+        assert await backend.reclaim() == 1
+
+        assert await backend.pop() == job.job_id
+        await backend.ack(job.job_id)
+        assert await backend.reclaim() == 0
+        return await backend.load_payload(job.job_id)
+
+    assert asyncio.run(scenario()) is None
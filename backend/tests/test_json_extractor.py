@@ -0,0 +1,73 @@
+import json
+import random
+from pathlib import Path
+import pytest
+from app.models.food import FoodAnalysis
+from app.utils.json_extractor import JSONExtractionError, JSONStreamExtractor, extract_json
+
+CORPUS = json.loads((Path(__file__).parent / "data" / "model_outputs.json").read_text())
+
+PROSE = [
+    "",
+    "Here you go:\n",
+    "Based on the image, ",
+    "Note: values [approximate] ",
+    'The "plate" looks like ',
+    "```json\n",
+    "```\n",
+]
+
+
+def _extract_streamed(text, rng):
+    extractor = JSONStreamExtractor("{")
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, 12)
+        extractor.feed(text[pos:pos + size])
+        pos += size
+    return extractor.finish()
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=range(len(CORPUS)))
+def test_corpus(case):
+    """Test extraction over recorded model outputs"""
+    if case["expected"] is None:
+        with pytest.raises(JSONExtractionError):
+            extract_json(case["text"], "{")
+    else:
+        assert extract_json(case["text"], "{") == case["expected"]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fuzz_chunking_and_wrapping(seed):
+    """Test that random chunk splits and surrounding prose do not change the result"""
+    rng = random.Random(seed)
+    for case in CORPUS:
+        if case["expected"] is None:
+            continue
+        text = rng.choice(PROSE) + case["text"] + rng.choice(["", "\n```", " Hope this helps! {", " [done]"])
+        assert _extract_streamed(text, rng) == case["expected"]
+
+
+def test_arrays_for_batch_output():
+    """Test that arrays are found when allowed"""
+    assert extract_json('```json\n[{"index": 0}, {"index": 1}]\n```') == [{"index": 0}, {"index": 1}]
+
+
+def test_feed_returns_value_when_complete():
+    """Test that streaming returns the value as soon as it closes"""
+    extractor = JSONStreamExtractor()
+    assert extractor.feed('Result: {"calories": ') is None
+    assert extractor.feed('"100"} and more') == {"calories": "100"}
+    assert extractor.feed("{}") is None
+
+
+def test_food_analysis_numeric_fields():
+    """Test that reported amounts are normalized into numbers"""
+    analysis = FoodAnalysis(calories="1,150 kcal", protein="45-50g", carbohydrates=120, fat="500 mg")
+    assert analysis.calories_kcal == 1150
+    assert analysis.protein_g == 47.5
+    assert analysis.carbohydrates == "120"
+    assert analysis.carbohydrates_g == 120
+    assert analysis.fat_g == 0.5
+    assert FoodAnalysis(calories="unknown").calories_kcal is None
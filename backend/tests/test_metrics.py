@@ -0,0 +1,82 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routes import food
+from app.services.analysis_cache import AnalysisCache
+from app.utils.metrics import ANALYSIS_ERRORS, ANALYSIS_STAGE_DURATION, MetricsRegistry
+
+client = TestClient(app)
+
+
+def test_counter_and_histogram_render():
+    registry = MetricsRegistry()
+    errors = registry.counter("errors", "Errors", ("type",))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    errors.inc(type="ValueError")
+    errors.inc(2, type="ValueError")
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    text = registry.render()
+
+    assert "# TYPE errors counter" in text
+    assert 'errors_total{type="ValueError"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_count 3" in text
+    assert "latency_seconds_sum 5.55" in text
+
+
+def test_callback_metric_is_read_at_scrape_time():
+    registry = MetricsRegistry()
+    state = {"entries": 1}
+    registry.callback("entries", "Entries", lambda: {"exact": state["entries"]}, ("tier",))
+    state["entries"] = 7
+
+    assert 'entries{tier="exact"} 7' in registry.render()
+
+
+def test_broken_callback_does_not_break_scrape():
+    registry = MetricsRegistry()
+    registry.callback("broken", "Broken", lambda: 1 / 0)
+    registry.counter("ok", "Ok").inc()
+
+    text = registry.render()
+
+    assert "# broken unavailable" in text
+    assert "ok_total 1" in text
+
+
+def test_metrics_endpoint_records_routes_and_stages(monkeypatch, fake_models, image_path):
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    monkeypatch.setattr(food.services.food_service, "cache", AnalysisCache(max_entries=8))
+    monkeypatch.setattr(food.services.food_service, "perceptual_index", None)
+    model_stages = ANALYSIS_STAGE_DURATION.count(stage="model")
+
+    client.post("/api/v1/food/analyze", json={"image_path": image_path})
+    client.get("/api/v1/food/jobs/unknown")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/v1/food/analyze",status="200"}' in text
+    # Path parameters are labelled by their template, not their value
+    assert 'route="/api/v1/food/jobs/{job_id}",status="404"' in text
+    assert ANALYSIS_STAGE_DURATION.count(stage="model") == model_stages + 1
+    for stage in ("read", "hash", "decode", "encode", "parse"):
+        assert f'analysis_stage_duration_seconds_count{{stage="{stage}"}}' in text
+    assert 'analysis_payload_bytes_count{kind="upload"}' in text
+    assert 'analysis_cache_entries{tier="exact"} 1' in text
+    assert "model_circuit_state 0" in text
+
+
+def test_failed_analysis_counts_error_type(monkeypatch, fake_models):
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    before = ANALYSIS_ERRORS.value(type="FileNotFoundError")
+
+    client.post("/api/v1/food/analyze", json={"image_path": "/nonexistent/image.jpg"})
+
+    assert ANALYSIS_ERRORS.value(type="FileNotFoundError") == before + 1
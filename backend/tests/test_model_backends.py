@@ -0,0 +1,65 @@
+import asyncio
+import json
+import pytest
+from google.api_core import exceptions
+from app.models.food import FoodAnalysis
+from app.services.analysis_cache import AnalysisCache
+from app.services.food_analysis_service import FoodAnalysisService
+from app.services.model_backends import FakeGenerativeModel, get_model_factory
+from app.services.model_pool import ModelPool
+
+
+def _fake(**kwargs):
+    kwargs.setdefault("latency_ms", 0)
+    kwargs.setdefault("jitter_ms", 0)
+    kwargs.setdefault("error_rate", 0)
+    return FakeGenerativeModel("fake-model", **kwargs)
+
+
+def test_fake_answers_are_deterministic():
+    """Test that the same content always gets the same numbers"""
+    image = {"mime_type": "image/jpeg", "data": b"plate"}
+    first = _fake().generate_content([image, "prompt"]).text
+    assert first == _fake().generate_content([image, "prompt"]).text
+    assert first != _fake().generate_content([{"mime_type": "image/jpeg", "data": b"other"}, "prompt"]).text
+    assert set(json.loads(first)) == {"calories", "protein", "carbohydrates", "fat"}
+
+
+def test_fake_batch_answer_is_indexed():
+    """Test that multi-image prompts get an indexed array"""
+    contents = ["Image 0:", {"data": b"a"}, "Image 1:", {"data": b"b"}, "prompt"]
+    items = json.loads(_fake().generate_content(contents).text)
+    assert [item["index"] for item in items] == [0, 1]
+
+
+def test_fake_error_rate():
+    """Test that the fake raises upstream-style errors at the configured rate"""
+    with pytest.raises((exceptions.ResourceExhausted, exceptions.ServiceUnavailable)):
+        asyncio.run(_fake(error_rate=1.0).generate_content_async([{"data": b"a"}, "prompt"]))
+
+
+def test_service_runs_on_fake_backend(image_path, monkeypatch):
+    """Test that the service works end to end without a Gemini key"""
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    models = ModelPool("", default_model="fake-model", allowed_models=[], backend="fake")
+    models._model_factory = lambda name: _fake()
+    service = FoodAnalysisService(cache=AnalysisCache(max_entries=8), models=models)
+    assert isinstance(asyncio.run(service.analyze_food_image_async(image_path)), FoodAnalysis)
+
+
+def test_unknown_backend():
+    """Test that unknown backends are rejected"""
+    with pytest.raises(ValueError):
+        get_model_factory("nope")
+
+
+def test_fake_reports_usage_and_caps_output():
+    """Test that the fake bills tokens like the API and honours max_output_tokens"""
+    contents = [{"data": b"plate"}, "x" * 40]
+    usage = _fake().generate_content(contents).usage_metadata
+    assert usage.prompt_token_count == FakeGenerativeModel.IMAGE_TOKENS + 10
+    assert usage.candidates_token_count > 5
+
+    capped = _fake().generate_content(contents, generation_config={"max_output_tokens": 5})
+    assert capped.usage_metadata.candidates_token_count == 5
+    assert len(capped.text) == 20
@@ -0,0 +1,27 @@
+import pytest
+from app.models.food import FoodAnalysis
+
+
+def test_models_are_reused(fake_models):
+    """Test that the pool constructs each model once"""
+    assert fake_models.get() is fake_models.get()
+    assert fake_models.get("fake-model-pro") is not fake_models.get()
+    assert fake_models.get().model_name == "fake-model"
+
+
+def test_disallowed_model_is_rejected(fake_models):
+    """Test that models outside the allowlist raise"""
+    with pytest.raises(ValueError):
+        fake_models.get("gemini-ultra")
+
+
+def test_per_request_model(service, image_path):
+    """Test that a request can pick an allowed model, and is rejected otherwise"""
+    assert isinstance(service.analyze_food_image(image_path, model_name="fake-model-pro"), FoodAnalysis)
+    assert "not allowed" in service.analyze_food_image(image_path, model_name="gemini-ultra")
+
+
+def test_warmup_builds_all_models(fake_models):
+    """Test that warmup populates the pool"""
+    fake_models.warmup()
+    assert set(fake_models._models) == {"fake-model", "fake-model-pro"}
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import settings
+from app.main import app
+from app.routes import food
+from app.services.model_usage import ModelUsage
+from app.utils.metrics import MODEL_TOKENS
+from .conftest import FakeModel, FakeResponse, FakeUsageMetadata, make_plate_image
+
+
+def _response(input_tokens, output_tokens):
+    return FakeResponse("{}", FakeUsageMetadata(input_tokens, output_tokens))
+
+
+def test_report_aggregates_tokens_latency_and_cost():
+    usage = ModelUsage(prices={"cheap": [0.1, 0.4]})
+    usage.record("cheap", _response(1000, 100), 0.2)
+    usage.record("cheap", _response(3000, 300), 0.4)
+    usage.record("unpriced", _response(10, 1), 1.0)
+
+    report = usage.report()
+
+    assert report["cheap"]["requests"] == 2
+    assert report["cheap"]["input_tokens"] == 4000
+    assert report["cheap"]["mean_output_tokens"] == 200
+    assert report["cheap"]["mean_latency_ms"] == pytest.approx(300)
+    assert report["cheap"]["p95_latency_ms"] == pytest.approx(400)
+    assert report["cheap"]["cost_usd"] == pytest.approx((4000 * 0.1 + 400 * 0.4) / 1_000_000)
+    assert report["unpriced"]["cost_usd"] is None
+
+
+def test_responses_without_usage_count_zero_tokens():
+    usage = ModelUsage(prices={})
+    assert usage.record("model", object(), 0.1) == {"input_tokens": 0, "output_tokens": 0}
+
+
+def test_structured_output_config_is_sent(service, image_path, monkeypatch):
+    """Test that model calls carry the JSON schema and a token cap scaled to the batch"""
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT_ENABLED", True)
+    monkeypatch.setattr(settings, "MODEL_MAX_OUTPUT_TOKENS", 100)
+
+    asyncio.run(service.analyze_food_image_async(image_path))
+    config = FakeModel.last_kwargs["generation_config"]
+    assert config["response_mime_type"] == "application/json"
+    assert set(config["response_schema"]["properties"]) == {"calories", "protein", "carbohydrates", "fat"}
+    assert config["max_output_tokens"] == 100
+
+    paths = []
+    for i in range(1, 4):
+        path = f"{image_path}.{i}.png"
+        make_plate_image(i).save(path)
+        paths.append(path)
+    asyncio.run(service.analyze_batch(paths))
+    config = FakeModel.last_kwargs["generation_config"]
+    assert config["response_schema"]["type"] == "ARRAY"
+    assert config["max_output_tokens"] == 300
+
+
+def test_structured_output_can_be_disabled(service, image_path, monkeypatch):
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT_ENABLED", False)
+    service.analyze_food_image(image_path)
+    assert FakeModel.last_kwargs == {}
+
+
+def test_usage_is_recorded_per_model(service, image_path):
+    tokens = MODEL_TOKENS.value(model="fake-model-pro", direction="input")
+
+    asyncio.run(service.analyze_food_image_async(image_path, model_name="fake-model-pro"))
+
+    report = service.usage_report()
+    assert report["fake-model-pro"]["requests"] == 1
+    assert report["fake-model-pro"]["input_tokens"] == 300
+    assert MODEL_TOKENS.value(model="fake-model-pro", direction="input") == tokens + 300
+
+
+def test_usage_stats_route(monkeypatch, fake_models, tmp_path):
+    # An image no other test has cached in the app's service
+    image_path = str(tmp_path / "usage.png")
+    make_plate_image(seed=21).save(image_path)
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    monkeypatch.setattr(food.services.food_service, "usage", ModelUsage(prices={"fake-model": [1.0, 2.0]}))
+    client = TestClient(app)
+
+    client.post("/api/v1/food/analyze", json={"image_path": image_path})
+    response = client.get("/api/v1/food/usage-stats")
+
+    assert response.status_code == 200
+    assert response.json()["fake-model"]["cost_usd"] > 0
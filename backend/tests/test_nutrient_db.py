@@ -0,0 +1,121 @@
+import asyncio
+import io
+import numpy as np
+import pytest
+from app.config.settings import settings
+from app.models.food import FoodAnalysis
+from app.services.analysis_cache import AnalysisCache
+from app.services.food_analysis_service import FoodAnalysisService
+from app.services.model_backends import FakeGenerativeModel
+from app.services.model_pool import ModelPool
+from app.services.nutrient_db import NutrientDatabase, get_nutrient_database
+from .conftest import make_plate_image
+
+
+@pytest.fixture
+def db():
+    names = ["white rice", "chicken breast", "broccoli"]
+    values = np.array([[130, 2.7, 28, 0.3], [165, 31, 0, 3.6], [35, 2.4, 7.2, 0.4]])
+    return NutrientDatabase(names, values, aliases={"grilled chicken": 1, "rice": 0})
+
+
+def test_lookup_matches_names_aliases_and_near_names(db):
+    assert db.lookup("White Rice") == 0
+    assert db.lookup("rice") == 0
+    assert db.lookup("grilled chicken breast") == 1
+    assert db.lookup("steamed broccoli") == 2
+    assert db.lookup("chocolate cake") is None
+
+
+def test_lookups_are_memoized(db):
+    db.lookup("steamed broccoli")
+    db.lookup("steamed broccoli")
+    assert db.stats()["lookup_hits"] == 1
+    assert db.stats()["lookup_misses"] == 1
+
+
+def test_estimate_sums_item_nutrients(db):
+    result = db.estimate([
+        {"name": "rice", "grams": 200},
+        {"name": "grilled chicken", "grams": "150 g"},
+        {"name": "unicorn", "grams": 50},
+        {"name": "no weight"},
+    ])
+
+    assert result["calories_kcal"] == pytest.approx(260 + 247.5, abs=0.1)
+    assert result["protein_g"] == pytest.approx(5.4 + 46.5, abs=0.1)
+    assert result["protein"] == "51.9g"
+    assert [item["matched"] for item in result["items"]] == ["white rice", "chicken breast", None]
+    assert result["items"][2]["calories_kcal"] is None
+
+
+def test_estimate_without_items(db):
+    result = db.estimate([])
+    assert result == {"items": []}
+
+
+def test_estimate_without_matches_leaves_totals_unset(db):
+    """Test that a plate of unknown foods is not reported as a 0 kcal meal"""
+    result = db.estimate([{"name": "unicorn", "grams": 100}])
+
+    assert "calories_kcal" not in result
+    assert [item["name"] for item in result["items"]] == ["unicorn"]
+    analysis = FoodAnalysis(**result)
+    assert analysis.calories is None and analysis.calories_kcal is None
+
+
+def test_bundled_table_loads_once():
+    db = get_nutrient_database()
+    assert db is get_nutrient_database()
+    assert db.values.dtype == np.float32
+    assert db.names[db.lookup("mashed potatoes")] == "mashed potatoes"
+
+
+def test_custom_table(tmp_path):
+    path = tmp_path / "foods.csv"
+    path.write_text("name,aliases,calories_kcal,protein_g,carbohydrates_g,fat_g\nkimchi,napa kimchi,15,1.1,2.4,0.5\n")
+    db = NutrientDatabase.from_csv(path)
+    assert db.estimate([{"name": "napa kimchi", "grams": 100}])["calories_kcal"] == 15
+
+
+@pytest.fixture
+def nutrient_service(monkeypatch):
+    monkeypatch.setattr(settings, "ANALYSIS_MODE", "nutrient_db")
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT_ENABLED", True)
+    models = ModelPool("test-key", model_factory=lambda name: FakeGenerativeModel(name, latency_ms=0, jitter_ms=0))
+    return FoodAnalysisService(cache=AnalysisCache(max_entries=8), models=models, perceptual_index=None)
+
+
+def _png(seed):
+    buffer = io.BytesIO()
+    make_plate_image(seed, size=128).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_nutrient_db_mode_computes_macros_from_items(nutrient_service):
+    """Test that the model only names items and the totals come from the table"""
+    result = asyncio.run(nutrient_service.analyze_image_bytes_async(_png(1)))
+
+    assert result.items
+    assert all(item.matched for item in result.items)
+    assert result.calories_kcal == pytest.approx(sum(item.calories_kcal for item in result.items), abs=0.2)
+    assert "nutrient_lookup" in nutrient_service.cache_stats()
+
+
+def test_nutrient_db_mode_in_batches(nutrient_service, tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"plate{i}.png"
+        path.write_bytes(_png(i))
+        paths.append(str(path))
+
+    results = asyncio.run(nutrient_service.analyze_batch(paths))
+
+    assert all(result.items for result in results)
+
+
+def test_unknown_analysis_mode_is_rejected(monkeypatch):
+    # validate() reads the class attributes
+    monkeypatch.setattr(type(settings), "ANALYSIS_MODE", "guess")
+    with pytest.raises(ValueError):
+        settings.validate()
@@ -0,0 +1,70 @@
+import io
+import random
+import PIL.Image
+import PIL.ImageDraw
+from app.services.perceptual_index import PerceptualIndex, dhash, make_namespace
+
+
+def _plate_image(size):
+    img = PIL.Image.new("RGB", (size, size), "white")
+    draw = PIL.ImageDraw.Draw(img)
+    draw.ellipse((size // 8, size // 8, size * 7 // 8, size * 7 // 8), fill="tan")
+    draw.rectangle((size // 4, size // 3, size // 2, size // 2), fill="green")
+    return img
+
+
+def test_resized_image_has_close_hash():
+    """Test that resizing keeps the hash within a few bits"""
+    original = dhash(_plate_image(256))
+    resized = dhash(_plate_image(256).resize((97, 97)))
+    assert (original ^ resized).bit_count() <= 4
+
+
+def test_hashing_leaves_the_image_unchanged():
+    """Test that hashing a lazily opened JPEG does not downscale or recolour it"""
+    buffer = io.BytesIO()
+    _plate_image(512).save(buffer, format="JPEG")
+    img = PIL.Image.open(io.BytesIO(buffer.getvalue()))
+
+    dhash(img)
+
+    assert (img.size, img.mode) == ((512, 512), "RGB")
+    img.load()
+    assert (img.size, img.mode) == ((512, 512), "RGB")
+
+
+def test_find_within_distance():
+    """Test lookups at, and just beyond, the configured distance"""
+    index = PerceptualIndex(max_distance=3, max_entries=10)
+    namespace = make_namespace("prompt", "model")
+    index.add(namespace, 0b1011 << 40, {"calories": "500"})
+    assert index.find(namespace, (0b1011 << 40) ^ 0b111) == {"calories": "500"}
+    assert index.find(namespace, (0b1011 << 40) ^ 0b1111) is None
+    assert index.find(make_namespace("other", "model"), 0b1011 << 40) is None
+    assert index.stats()["hits"] == 1
+
+
+def test_eviction_removes_oldest():
+    """Test that the index stays bounded"""
+    index = PerceptualIndex(max_distance=2, max_entries=2)
+    values = (0, 0xFFFFFFFF00000000, 0xFFFFFFFFFFFFFFFF)
+    for value in values:
+        index.add("ns", value, {"calories": str(value)})
+    assert len(index) == 2
+    assert index.find("ns", values[0]) is None
+    assert index.find("ns", values[2]) == {"calories": str(values[2])}
+
+
+def test_find_matches_brute_force():
+    """Test multi-index lookups against a linear scan"""
+    rng = random.Random(7)
+    index = PerceptualIndex(max_distance=4, max_entries=5000)
+    hashes = [rng.getrandbits(64) for _ in range(2000)]
+    for value in hashes:
+        index.add("ns", value, {"calories": str(value)})
+    for value in hashes[:50]:
+        query = value
+        for bit in rng.sample(range(64), 3):
+            query ^= 1 << bit
+        expected = min(hashes, key=lambda h: (h ^ query).bit_count())
+        assert index.find("ns", query) == {"calories": str(expected)}
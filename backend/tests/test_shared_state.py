@@ -0,0 +1,139 @@
+import asyncio
+from app.services import food_analysis_service, shared_state
+from app.services.analysis_cache import AnalysisCache
+from app.services.model_pool import ModelPool
+from app.services.registry import ServiceRegistry
+from app.services.shared_state import RedisCacheStore, RedisLease, RedisTokenBucket, create_rate_limiter
+from app.services.upstream_client import TokenBucket
+from tests.conftest import FakeModel
+
+
+class FakeRedis:
+    """The handful of Redis commands the shared state uses, in memory"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    def exists(self, key):
+        return int(key in self.data)
+
+
+class FakeAsyncRedis:
+    """asyncio client over the same data as a FakeRedis"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.script_calls = 0
+
+    async def get(self, key):
+        return self.redis.get(key)
+
+    async def set(self, key, value, nx=False, px=None, ex=None):
+        return self.redis.set(key, value, nx=nx, px=px, ex=ex)
+
+    async def exists(self, key):
+        return self.redis.exists(key)
+
+    def register_script(self, script):
+        if "TIME" in script:
+            # Token bucket: always a token available
+            async def take(keys, args):
+                self.script_calls += 1
+                return 0
+            return take
+
+        # Compare-and-delete lease release
+        async def release(keys, args):
+            if self.redis.data.get(keys[0]) == args[0].encode():
+                del self.redis.data[keys[0]]
+                return 1
+            return 0
+        return release
+
+
+def test_registry_builds_services_lazily(monkeypatch):
+    monkeypatch.setattr(shared_state.settings, "ANALYSIS_HISTORY_ENABLED", False)
+    registry = ServiceRegistry(run_job=None)
+
+    assert not registry.is_initialized("food_service")
+    assert registry.chart_service is registry.chart_service
+    assert registry.is_initialized("chart_service")
+    assert registry.history is None
+    assert not registry.is_initialized("food_service")
+
+
+def test_local_rate_limit_is_split_between_workers(monkeypatch):
+    monkeypatch.setattr(shared_state.settings, "SHARED_STATE_URL", "")
+    monkeypatch.setattr(shared_state.settings, "WEB_CONCURRENCY", 4)
+    monkeypatch.setattr(shared_state.settings, "UPSTREAM_REQUESTS_PER_MINUTE", 240)
+    monkeypatch.setattr(shared_state.settings, "UPSTREAM_BURST", 20)
+
+    limiter = create_rate_limiter()
+
+    assert type(limiter) is TokenBucket
+    assert limiter.rate == 1
+    assert limiter.capacity == 5
+
+
+def test_lease_is_exclusive_and_released_by_holder_only():
+    redis = FakeAsyncRedis(FakeRedis())
+    first, second = RedisLease(redis), RedisLease(redis)
+
+    async def run():
+        assert await first.acquire("key")
+        assert not await second.acquire("key")
+        await second.release("key")
+        assert not await second.acquire("key")
+        await first.release("key")
+        assert await second.acquire("key")
+
+    asyncio.run(run())
+
+
+def test_shared_rate_limiter_awaits_redis():
+    redis = FakeAsyncRedis(FakeRedis())
+    limiter = RedisTokenBucket(redis, rate_per_second=1, burst=1)
+
+    asyncio.run(limiter.acquire())
+
+    assert redis.script_calls == 1
+
+
+def test_workers_share_one_model_call(monkeypatch, image_path):
+    """Two workers analyzing the same image concurrently make one upstream call"""
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(food_analysis_service.settings, "PHASH_ENABLED", False)
+    FakeModel.reset()
+    FakeModel.delay = 0.05
+    redis = FakeRedis()
+    async_redis = FakeAsyncRedis(redis)
+
+    def worker():
+        return food_analysis_service.FoodAnalysisService(
+            cache=AnalysisCache(max_entries=8, stores=[RedisCacheStore(async_redis, redis, ttl_seconds=60)]),
+            models=ModelPool("test-key", default_model="fake-model", model_factory=FakeModel),
+            lease=RedisLease(async_redis, poll_seconds=0.01),
+        )
+
+    first, second = worker(), worker()
+
+    async def run():
+        return await asyncio.gather(
+            first.analyze_food_image_async(image_path),
+            second.analyze_food_image_async(image_path),
+        )
+
+    results = asyncio.run(run())
+
+    assert results[0] == results[1]
+    assert results[0].calories == "740"
+    assert FakeModel.calls == 1
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _run(code: str) -> list:
+    env = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+    completed = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=BACKEND_DIR, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_app_imports_without_key_or_heavy_sdks():
+    """Test that importing the app needs no API key and defers the SDKs"""
+    loaded = _run(
+        "import json, sys, app.main; "
+        "print(json.dumps([m for m in ('google.generativeai', 'PIL') if m in sys.modules]))"
+    )
+    assert loaded == []
+
+
+def test_fake_backend_service_never_loads_gemini_sdk():
+    """Test that building and warming the service on the fake backend skips the Gemini SDK"""
+    loaded = _run(
+        "import os, json, sys; os.environ['MODEL_BACKEND'] = 'fake'; "
+        "from app.routes import food; food.services.food_service.warmup(); "
+        "print(json.dumps(['google.generativeai' in sys.modules, 'PIL' in sys.modules]))"
+    )
+    assert loaded == [False, True]
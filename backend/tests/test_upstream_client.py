@@ -0,0 +1,259 @@
+import asyncio
+import pytest
+from google.api_core import exceptions as google_exceptions
+from app.routes import food
+from app.services import food_analysis_service
+from app.services.analysis_cache import AnalysisCache
+from app.services.upstream_client import (
+    CircuitBreaker,
+    TokenBucket,
+    UpstreamClient,
+    UpstreamUnavailableError,
+    is_retryable,
+)
+from tests.conftest import FAKE_RESPONSE_TEXT, FakeResponse
+
+
+class FlakyModel:
+    """Fails with the queued errors, then succeeds"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def generate_content_async(self, content, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return FakeResponse(FAKE_RESPONSE_TEXT)
+
+    def generate_content(self, content, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return FakeResponse(FAKE_RESPONSE_TEXT)
+
+
+class FlakyStream:
+    """Streamed response that yields some chunks, then fails with an error"""
+
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.usage_metadata = None
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield FakeResponse(chunk)
+        if self.error is not None:
+            raise self.error
+
+
+class StreamingModel:
+    """Returns the queued streams, one per call"""
+
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.calls = 0
+
+    async def generate_content_async(self, content, stream=False, **kwargs):
+        self.calls += 1
+        return self.streams.pop(0)
+
+
+async def read_stream(client, model):
+    response = await client.generate(model, ["prompt"], stream=True)
+    return [chunk.text async for chunk in response]
+
+
+def make_client(max_retries=3, failure_threshold=5, reset_seconds=30.0):
+    return UpstreamClient(
+        limiter=TokenBucket(rate_per_second=1000, burst=100),
+        breaker=CircuitBreaker(failure_threshold, reset_seconds),
+        max_retries=max_retries,
+        base_delay=0,
+        max_delay=0,
+    )
+
+
+def test_retryable_errors():
+    assert is_retryable(google_exceptions.ResourceExhausted("quota"))
+    assert is_retryable(google_exceptions.ServiceUnavailable("down"))
+    assert is_retryable(google_exceptions.InternalServerError("oops"))
+    assert not is_retryable(google_exceptions.InvalidArgument("bad image"))
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_retries_transient_errors_then_succeeds():
+    client = make_client()
+    model = FlakyModel([google_exceptions.ResourceExhausted("quota"), google_exceptions.ServiceUnavailable("down")])
+
+    response = asyncio.run(client.generate(model, ["prompt"]))
+
+    assert response.text == FAKE_RESPONSE_TEXT
+    assert model.calls == 3
+    assert client.stats()["retries"] == 2
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_retryable_error_is_raised_immediately():
+    client = make_client()
+    model = FlakyModel([google_exceptions.InvalidArgument("bad image")])
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        client.generate_sync(model, ["prompt"])
+    assert model.calls == 1
+
+
+def test_exhausted_retries_raise_unavailable():
+    client = make_client(max_retries=1)
+    model = FlakyModel([google_exceptions.ServiceUnavailable("down")] * 5)
+
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(client.generate(model, ["prompt"]))
+    assert model.calls == 2
+
+
+def test_circuit_opens_and_fails_fast():
+    client = make_client(max_retries=0, failure_threshold=2)
+    model = FlakyModel([google_exceptions.ServiceUnavailable("down")] * 5)
+
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailableError):
+            client.generate_sync(model, ["prompt"])
+    with pytest.raises(UpstreamUnavailableError) as excinfo:
+        client.generate_sync(model, ["prompt"])
+
+    assert model.calls == 2
+    assert excinfo.value.retry_after > 0
+    assert client.stats()["circuit"] == {"state": "open", "consecutive_failures": 2, "times_opened": 1}
+    assert client.stats()["rejected"] == 1
+
+
+def test_circuit_half_open_trial_closes_it():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_half_open_trial_lets_the_next_call_through():
+    client = make_client(failure_threshold=1, reset_seconds=0)
+    client.breaker.record_failure()
+    model = FlakyModel([])
+
+    class SlowModel:
+        async def generate_content_async(self, content, **kwargs):
+            await asyncio.sleep(10)
+
+    async def run():
+        trial = asyncio.create_task(client.generate(SlowModel(), ["prompt"]))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        return await client.generate(model, ["prompt"])
+
+    assert asyncio.run(run()).text == FAKE_RESPONSE_TEXT
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_token_bucket_waits_when_empty():
+    bucket = TokenBucket(rate_per_second=10, burst=2)
+
+    assert bucket._reserve() == 0
+    assert bucket._reserve() == 0
+    assert bucket._reserve() == pytest.approx(0.1, abs=0.02)
+    assert bucket.stats()["waits"] == 1
+
+
+def test_token_bucket_with_zero_rate_never_waits():
+    bucket = TokenBucket(rate_per_second=0, burst=1)
+
+    assert [bucket._reserve() for _ in range(5)] == [0] * 5
+
+
+def test_negative_rate_limit_is_rejected(monkeypatch):
+    from app.config.settings import settings
+
+    # validate() reads the class attributes
+    monkeypatch.setattr(type(settings), "MODEL_BACKEND", "fake")
+    monkeypatch.setattr(type(settings), "UPSTREAM_REQUESTS_PER_MINUTE", -1)
+
+    with pytest.raises(ValueError, match="UPSTREAM_REQUESTS_PER_MINUTE"):
+        settings.validate()
+
+
+def test_stream_error_before_first_chunk_is_retried():
+    client = make_client()
+    model = StreamingModel([
+        FlakyStream([], google_exceptions.ResourceExhausted("quota")),
+        FlakyStream(["{", "}"]),
+    ])
+
+    assert asyncio.run(read_stream(client, model)) == ["{", "}"]
+    assert model.calls == 2
+    assert client.stats()["retries"] == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_stream_error_after_chunks_counts_against_breaker():
+    client = make_client(failure_threshold=1)
+    model = StreamingModel([FlakyStream(["{"], google_exceptions.ServiceUnavailable("down"))])
+
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(read_stream(client, model))
+    assert model.calls == 1
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_stream_success_is_recorded_after_reading():
+    client = make_client(failure_threshold=1, reset_seconds=0)
+    client.breaker.record_failure()
+    model = StreamingModel([FlakyStream(["{", "}"])])
+
+    async def run():
+        response = await client.generate(model, ["prompt"], stream=True)
+        assert client.breaker.state == CircuitBreaker.HALF_OPEN
+        return [chunk.text async for chunk in response]
+
+    assert asyncio.run(run()) == ["{", "}"]
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_service_serves_stale_result_while_circuit_open(monkeypatch, fake_models, image_path):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(food_analysis_service.settings, "PHASH_ENABLED", False)
+    client = make_client(max_retries=0, failure_threshold=1)
+    cache = AnalysisCache(max_entries=8, ttl_seconds=-1)  # every entry is already expired
+    service = food_analysis_service.FoodAnalysisService(cache=cache, models=fake_models, upstream=client)
+
+    first = asyncio.run(service.analyze_food_image_async(image_path))
+    client.breaker.record_failure()
+    second = asyncio.run(service.analyze_food_image_async(image_path))
+
+    assert second == first
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_analyze_route_returns_503_when_upstream_unavailable(monkeypatch, fake_models, image_path):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = make_client(max_retries=0, failure_threshold=1)
+    client.breaker.record_failure()
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    monkeypatch.setattr(food.services.food_service, "upstream", client)
+    monkeypatch.setattr(food.services.food_service, "cache", AnalysisCache(max_entries=8))
+    monkeypatch.setattr(food.services.food_service, "perceptual_index", None)
+
+    response = TestClient(app).post("/api/v1/food/analyze", json={"image_path": image_path})
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
@@ -0,0 +1,154 @@
+import io
+import json
+import PIL.Image
+import PIL.ImageDraw
+import PIL.ImageFilter
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routes import food
+from app.utils.metrics import IMAGE_VALIDATIONS
+from app.utils.validators import (
+    ImageValidationError,
+    check_image_content,
+    read_image_size,
+    sniff_image_type,
+    validate_image_header,
+)
+from .conftest import FakeModel, make_plate_image
+
+client = TestClient(app)
+
+
+def _encode(img, format, **kwargs):
+    buffer = io.BytesIO()
+    img.save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+
+def _smooth_soup_photo(size=1024):
+    """A bowl of soup on a plain plate and table: in focus, but with almost no texture"""
+    img = PIL.Image.new("RGB", (size, size), (214, 200, 178))
+    draw = PIL.ImageDraw.Draw(img)
+    draw.ellipse((size * 0.12, size * 0.12, size * 0.88, size * 0.88), fill=(244, 243, 238))
+    draw.ellipse((size * 0.25, size * 0.25, size * 0.75, size * 0.75), fill=(226, 190, 120))
+    # Camera-like softening and compression
+    return _encode(img.filter(PIL.ImageFilter.GaussianBlur(size / 150)), "JPEG", quality=85)
+
+
+@pytest.mark.parametrize("format,mime_type", [("JPEG", "image/jpeg"), ("PNG", "image/png"), ("WEBP", "image/webp"), ("GIF", "image/gif")])
+def test_sniff_and_header_size(format, mime_type):
+    """Test that formats are identified by magic bytes and sized from the header"""
+    data = _encode(make_plate_image(size=64).resize((120, 80)), format)
+
+    assert sniff_image_type(data) == mime_type
+    assert read_image_size(data, mime_type) == (120, 80)
+
+
+def test_progressive_jpeg_with_exif_is_sized():
+    img = make_plate_image().resize((300, 200))
+    exif = PIL.Image.Exif()
+    exif[0x0112] = 6
+    data = _encode(img, "JPEG", progressive=True, exif=exif.tobytes())
+
+    assert read_image_size(data, "image/jpeg") == (300, 200)
+
+
+@pytest.mark.parametrize("data,code,status", [
+    (b"", "empty_file", 400),
+    (b"%PDF-1.7 not an image", "not_an_image", 415),
+    (b"GIF89a\x10\x00\x10\x00", "unsupported_format", 415),
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "corrupt_image", 422),
+])
+def test_header_rejections(data, code, status):
+    with pytest.raises(ImageValidationError) as excinfo:
+        validate_image_header(data)
+    assert (excinfo.value.code, excinfo.value.status_code) == (code, status)
+
+
+def test_decompression_bomb_rejected_from_header():
+    """Test that a huge declared size is rejected without decoding any pixels"""
+    header = _encode(make_plate_image(), "PNG")
+    # Rewrite the IHDR dimensions to 100000 x 100000
+    bomb = header[:16] + (100000).to_bytes(4, "big") * 2 + header[24:]
+
+    with pytest.raises(ImageValidationError) as excinfo:
+        validate_image_header(bomb)
+    assert excinfo.value.code == "too_many_pixels"
+
+
+def test_tiny_image_rejected():
+    with pytest.raises(ImageValidationError) as excinfo:
+        validate_image_header(_encode(make_plate_image(size=8), "PNG"))
+    assert excinfo.value.code == "image_too_small"
+
+
+def test_blank_and_blurry_images_rejected():
+    with pytest.raises(ImageValidationError) as excinfo:
+        check_image_content(PIL.Image.new("RGB", (640, 480), (3, 3, 3)))
+    assert excinfo.value.code == "blank_image"
+
+    # Plenty of contrast, but no edges anywhere
+    blurred = PIL.Image.linear_gradient("L").convert("RGB").filter(PIL.ImageFilter.GaussianBlur(4))
+    with pytest.raises(ImageValidationError) as excinfo:
+        check_image_content(blurred, reject_blurry=True)
+    assert excinfo.value.code == "blurry_image"
+    assert check_image_content(blurred, reject_blurry=False) == "blurry_image"
+
+    assert check_image_content(make_plate_image(size=256)) is None
+
+
+def test_smooth_food_photo_is_analyzed(monkeypatch, fake_models):
+    """Test that a low-texture dish scoring as blurry is flagged but still sent to the model"""
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    warned = IMAGE_VALIDATIONS.value(outcome="blurry_image_warning")
+    soup = _smooth_soup_photo()
+
+    response = client.post("/api/v1/food/analyze-upload", files={"file": ("soup.jpg", soup, "image/jpeg")})
+
+    assert check_image_content(PIL.Image.open(io.BytesIO(soup)), reject_blurry=False) == "blurry_image"
+    assert response.status_code == 200
+    assert FakeModel.calls == 1
+    assert IMAGE_VALIDATIONS.value(outcome="blurry_image_warning") == warned + 1
+
+
+def test_upload_rejections_skip_the_model(monkeypatch, fake_models):
+    """Test that rejected uploads return their code and never reach the model"""
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    rejected = IMAGE_VALIDATIONS.value(outcome="blank_image")
+    black = _encode(PIL.Image.new("RGB", (640, 480), "black"), "JPEG")
+
+    blank_response = client.post("/api/v1/food/analyze-upload", files={"file": ("black.jpg", black, "image/jpeg")})
+    text_response = client.post("/api/v1/food/analyze-upload", files={"file": ("fake.jpg", b"hello world", "image/jpeg")})
+
+    assert blank_response.status_code == 422
+    assert blank_response.json()["detail"]["code"] == "blank_image"
+    assert text_response.status_code == 415
+    assert text_response.json()["detail"]["code"] == "not_an_image"
+    assert FakeModel.calls == 0
+    assert IMAGE_VALIDATIONS.value(outcome="blank_image") == rejected + 1
+
+
+def test_stream_rejections_carry_their_code(monkeypatch, fake_models):
+    """Test that the SSE endpoint reports a rejected image like the other routes"""
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    black = _encode(PIL.Image.new("RGB", (640, 480), "black"), "JPEG")
+
+    response = client.post("/api/v1/food/analyze-stream", files={"file": ("black.jpg", black, "image/jpeg")})
+
+    event, data = response.text.strip().split("\n")
+    assert event == "event: error"
+    assert json.loads(data.removeprefix("data: "))["code"] == "blank_image"
+    assert FakeModel.calls == 0
+
+
+def test_analyze_by_path_rejects_corrupt_image(monkeypatch, fake_models, tmp_path):
+    monkeypatch.setattr(food.services.food_service, "models", fake_models)
+    path = tmp_path / "truncated.jpg"
+    path.write_bytes(_encode(make_plate_image(size=256), "JPEG")[:300])
+
+    response = client.post("/api/v1/food/analyze", json={"image_path": str(path)})
+
+    assert response.status_code == 422
+    assert response.json()["detail"]["code"] == "corrupt_image"
+    assert FakeModel.calls == 0